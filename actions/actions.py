@@ -9,13 +9,21 @@ from rasa_sdk.executor import CollectingDispatcher
 # Setup Django environment for accessing models
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
-os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
 django.setup()
-
-from chatbot.models import UserMessage, TravelPackage, HotelBooking, FlightBooking, Booking
+# Actions touching the database or the catalog are async and send that work
+# through run_orm(); Django raises SynchronousOnlyOperation if any ORM call
+# slips onto the event loop, instead of silently stalling every conversation.
+
+from chatbot.models import TravelPackage
+from chatbot.availability import InvalidStay, is_available, max_nights
+from chatbot.booking import BookingError, book_flight, book_hotel
+from chatbot.catalog import get_catalog
+from chatbot.flight_search import flight_cards_for_slots
+from chatbot.hotel_search import get_hotel_search
+from chatbot.message_log import get_message_log
+from chatbot.rendering import BACK_TO_PACKAGES, CATEGORY_BUTTONS, get_responses
 
 from django.contrib.auth.models import User
-import requests
 from rasa_sdk.events import SlotSet
 from rasa_sdk.forms import FormValidationAction
 from datetime import datetime
@@ -24,11 +32,144 @@ from rasa_sdk import Tracker, FormValidationAction, Action
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet, EventType
 
+import asyncio
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+# ---------------------- SENDER RESOLUTION & ORM POOL ----------------------
+
+# ORM work runs on this bounded pool so a slow query never blocks the action
+# server's event loop (and other conversations with it).
+ORM_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ACTION_ORM_WORKERS", "8")),
+    thread_name_prefix="actions-orm",
+)
+
+
+def _with_connection_cleanup(fn, *args, **kwargs):
+    # Each pool thread keeps its own connection; like Django's request cycle,
+    # drop it before and after the work if it is broken or past CONN_MAX_AGE.
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_orm(fn, *args, **kwargs):
+    """Run blocking Django/ORM code on ``ORM_EXECUTOR`` and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(ORM_EXECUTOR, functools.partial(_with_connection_cleanup, fn, *args, **kwargs))
+
+
+class SenderResolver:
+    """Maps Rasa sender ids (usernames) to ``User`` rows through a bounded TTL/LRU cache.
+
+    Entries are dropped when the user is saved or deleted in this process; the
+    TTL bounds how long a change made by the Django server can go unnoticed.
+    Unknown senders are not cached, so a user who signs up mid-conversation is
+    found on the next turn.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, sender_id):
+        """Return the ``User`` for ``sender_id`` or None. May query, so call it through ``run_orm``."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(sender_id)
+            if entry is not None and entry[1] > now:
+                self._users.move_to_end(sender_id)
+                return entry[0]
+        user = User.objects.filter(username=sender_id).first()
+        if user is not None:
+            with self._lock:
+                self._users[sender_id] = (user, now + self.ttl)
+                self._users.move_to_end(sender_id)
+                while len(self._users) > self.max_size:
+                    self._users.popitem(last=False)
+        return user
+
+    def forget_user(self, user):
+        """Drop every entry for ``user``, including ones under an old username."""
+        with self._lock:
+            for key in [key for key, (cached, _) in self._users.items() if cached.pk == user.pk]:
+                del self._users[key]
+            self._users.pop(user.username, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+sender_resolver = SenderResolver(
+    max_size=int(os.environ.get("ACTION_USER_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("ACTION_USER_CACHE_TTL", "300")),
+)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    sender_resolver.forget_user(instance)
+
 
 class ValidateHotelBookingForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_hotel_booking_form"
 
+    @staticmethod
+    def _free_alternatives(hotel_name, stay):
+        """``(hotel, free hotel cards nearby)`` if ``hotel_name`` is full for ``stay``, else None."""
+        hotel = get_catalog().hotels_by_name.get(str(hotel_name).strip().lower())
+        try:
+            if hotel is None or is_available(hotel["id"], *stay):
+                return None
+        except InvalidStay:  # check-in date not validated yet
+            return None
+        return hotel, get_hotel_search().cards(hotel["location"], {"stay": stay}, limit=3)
+
+    async def _full_for_stay(self, dispatcher: CollectingDispatcher, tracker: Tracker, **slots) -> bool:
+        """Once the hotel and the whole stay are known, tell the user if the hotel is full and offer free ones."""
+        values = {name: slots.get(name, tracker.get_slot(name))
+                  for name in ("hotel_name", "check_in_date", "nights", "guests")}
+        if not all(values.values()):
+            return False
+        stay = (values["check_in_date"], int(values["nights"]), int(values["guests"]))
+        conflict = await run_orm(self._free_alternatives, values["hotel_name"], stay)
+        if conflict is None:
+            return False
+
+        hotel, cards = conflict
+        dispatcher.utter_message(text=f"😔 {hotel['name']} is fully booked for those dates.")
+        if cards:
+            dispatcher.utter_message(text="These hotels nearby are free:")
+            dispatcher.utter_message(custom={"type": "hotel_cards", "cards": cards})
+        return True
+
+    async def validate_hotel_name(self, slot_value: Any, dispatcher: CollectingDispatcher,
+                                  tracker: Tracker, domain: Dict[Text, Any]) -> Dict[Text, Any]:
+        catalog = await run_orm(get_catalog)
+        hotel = catalog.hotels_by_name.get(str(slot_value or "").strip().lower())
+        if hotel is None:
+            dispatcher.utter_message(text=f"⚠️ I couldn't find a hotel called '{slot_value}'. Which hotel would you like?")
+            return {"hotel_name": None}
+        if await self._full_for_stay(dispatcher, tracker, hotel_name=hotel["name"]):
+            return {"hotel_name": None}
+        return {"hotel_name": hotel["name"]}
+
     def validate_check_in_date(self, slot_value: Any, dispatcher: CollectingDispatcher,
                            tracker: Tracker, domain: Dict[Text, Any]) -> Dict[Text, Any]:
         try:
@@ -42,30 +183,33 @@ class ValidateHotelBookingForm(FormValidationAction):
                         tracker: Tracker, domain: Dict[Text, Any]) -> Dict[Text, Any]:
         try:
             nights = int("".join(filter(str.isdigit, str(slot_value))))
-            if nights > 0:
-                return {"nights": nights}
-        except:
-            pass
-        dispatcher.utter_message(text="Please provide a valid number of nights.")
+        except (TypeError, ValueError):
+            nights = 0
+        if 0 < nights <= max_nights():
+            return {"nights": nights}
+        dispatcher.utter_message(text=f"Please provide a valid number of nights (1 to {max_nights()}).")
         return {"nights": None}
 
-    def validate_guests(self, slot_value: Any, dispatcher: CollectingDispatcher,
-                        tracker: Tracker, domain: Dict[Text, Any]) -> Dict[Text, Any]:
+    async def validate_guests(self, slot_value: Any, dispatcher: CollectingDispatcher,
+                              tracker: Tracker, domain: Dict[Text, Any]) -> Dict[Text, Any]:
         try:
             guests = int("".join(filter(str.isdigit, str(slot_value))))
-            if guests > 0:
-                return {"guests": guests}
-        except:
-            pass
-        dispatcher.utter_message(text="Please provide a valid number of guests.")
-        return {"guests": None}
+        except (TypeError, ValueError):
+            guests = 0
+        if guests < 1:
+            dispatcher.utter_message(text="Please provide a valid number of guests.")
+            return {"guests": None}
+        if await self._full_for_stay(dispatcher, tracker, guests=guests):
+            # Keep the dates and ask for another hotel.
+            return {"guests": guests, "hotel_name": None}
+        return {"guests": guests}
 
 
 class ActionSubmitHotelBooking(Action):
     def name(self) -> Text:
         return "action_submit_hotel_booking"
 
-    def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
             domain: Dict[Text, Any]) -> List[EventType]:
         user_id = tracker.sender_id
         hotel = tracker.get_slot("hotel_name")
@@ -77,28 +221,26 @@ class ActionSubmitHotelBooking(Action):
             dispatcher.utter_message(text="⚠️ Booking could not be completed. Missing information.")
             return []
 
+        idempotency_key = tracker.latest_message.get("message_id") or None
+
+        def book():
+            user = sender_resolver.resolve(user_id)
+            if user is None:
+                return None
+            return book_hotel(user, hotel, date, nights, guests, idempotency_key=idempotency_key)[0]
+
         try:
-            user = User.objects.get(username=user_id)
-            hotel_booking = HotelBooking.objects.create(
-                user=user,
-                hotel_name=hotel,
-                check_in_date=date,
-                guests=guests,
-                nights=nights
-            )
-
-            # Create a Booking entry linked to HotelBooking
-            Booking.objects.create(
-                user=user,
-                booking_type="hotel",
-                reference_id=f"Hotel:{hotel_booking.id}"
-            )
-
-            dispatcher.utter_message(
-                text=f"✅ Booking confirmed at *{hotel}* from *{date}* for *{nights}* nights with *{guests}* guests."
-            )
-        except User.DoesNotExist:
+            hotel_booking = await run_orm(book)
+        except BookingError as e:
+            dispatcher.utter_message(text=f"⚠️ {e}")
+            return []
+        if hotel_booking is None:
             dispatcher.utter_message(text="⚠️ Booking failed. User not found.")
+            return []
+        dispatcher.utter_message(
+            text=f"✅ Booking confirmed at *{hotel_booking.hotel_name}* from *{hotel_booking.check_in_date}* "
+                 f"for *{hotel_booking.nights}* nights with *{hotel_booking.guests}* guests."
+        )
         return []
 
 
@@ -132,11 +274,30 @@ class ValidateFlightBookingForm(FormValidationAction):
         return {"destination": None}
 
 
+class ActionShowFlights(Action):
+    def name(self) -> Text:
+        return "action_show_flights"
+
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[EventType]:
+        cards = await run_orm(
+            flight_cards_for_slots,
+            departure=tracker.get_slot("departure"),
+            destination=tracker.get_slot("destination"),
+            travel_date=tracker.get_slot("travel_date"),
+        )
+        if cards:
+            dispatcher.utter_message(custom={"type": "flight_cards", "cards": cards})
+        else:
+            dispatcher.utter_message(text="Sorry, no flights with free seats match your trip.")
+        return []
+
+
 class ActionSubmitFlightBooking(Action):
     def name(self) -> Text:
         return "action_submit_flight_booking"
 
-    def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
             domain: Dict[Text, Any]) -> List[EventType]:
         user_id = tracker.sender_id
         from_city = tracker.get_slot("departure")
@@ -147,43 +308,44 @@ class ActionSubmitFlightBooking(Action):
             dispatcher.utter_message(text="⚠️ Flight booking failed. Missing departure, destination, or date.")
             return []
 
+        # Rasa may retry an action call; keying on the message that completed the form makes that safe.
+        idempotency_key = tracker.latest_message.get("message_id") or None
+
+        def book():
+            user = sender_resolver.resolve(user_id)
+            if user is None:
+                return None
+            return book_flight(user, departure=from_city, destination=to_city, travel_date=travel_date,
+                               idempotency_key=idempotency_key)[0]
+
         try:
-            user = User.objects.get(username=user_id)
-            flight_booking = FlightBooking.objects.create(
-                user=user,
-                departure=from_city,
-                destination=to_city,
-                travel_date=travel_date
-            )
-
-            # Create a Booking entry linked to FlightBooking
-            Booking.objects.create(
-                user=user,
-                booking_type="flight",
-                reference_id=f"Flight:{flight_booking.id}"
-            )
-
-            dispatcher.utter_message(
-                text=f"✅ Flight booked from *{from_city}* to *{to_city}* on *{travel_date}*."
-            )
-        except User.DoesNotExist:
+            flight_booking = await run_orm(book)
+        except BookingError as e:
+            dispatcher.utter_message(text=f"⚠️ {e}")
+            return []
+        if flight_booking is None:
             dispatcher.utter_message(text="⚠️ Booking failed. User not found.")
+            return []
+        # A retried call returns the earlier booking, whose flight may since have been deleted (SET_NULL).
+        flight = f" *{flight_booking.flight.flight_number}*" if flight_booking.flight else ""
+        dispatcher.utter_message(
+            text=f"✅ Flight{flight} booked from *{flight_booking.departure}* "
+                 f"to *{flight_booking.destination}* on *{flight_booking.travel_date}*."
+        )
         return []
 
 
-from urllib.parse import quote
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from typing import Any, Text, Dict, List
-import requests
 
 class ActionShowHotelsByLocation(Action):
     def name(self) -> Text:
         return "action_show_hotels_by_location"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         location = tracker.get_slot("location")
 
@@ -191,47 +353,21 @@ class ActionShowHotelsByLocation(Action):
             dispatcher.utter_message(text="Please provide a location to search for hotels.")
             return []
 
+        # Once the user has given their dates, only offer hotels that are free for them.
+        filters = {}
+        check_in, nights, guests = (tracker.get_slot(s) for s in ("check_in_date", "nights", "guests"))
+        if check_in:
+            filters["stay"] = (check_in, int(nights or 1), int(guests or 1))
+
         try:
-            encoded_location = quote(location)
-            url = f"http://localhost:8000/api/hotels/?location={encoded_location}"
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                hotels = response.json()
-
-                if isinstance(hotels, list) and len(hotels) > 0:
-                    cards = []
-                    for hotel in hotels:
-                        image_path = hotel.get("image")
-                        if image_path:
-                            image_url = f"http://localhost:8000/media/{image_path}"
-                        else:
-                            image_url = "http://localhost:8000/media/hotel_images/default.webp"
-
-                        card = {
-                            "image": image_url,
-                            "title": hotel["name"],
-                            "subtitle": hotel["location"],
-                            "rating": str(hotel["rating"]),
-                            "price": str(hotel["price_per_night"]),
-                            "amenities": hotel["amenities"],
-                            "buttons": [
-                                {
-                                    "title": "Book Now",
-                                    "payload": f'/book_hotel{{"hotel_name": "{hotel["name"]}"}}'
-                                }
-                            ]
-                        }
-                        cards.append(card)
-
-                    dispatcher.utter_message(custom={
-                        "type": "hotel_cards",
-                        "cards": cards
-                    })
-                else:
-                    dispatcher.utter_message(text=f"Sorry, no hotels found in {location}.")
+            cards = await run_orm(get_hotel_search().cards, location, filters)
+            if cards:
+                dispatcher.utter_message(custom={
+                    "type": "hotel_cards",
+                    "cards": cards
+                })
             else:
-                dispatcher.utter_message(text="Failed to fetch hotel data. Please try again later.")
+                dispatcher.utter_message(text=f"Sorry, no hotels found in {location}.")
 
         except Exception as e:
             dispatcher.utter_message(text=f"Error while searching for hotels: {e}")
@@ -244,17 +380,8 @@ class ActionShowTravelPackages(Action):
     def name(self) -> Text:
         return "action_show_travel_packages"
 
-    def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
-        packages = TravelPackage.objects.all()
-        if not packages:
-            dispatcher.utter_message(text="Sorry, no travel packages are currently available.")
-            return []
-
-        message = "Here are some available travel packages:\n"
-        for p in packages:
-            message += f"- {p.name} in {p.destination} for {p.duration_days} days at ₹{p.price}\n"
-
-        dispatcher.utter_message(text=message)
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        dispatcher.utter_message(text=(await run_orm(get_responses)).package_list)
         return []
 
 
@@ -266,12 +393,7 @@ class ActionShowCategories(Action):
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        buttons = [
-            {"title": "🏖️ Beach Holidays", "payload": '/show_destinations{"category":"beach"}'},
-            {"title": "⛰️ Mountain Adventures", "payload": '/show_destinations{"category":"mountain"}'},
-            {"title": "🏙️ City Tours", "payload": '/show_destinations{"category":"city"}'},
-        ]
-        dispatcher.utter_message(text="Choose a travel category:", buttons=buttons)
+        dispatcher.utter_message(text="Choose a travel category:", buttons=CATEGORY_BUTTONS)
         return []
 
 
@@ -279,9 +401,9 @@ class ActionShowDestinations(Action):
     def name(self) -> Text:
         return "action_show_destinations"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         category = tracker.get_slot("category")
 
@@ -289,19 +411,12 @@ class ActionShowDestinations(Action):
             dispatcher.utter_message(text="Please specify a category (beach, mountain, city).")
             return []
 
-        packages = TravelPackage.objects.filter(category__iexact=category)
-        if not packages:
+        rendered = (await run_orm(get_responses)).destinations_for(category)
+        if not rendered:
             dispatcher.utter_message(text=f"Sorry, we couldn't find any packages in the {category} category.")
             return []
 
-        buttons = []
-        for pkg in packages:
-            buttons.append({
-                "title": pkg.destination,
-                "payload": f'/package_detail{{"package_name":"{pkg.name}"}}'
-            })
-
-        dispatcher.utter_message(text=f"Here are the {category} destinations available:", buttons=buttons)
+        dispatcher.utter_message(text=rendered["text"], buttons=rendered["buttons"])
         return []
 
 
@@ -309,9 +424,9 @@ class ActionPackageDetail(Action):
     def name(self) -> Text:
         return "action_package_detail"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         package_name = tracker.get_slot("package_name")
 
@@ -319,34 +434,15 @@ class ActionPackageDetail(Action):
             dispatcher.utter_message(text="Please specify which travel package you're interested in.")
             return []
 
-        try:
-            travel_package = TravelPackage.objects.get(name__iexact=package_name)
-            response = (
-                f"📦 *{travel_package.name}*\n"
-                f"📍 Destination: {travel_package.destination}\n"
-                f"🗒️ {travel_package.description}\n"
-                f"💰 Price: ₹{travel_package.price}\n"
-                f"⏱️ Duration: {travel_package.duration_days} days"
-            )
-            buttons = [
-                {"title": "Book a Flight", "payload": "/book_flight"},
-                {"title": "Search Hotels", "payload": f'/search_hotels{{"location": "{travel_package.destination}"}}'},
-                {"title": "Back to Packages", "payload": "/travel_packages"}
-            ]
-            # Set location slot to package destination for downstream hotel search
-            dispatcher.utter_message(text=response, buttons=buttons)
-            return [
-                SlotSet("location", travel_package.destination),
-                SlotSet("package_name", travel_package.name),
-            ]
-        except TravelPackage.DoesNotExist:
-            response = f"Sorry, I couldn’t find a travel package named '{package_name}'."
-            buttons = [
-                {"title": "Back to Packages", "payload": "/travel_packages"}
-            ]
-
-        dispatcher.utter_message(text=response, buttons=buttons)
-        return []
+        rendered = (await run_orm(get_responses)).package_detail(package_name)
+        if not rendered:
+            dispatcher.utter_message(text=f"Sorry, I couldn’t find a travel package named '{package_name}'.",
+                                     buttons=[BACK_TO_PACKAGES])
+            return []
+
+        dispatcher.utter_message(text=rendered["text"], buttons=rendered["buttons"])
+        # Set location slot to package destination for downstream hotel search
+        return [SlotSet(slot, value) for slot, value in rendered["slots"].items()]
 
 class ActionCancelBooking(Action):
     def name(self) -> Text:
@@ -362,7 +458,7 @@ class ActionSaveMessage(Action):
     def name(self) -> Text:
         return "action_save_message"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
@@ -373,13 +469,21 @@ class ActionSaveMessage(Action):
             "No response"
         )
         sender_id = tracker.sender_id
+        # The Django chat views send their turn id in the metadata and log the turn under it too.
+        metadata = tracker.latest_message.get("metadata") or {}
+        turn_id = metadata.get("turn_id") or tracker.latest_message.get("message_id")
+
+        def save():
+            user = sender_resolver.resolve(sender_id)
+            if user is None:
+                print(f"[Warning] User '{sender_id}' not found. Message not saved.")
+                return
+            # Queued and written in batches; skipped if the Django chat view already logged this turn.
+            if get_message_log().log(user.id, user_input, bot_response, turn_id):
+                print(f"Logged message for user {sender_id}")
 
         try:
-            user = User.objects.get(username=sender_id)
-            UserMessage.objects.create(user=user, message=user_input, response=bot_response)
-            print(f"Saved message for user {sender_id}")
-        except User.DoesNotExist:
-            print(f"[Warning] User '{sender_id}' not found. Message not saved.")
+            await run_orm(save)
         except Exception as e:
             print(f"[Error] Failed to save message: {e}")
 
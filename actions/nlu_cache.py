@@ -0,0 +1,170 @@
+"""Cache Rasa's NLU parse results for repeated messages.
+
+Most chat messages are repeats ("hi", "show packages", city names), and Rasa
+runs the full featurization and DIET pipeline from ``config.yml`` for each
+one. ``CachedRestInput`` replaces the built-in ``rest`` channel in
+``credentials.yml``. It serves the same ``/webhooks/rest/webhook`` URL and
+wraps the loaded model's ``parse_message`` with a ``ParseCache``. That also
+covers ``/model/parse`` once the channel has handled a message.
+
+Entries are keyed on the model id and the lower-cased text. Loading a new
+model clears the cache. Payloads such as ``/greet`` are not cached; Rasa
+answers those without running NLU anyway. Hit rate and the inference time
+saved are served at ``/webhooks/rest/nlu_cache``. The channel also passes a
+request's ``metadata`` on with the message, which the Django chat views use
+to send their turn id to ``action_save_message``.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(text):
+    """The cache key for ``text``, or None if it should not be cached.
+
+    Lower-casing must keep the length, so the cached entity offsets still
+    point at the same characters.
+    """
+    if not text or text.startswith("/"):
+        return None
+    key = text.lower()
+    return key if len(key) == len(text) else None
+
+
+def adapt(parse_data, text):
+    """A copy of cached ``parse_data`` for ``text``, which may differ from the cached text in case only."""
+    parse_data = copy.deepcopy(parse_data)
+    cached_text = parse_data.get("text", "")
+    parse_data["text"] = text
+    for entity in parse_data.get("entities", []):
+        start, end = entity.get("start"), entity.get("end")
+        # Values taken verbatim from the text follow its case; synonym-mapped values stay as they are.
+        if start is not None and end is not None and entity.get("value") == cached_text[start:end]:
+            entity["value"] = text[start:end]
+    return parse_data
+
+
+class ParseCache:
+    def __init__(self, max_size=5000):
+        self.max_size = max_size
+        self.model_id = None
+        self.counts = {"hits": 0, "misses": 0, "invalidations": 0}
+        self.parse_seconds = 0.0  # total time spent parsing misses
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_model(self, model_id):
+        if model_id != self.model_id:
+            if self._entries:
+                self.counts["invalidations"] += 1
+            self._entries.clear()
+            self.model_id = model_id
+
+    def get(self, model_id, key):
+        with self._lock:
+            self._check_model(model_id)
+            parse_data = self._entries.get(key)
+            if parse_data is None:
+                return None
+            self._entries.move_to_end(key)
+            self.counts["hits"] += 1
+            # Each hit saves one average miss.
+            self.saved_seconds += self.parse_seconds / max(self.counts["misses"], 1)
+            return parse_data
+
+    def put(self, model_id, key, parse_data, elapsed):
+        with self._lock:
+            self._check_model(model_id)
+            self.counts["misses"] += 1
+            self.parse_seconds += elapsed
+            if self.max_size <= 0:
+                return
+            self._entries[key] = parse_data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return {
+                **self.counts,
+                "size": len(self._entries),
+                "model_id": self.model_id,
+                "hit_rate": round(self.counts["hits"] / lookups, 4) if lookups else 0.0,
+                "avg_parse_ms": round(self.parse_seconds / self.counts["misses"] * 1000, 3) if self.counts["misses"] else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+def model_id(processor):
+    metadata = getattr(processor, "model_metadata", None)
+    return getattr(metadata, "model_id", None) or getattr(processor, "model_filename", None)
+
+
+def install(processor, cache):
+    """Wrap ``processor.parse_message`` with ``cache``. Safe to call on every request."""
+    if getattr(processor, "_parse_cache", None) is cache:
+        return
+    parse_message = processor.parse_message
+    current_model = model_id(processor)
+
+    async def cached_parse_message(message, tracker=None, only_output_properties=True):
+        key = cache_key(message.text)
+        if key is None or not only_output_properties:
+            return await parse_message(message, tracker, only_output_properties)
+        parse_data = cache.get(current_model, key)
+        if parse_data is not None:
+            return adapt(parse_data, message.text)
+        start = time.perf_counter()
+        parse_data = await parse_message(message, tracker, only_output_properties)
+        cache.put(current_model, key, copy.deepcopy(parse_data), time.perf_counter() - start)
+        return parse_data
+
+    processor.parse_message = cached_parse_message
+    processor._parse_cache = cache
+
+
+try:
+    from rasa.core.channels.rest import RestInput
+    from sanic import response
+except ImportError:  # the Django side and the benchmarks only need ParseCache
+    RestInput = None
+
+
+if RestInput is not None:
+    class CachedRestInput(RestInput):
+        """The REST channel, with NLU results of repeated messages cached."""
+
+        def __init__(self, cache_size=5000):
+            self.cache = ParseCache(max_size=int(cache_size))
+
+        @classmethod
+        def name(cls):
+            return "rest"
+
+        @classmethod
+        def from_credentials(cls, credentials):
+            return cls(**(credentials or {}))
+
+        def get_metadata(self, request):
+            # Carries the Django view's turn_id through to action_save_message.
+            return (request.json or {}).get("metadata")
+
+        def blueprint(self, on_new_message):
+            custom_webhook = super().blueprint(on_new_message)
+
+            @custom_webhook.middleware("request")
+            async def install_cache(request):
+                # A newly loaded model comes with a new processor, which gets wrapped here.
+                processor = getattr(request.app.ctx.agent, "processor", None)
+                if processor is not None:
+                    install(processor, self.cache)
+
+            @custom_webhook.route("/nlu_cache", methods=["GET"])
+            async def nlu_cache_stats(request):
+                return response.json(self.cache.stats())
+
+            return custom_webhook
@@ -0,0 +1,73 @@
+"""Rasa tracker store that keeps conversations in the Django database.
+
+Configured in ``endpoints.yml``::
+
+    tracker_store:
+      type: actions.tracker_store.DjangoTrackerStore
+      cache_size: 1000
+      validate_cache: true
+
+Conversations survive restarts and are shared by every Rasa instance pointed
+at the same database. The storage and the hot-conversation cache are in
+``chatbot.event_store``; this class converts between Rasa trackers and their
+serialized events and keeps the database work off Rasa's event loop.
+"""
+import asyncio
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+django.setup()
+
+from chatbot.event_store import EventStore  # noqa: E402
+from django.db import close_old_connections  # noqa: E402
+from rasa.core.tracker_store import TrackerStore  # noqa: E402
+from rasa.shared.core.trackers import DialogueStateTracker  # noqa: E402
+
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TRACKER_STORE_WORKERS", "4")),
+    thread_name_prefix="tracker-store",
+)
+
+
+def _with_connection_cleanup(fn, *args):
+    close_old_connections()
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+
+class DjangoTrackerStore(TrackerStore):
+    def __init__(self, domain, host=None, event_broker=None, cache_size=1000, validate_cache=True, **kwargs):
+        super().__init__(domain, event_broker, **kwargs)
+        self.events = EventStore(cache_size=int(cache_size), validate=bool(validate_cache))
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(EXECUTOR, functools.partial(_with_connection_cleanup, fn, *args))
+
+    def _tracker(self, sender_id, events):
+        if not events or not self.domain:
+            return None
+        return DialogueStateTracker.from_dict(sender_id, events, self.domain.slots)
+
+    async def save(self, tracker):
+        await self.stream_events(tracker)
+        events = [event.as_dict() for event in tracker.events]
+        await self._run(self.events.save, tracker.sender_id, events)
+
+    async def retrieve(self, sender_id):
+        return self._tracker(sender_id, await self._run(self.events.load, sender_id))
+
+    async def retrieve_full_tracker(self, conversation_id):
+        events = await self._run(functools.partial(self.events.load, conversation_id, all_sessions=True))
+        return self._tracker(conversation_id, events)
+
+    async def keys(self):
+        return await self._run(self.events.keys)
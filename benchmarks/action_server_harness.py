@@ -0,0 +1,156 @@
+"""Concurrency check for the Rasa action server: one slow query must not stall other turns.
+
+Starts a real action server (``python -m rasa_sdk``) on a throwaway SQLite
+database seeded with a few flights and packages. It sends one webhook call
+that runs a multi-second query and, while that is running, ``--calls``
+parallel calls to the ordinary catalog and flight actions. It then reports
+their latencies.
+
+With the default ``--mode async`` the slow query runs on the ORM pool and the
+other calls must finish well before it does; the script exits non-zero if
+they were stalled. ``--mode blocking`` runs the same query inline on the
+event loop, as the actions used to, for comparison.
+
+Usage (from the repository root, with rasa_sdk installed):
+
+    python benchmarks/action_server_harness.py --calls 50
+    python benchmarks/action_server_harness.py --mode blocking
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.append(os.path.join(ROOT, 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+
+def create_database(path):
+    """Create and seed the harness database in-process, before the server starts."""
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = path
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.utils import timezone
+    from chatbot.models import Flight, TravelPackage
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    tomorrow = timezone.now() + timedelta(days=1)
+    Flight.objects.bulk_create([
+        Flight(flight_number=f"HX{i}", origin="Delhi", destination="Goa",
+               departure_time=tomorrow + timedelta(hours=i), price=4000 + i * 100, seats_available=50)
+        for i in range(10)
+    ])
+    TravelPackage.objects.bulk_create([
+        TravelPackage(name=f"Package {i}", destination="Goa", description="Sun and sand", price=20000,
+                      duration_days=5, category="beach")
+        for i in range(10)
+    ])
+    return tomorrow.date().isoformat()
+
+
+def action_call(name, sender_id, slots=None):
+    return {
+        "next_action": name,
+        "sender_id": sender_id,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": slots or {},
+            "latest_message": {"text": "hi", "intent": {"name": "greet"}, "entities": []},
+            "events": [],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": "action_listen",
+        },
+        "domain": {},
+    }
+
+
+async def timed_call(client, url, payload):
+    start = time.perf_counter()
+    response = await client.post(url, json=payload)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def exercise(url, calls, travel_date, slow_action):
+    async with httpx.AsyncClient(timeout=120) as client:
+        slow = asyncio.create_task(timed_call(client, url, action_call(slow_action, "slow-user")))
+        await asyncio.sleep(0.3)  # let the slow query get going
+        fast = [
+            action_call("action_show_travel_packages", f"user{i}") if i % 2 else
+            action_call("action_show_flights", f"user{i}",
+                        {"departure": "Delhi", "destination": "Goa", "travel_date": travel_date})
+            for i in range(calls)
+        ]
+        latencies = await asyncio.gather(*(timed_call(client, url, payload) for payload in fast))
+        return await slow, sorted(latencies)
+
+
+def wait_until_up(base_url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("action server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError("action server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--mode", choices=["async", "blocking"], default="async")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "harness.sqlite3")
+    travel_date = create_database(db_path)
+    logging.disable(logging.CRITICAL)
+
+    env = dict(os.environ, HARNESS_DB=db_path, PYTHONPATH=os.pathsep.join([HERE, ROOT]))
+    if args.mode == "blocking":
+        env["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "rasa_sdk", "--actions", "harness_actions", "--port", str(args.port), "--quiet"],
+        env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(base_url, server)
+        slow_action = "harness_slow_query" if args.mode == "async" else "harness_slow_query_blocking"
+        slow_elapsed, latencies = asyncio.run(exercise(f"{base_url}/webhook", args.calls, travel_date, slow_action))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"mode={args.mode}: slow query took {slow_elapsed:.2f}s")
+    print(f"{args.calls} concurrent calls: p50={statistics.median(latencies) * 1000:.0f}ms  "
+          f"p99={p99 * 1000:.0f}ms  max={latencies[-1] * 1000:.0f}ms")
+    stalled = latencies[-1] > slow_elapsed / 2
+    print("STALLED behind the slow query" if stalled else "OK: other turns were not blocked")
+    if args.mode == "async":
+        sys.exit(1 if stalled else 0)
+
+
+if __name__ == "__main__":
+    main()
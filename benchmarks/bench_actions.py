@@ -0,0 +1,118 @@
+"""Action-server throughput for ``action_save_message``, before and after cached sender resolution.
+
+Drives rasa_sdk's ``ActionExecutor`` (what ``rasa run actions`` serves) with
+``--concurrency`` action calls in flight on one event loop, the way the action
+server handles concurrent conversations. Compares:
+
+* ``before`` - the previous synchronous action: ``User.objects.get`` on every
+  call, run directly on the event loop
+* ``after``  - the current ``ActionSaveMessage``: cached sender resolution with
+  the ORM work on the bounded thread pool
+
+``--db-latency`` adds a delay to every SQL statement to mimic a database
+across the network; that is where blocking the event loop hurts the most.
+
+Usage (from the repository root, with rasa_sdk installed):
+
+    python benchmarks/bench_actions.py --calls 2000 --concurrency 50 --db-latency 2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actions import actions  # noqa: E402  (sets up Django)
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from rasa_sdk import Action  # noqa: E402
+from rasa_sdk.executor import ActionExecutor  # noqa: E402
+
+from chatbot.message_log import get_message_log  # noqa: E402
+
+
+class LegacyActionSaveMessage(Action):
+    """``action_save_message`` as it was: a synchronous lookup per call on the event loop."""
+
+    def name(self):
+        return "legacy_save_message"
+
+    def run(self, dispatcher, tracker, domain):
+        user = User.objects.get(username=tracker.sender_id)
+        get_message_log().log(user.id, tracker.latest_message.get("text", ""), "ok")
+        return []
+
+
+def action_call(name, sender_id, i):
+    return {
+        "next_action": name,
+        "sender_id": sender_id,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": {},
+            "latest_message": {"text": f"message {i}", "intent": {"name": "greet"}, "entities": []},
+            "events": [{"event": "bot", "text": "ok"}],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": "action_listen",
+        },
+        "domain": {},
+    }
+
+
+async def drive(executor, name, senders, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await executor.run(action_call(name, senders[i % len(senders)], i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--senders", type=int, default=100)
+    parser.add_argument("--db-latency", type=float, default=2.0, help="milliseconds added to every SQL statement")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    connection.creation.create_test_db(verbosity=0)
+    senders = [User.objects.create_user(username=f"sender{i}").username for i in range(args.senders)]
+
+    def slow_database(execute, sql, params, many, context):
+        time.sleep(args.db_latency / 1000)
+        return execute(sql, params, many, context)
+
+    def add_latency(connection, **kwargs):
+        connection.execute_wrappers.append(slow_database)
+
+    connection_created.connect(add_latency)
+    connection.close()  # reconnect with the latency wrapper
+
+    # Dedup and the write-behind flush are outside what is being compared.
+    get_message_log().dedup_window = 0
+    get_message_log().start = lambda: None
+
+    executor = ActionExecutor()
+    executor.register_action(LegacyActionSaveMessage())
+    executor.register_action(actions.ActionSaveMessage())
+
+    for label, name in (("before", "legacy_save_message"), ("after", "action_save_message")):
+        actions.sender_resolver.clear()
+        elapsed = asyncio.run(drive(executor, name, senders, args.calls, args.concurrency))
+        print(f"{label:6s}: {args.calls} calls in {elapsed:6.2f}s  {args.calls / elapsed:8.0f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
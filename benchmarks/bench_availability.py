@@ -0,0 +1,105 @@
+"""Hotel availability query latency against a large inventory table.
+
+Seeds a throwaway test database with hotels and a year of per-night room
+inventory (as if many bookings had been made), then times "is hotel X free
+for N nights from D", "which hotels are full during this stay" and a hotel
+search filtered to free hotels.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_availability.py --hotels 5000 --nights 365
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection
+
+from chatbot.availability import is_available, unavailable_hotel_ids
+from chatbot.hotel_search import HotelSearchService
+from chatbot.models import Hotel, HotelRoomInventory
+
+CITIES = ["Goa", "Manali", "Jaipur", "Udaipur", "Kochi", "Leh", "Shimla", "Rishikesh", "Ooty", "Munnar"]
+START = date(2025, 1, 1)
+
+
+def seed(hotels, nights, batch=50000):
+    rng = random.Random(42)
+    Hotel.objects.bulk_create([
+        Hotel(name=f"Hotel {i}", location=rng.choice(CITIES), rating=f"{rng.uniform(3, 5):.1f}",
+              price_per_night=rng.randint(1000, 15000), amenities="Free Wi-Fi", rooms=rng.randint(5, 60))
+        for i in range(hotels)
+    ], batch_size=5000)
+    rooms = dict(Hotel.objects.values_list("id", "rooms"))
+    rows = []
+    for hotel_id, capacity in rooms.items():
+        for night in range(nights):
+            if rng.random() < 0.6:  # nights with at least one booking
+                rows.append(HotelRoomInventory(hotel_id=hotel_id, night=START + timedelta(days=night),
+                                               rooms_booked=rng.randint(1, capacity)))
+            if len(rows) >= batch:
+                HotelRoomInventory.objects.bulk_create(rows)
+                rows = []
+    HotelRoomInventory.objects.bulk_create(rows)
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    return list(rooms)
+
+
+def timed(fn, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=2000)
+    parser.add_argument("--nights", type=int, default=365)
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    connection.creation.create_test_db(verbosity=0)
+    start = time.perf_counter()
+    hotel_ids = seed(args.hotels, args.nights)
+    print(f"Seeded {args.hotels} hotels, {HotelRoomInventory.objects.count()} inventory rows "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(7)
+
+    def stay():
+        return START + timedelta(days=rng.randrange(args.nights - 14)), rng.randint(1, 7), rng.randint(1, 6)
+
+    p50, p99 = timed(lambda: is_available(rng.choice(hotel_ids), *stay()), args.runs)
+    print(f"is_available            : p50={p50:7.2f}ms  p99={p99:7.2f}ms")
+
+    p50, p99 = timed(lambda: unavailable_hotel_ids(*stay()), max(args.runs // 10, 10))
+    print(f"unavailable_hotel_ids   : p50={p50:7.2f}ms  p99={p99:7.2f}ms")
+
+    service = HotelSearchService("cache")
+    service.search("goa")  # build the index outside the timing
+    p50, p99 = timed(lambda: service.search(rng.choice(CITIES), {"stay": stay()}, page_size=10),
+                     max(args.runs // 10, 10))
+    print(f"free hotels in a city   : p50={p50:7.2f}ms  p99={p99:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
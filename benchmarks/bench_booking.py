@@ -0,0 +1,99 @@
+"""Concurrent flight booking: no overselling, no double booking, bookings per second.
+
+Starts ``--bookers`` threads that all try to book one seat on the same flight
+at once through ``chatbot.booking.book_flight``. Each booker sends its request
+twice with the same idempotency key, like a Rasa action retry. Afterwards the
+seat count, booking rows and sold-out refusals must add up exactly.
+
+Uses a file-backed SQLite test database (with a generous busy timeout) unless
+another database is configured.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_booking.py --bookers 100 --seats 60
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from chatbot.booking import SoldOut, book_flight
+from chatbot.models import Booking, Flight, FlightBooking
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookers", type=int, default=100)
+    parser.add_argument("--seats", type=int, default=60)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    db = connection.settings_dict
+    if connection.vendor == "sqlite":
+        db["TEST"] = {**db.get("TEST", {}), "NAME": os.path.join(tempfile.mkdtemp(), "bench.sqlite3")}
+        db["OPTIONS"] = {**db.get("OPTIONS", {}), "timeout": 60}
+    connection.creation.create_test_db(verbosity=0)
+
+    flight = Flight.objects.create(flight_number="QY1", origin="Delhi", destination="Goa",
+                                   departure_time=timezone.make_aware(datetime(2025, 8, 10, 9)),
+                                   price=5000, seats_available=args.seats)
+    users = [User.objects.create_user(username=f"booker{i}") for i in range(args.bookers)]
+
+    barrier = threading.Barrier(args.bookers)
+    outcomes = {"booked": 0, "replayed": 0, "sold_out": 0, "error": 0}
+    lock = threading.Lock()
+
+    def booker(user):
+        barrier.wait()
+        try:
+            for _ in range(2):  # original request + retry with the same key
+                try:
+                    _, created = book_flight(user, flight.pk, idempotency_key=f"{user.username}-1")
+                    outcome = "booked" if created else "replayed"
+                except SoldOut:
+                    outcome = "sold_out"
+                except Exception as e:
+                    print(f"{user.username}: {e!r}")
+                    outcome = "error"
+                with lock:
+                    outcomes[outcome] += 1
+        finally:
+            close_old_connections()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.bookers) as pool:
+        list(pool.map(booker, users))
+    elapsed = time.perf_counter() - start
+
+    flight.refresh_from_db()
+    expected = min(args.seats, args.bookers)
+    rows = FlightBooking.objects.count()
+    print(f"{args.bookers} bookers x 2 requests on a {args.seats}-seat flight in {elapsed:.2f}s "
+          f"({args.bookers * 2 / elapsed:.0f} requests/s)")
+    print(f"outcomes: {outcomes}")
+    print(f"seats left={flight.seats_available}  flight bookings={rows}  "
+          f"bookings={Booking.objects.count()}  expected bookings={expected}")
+    ok = (rows == expected == outcomes["booked"] and flight.seats_available == args.seats - expected
+          and Booking.objects.count() == expected and outcomes["error"] == 0)
+    print("OK" if ok else "INCONSISTENT")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
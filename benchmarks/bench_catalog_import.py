@@ -0,0 +1,117 @@
+"""Throughput and memory of ``import_catalog`` as feeds grow.
+
+Writes a flights CSV of each ``--sizes`` rows to a temporary file and
+imports it into a throwaway database with ``chatbot.catalog_import``. It
+then imports a delta feed that changes ``--delta-share`` of the flights
+(price and seats only) and deletes 1%. Peak Python memory is measured with
+``tracemalloc`` in a separate run, so it does not slow the timed one. It
+should stay flat as the feed grows. ``DEBUG`` is turned off, as in
+production, so Django's query log does not count. The first size is also imported row by
+row with ``update_or_create``, the way one-off scripts did it.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_catalog_import.py --sizes 10000 50000 200000
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django  # noqa: E402
+
+django.setup()
+logging.disable(logging.CRITICAL)
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from chatbot.catalog_import import FEEDS, import_feed, read_rows  # noqa: E402
+from chatbot.models import Flight  # noqa: E402
+
+COLUMNS = ["flight_number", "origin", "destination", "departure_time", "price", "seats_available"]
+CITIES = ["Delhi", "Mumbai", "Goa", "Manali", "Jaipur", "Kochi", "Leh", "Chennai"]
+
+
+def write_feed(path, size, delta_share=None):
+    start = datetime(2030, 1, 1, 6, 0)
+    step = max(int(1 / delta_share), 1) if delta_share else 1
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS + ["deleted"])
+        for i in range(0, size, step):
+            if delta_share is None:
+                writer.writerow([f"FL{i:07d}", CITIES[i % 8], CITIES[(i + 3) % 8],
+                                 (start + timedelta(minutes=7 * i)).isoformat(), 3000 + i % 5000, 180, ""])
+            elif i % 100 == 0:
+                writer.writerow([f"FL{i:07d}", "", "", "", "", "", "true"])
+            else:
+                writer.writerow([f"FL{i:07d}", "", "", "", 2500 + i % 4000, 150, ""])
+
+
+def timed_import(path, **kwargs):
+    with open(path, encoding="utf-8", newline="") as f:
+        return import_feed(FEEDS["flights"], read_rows(f, "csv"), **kwargs)
+
+
+def traced_peak_mb(path, **kwargs):
+    Flight.objects.all().delete()
+    tracemalloc.start()
+    timed_import(path, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def row_by_row(path):
+    start = time.perf_counter()
+    with open(path, encoding="utf-8", newline="") as f:
+        for _, row in read_rows(f, "csv"):
+            Flight.objects.update_or_create(flight_number=row["flight_number"], defaults={
+                "origin": row["origin"], "destination": row["destination"],
+                "departure_time": timezone.make_aware(datetime.fromisoformat(row["departure_time"])),
+                "price": row["price"], "seats_available": row["seats_available"],
+            })
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--delta-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    settings.DEBUG = False
+    connection.creation.create_test_db(verbosity=0)
+    tmp = tempfile.mkdtemp()
+    options = {"chunk_size": args.chunk_size}
+    for size in args.sizes:
+        full, delta = os.path.join(tmp, f"full-{size}.csv"), os.path.join(tmp, f"delta-{size}.csv")
+        write_feed(full, size)
+        write_feed(delta, size, args.delta_share)
+        peak = traced_peak_mb(full, **options)
+
+        Flight.objects.all().delete()
+        stats = timed_import(full, **options)
+        print(f"{size:>8} rows  full : {stats.rows_per_second:9,.0f} rows/s  peak {peak:6.1f}MB  ({stats.summary()})")
+        stats = timed_import(delta, **options)
+        print(f"{'':>8}       delta: {stats.rows_per_second:9,.0f} rows/s  ({stats.summary()})")
+
+    size = args.sizes[0]
+    Flight.objects.all().delete()
+    elapsed = row_by_row(os.path.join(tmp, f"full-{size}.csv"))
+    print(f"{size:>8} rows  update_or_create row by row: {size / elapsed:9,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Load benchmark: the old sync chat view (WSGI) vs the async one (ASGI).
+
+Starts a local stub Rasa server and drives ``/chat/`` through Django's full
+handler stack twice:
+
+* sync  - the view as it was before it went async, calling Rasa with a
+          blocking ``requests.post`` (a new connection per message), on a
+          fixed pool of worker threads like a WSGI server with N workers.
+* async - the current ``chat_with_rasa`` on one event loop, with C
+          concurrent chats sharing the pooled client.
+
+Replies that are really errors (non-2xx, or the views' "Error communicating
+with Rasa server." / "Something went wrong." fallbacks) are reported as
+``failed`` and left out of req/s and the latency percentiles.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_chat_async.py --requests 1000 --workers 8 --concurrency 100 --delay 0.05
+
+Reading the numbers: the sync path never has more than ``--workers`` chats in
+flight, so its latency stays near the stub delay and its throughput is capped
+at workers / latency. The async path admits ``--concurrency`` chats at once;
+once that is more than the CPU can turn around in one stub delay, requests
+queue on the event loop and p50/p99 grow with concurrency / throughput
+(Little's law) while req/s levels off. On one core, 1000 requests, 50ms stub:
+
+    sync            8 workers   ~110 req/s  p50  72ms  p99  110ms
+    async  concurrency 8        ~105 req/s  p50  70ms  p99  150ms
+    async  concurrency 100      ~165 req/s  p50 510ms  p99 1330ms
+
+Compare latency at the same concurrency, and throughput at the concurrency
+you expect in production. Before the pooled client was sharded
+(``UPSTREAM_POOL_SHARDS``) and the stock middleware ran inline
+(``chatbot/middleware.py``), async at concurrency 100 managed ~120 req/s with
+p99 over 2s.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+
+from stubs import RasaStubHandler, start_stub
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# Replies the chat views fall back to when Rasa could not be reached.
+ERROR_REPLIES = {"Error communicating with Rasa server.", "Something went wrong."}
+
+
+def failed(response):
+    """A non-2xx response or an error fallback reply is a failure, not a served chat."""
+    if not 200 <= response.status_code < 300:
+        return True
+    try:
+        return response.json().get("reply") in ERROR_REPLIES
+    except ValueError:
+        return True
+
+
+def report(name, results, elapsed):
+    """``results`` is a list of ``(latency, failed)``; only successes count towards req/s and latency."""
+    latencies = [latency for latency, fail in results if not fail]
+    failures = len(results) - len(latencies)
+    if not latencies:
+        print(f"{name:>5}: all {failures} requests failed")
+        return
+    print(
+        f"{name:>5}: {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50={statistics.median(latencies) * 1000:7.1f}ms  "
+        f"p99={percentile(latencies, 99) * 1000:7.1f}ms  "
+        f"failed={failures}"
+    )
+
+
+def legacy_chat_with_rasa(request):
+    """``chat_with_rasa`` before the async rewrite, for the sync baseline (anonymous turns only)."""
+    from django.conf import settings
+    from django.http import JsonResponse
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("message", "").strip()
+        rasa_response = requests.post(
+            settings.RASA_WEBHOOK_URL,
+            json={"sender": "anonymous", "message": user_message},
+            timeout=10
+        )
+        rasa_response.raise_for_status()
+        messages = rasa_response.json()
+        bot_reply = " ".join([msg.get("text", "") for msg in messages]).strip() or \
+            "Sorry, I didn't understand that."
+        buttons = next((msg["buttons"] for msg in messages if "buttons" in msg), [])
+        custom_payload = next((msg["custom"] for msg in messages if "custom" in msg), None)
+        return JsonResponse({"reply": bot_reply, "buttons": buttons, "custom": custom_payload})
+    except requests.exceptions.RequestException:
+        return JsonResponse({"reply": "Error communicating with Rasa server."})
+
+
+legacy_chat_with_rasa.csrf_exempt = True
+
+
+def run_sync(total, workers):
+    from django.test import Client, override_settings
+    from django.urls import path
+
+    # Serve /chat/ from the legacy view through the same handler stack.
+    urlconf = type(sys)("legacy_urls")
+    urlconf.urlpatterns = [path("chat/", legacy_chat_with_rasa)]
+    body = json.dumps({"message": "hello"})
+
+    def one(_):
+        start = time.perf_counter()
+        response = Client().post("/chat/", body, content_type="application/json")
+        return time.perf_counter() - start, failed(response)
+
+    start = time.perf_counter()
+    with override_settings(ROOT_URLCONF=urlconf), ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, range(total)))
+    return results, time.perf_counter() - start
+
+
+async def run_async(total, concurrency):
+    from django.test import AsyncClient
+    from chatbot.upstream import close_clients
+
+    body = json.dumps({"message": "hello"})
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/chat/", body, content_type="application/json")
+            return time.perf_counter() - start, failed(response)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await close_clients()
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8, help="sync worker threads (WSGI workers)")
+    parser.add_argument("--concurrency", type=int, default=100, help="in-flight chats on the async path")
+    parser.add_argument("--delay", type=float, default=0.05, help="stub Rasa response delay in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(RasaStubHandler, delay=args.delay)
+    os.environ["RASA_WEBHOOK_URL"] = f"{base_url}/webhooks/rest/webhook"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+    import django
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    logging.disable(logging.CRITICAL)
+
+    print(f"{args.requests} requests, stub delay {args.delay * 1000:.0f}ms, "
+          f"{args.workers} sync workers, async concurrency {args.concurrency}")
+    report("sync", *run_sync(args.requests, args.workers))
+    report("async", *asyncio.run(run_async(args.requests, args.concurrency)))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Latency of ``/chat/auto/`` vs asking Rasa first and the LLM only when Rasa gives up.
+
+Starts stub Rasa and OpenRouter servers and sends a mix of messages Rasa
+understands and messages it does not (the stub answers those with an empty
+reply and low NLU confidence). Compares:
+
+* ``sequential`` - ``/chat/``, then ``/chat/ai/`` if Rasa replied "Sorry, I
+  didn't understand that.", the best a client could do before
+* ``auto``       - one ``/chat/auto/`` call racing Rasa against the LLM
+
+Usage (from the repository root):
+
+    python benchmarks/bench_chat_auto.py --requests 200 --rasa-delay 0.05 --llm-delay 0.4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+
+from stubs import OpenRouterStubHandler, RasaStubHandler, start_stub
+
+NOT_UNDERSTOOD = "Sorry, I didn't understand that."
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+async def drive(strategy, messages, concurrency):
+    from django.test import AsyncClient
+    from chatbot.upstream import close_clients
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(path, message):
+        response = await client.post(path, json.dumps({"message": message}), content_type="application/json")
+        return response.json()["reply"]
+
+    async def one(message):
+        async with semaphore:
+            start = time.perf_counter()
+            if strategy == "auto":
+                await post("/chat/auto/", message)
+            elif await post("/chat/", message) == NOT_UNDERSTOOD:
+                await post("/chat/ai/", message)
+            return "fallback" in message, time.perf_counter() - start
+
+    results = await asyncio.gather(*(one(m) for m in messages))
+    await close_clients()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--fallback-share", type=float, default=0.3, help="share of messages Rasa does not understand")
+    parser.add_argument("--rasa-delay", type=float, default=0.05)
+    parser.add_argument("--llm-delay", type=float, default=0.4)
+    args = parser.parse_args()
+
+    rasa, rasa_url = start_stub(RasaStubHandler, delay=args.rasa_delay)
+    llm, llm_url = start_stub(OpenRouterStubHandler, delay=args.llm_delay)
+    os.environ["RASA_WEBHOOK_URL"] = f"{rasa_url}/webhooks/rest/webhook"
+    os.environ["RASA_PARSE_URL"] = f"{rasa_url}/model/parse"
+    os.environ["OPENROUTER_URL"] = f"{llm_url}/api/v1/chat/completions"
+    os.environ["LLM_CACHE_SIMILARITY"] = "0"  # every fallback message must reach the LLM
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+    import django
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    logging.disable(logging.CRITICAL)
+
+    from chatbot.response_cache import get_response_cache
+
+    step = round(1 / args.fallback_share) if args.fallback_share else 0
+    messages = [
+        f"fallback question {i}" if step and i % step == 0 else f"hotels in city {i}"
+        for i in range(args.requests)
+    ]
+    print(f"{args.requests} messages, Rasa {args.rasa_delay * 1000:.0f}ms, LLM {args.llm_delay * 1000:.0f}ms")
+    for strategy in ("sequential", "auto"):
+        get_response_cache().clear()
+        results = asyncio.run(drive(strategy, messages, args.concurrency))
+        for label, fallback in (("understood", False), ("fallback", True)):
+            latencies = [elapsed for is_fallback, elapsed in results if is_fallback == fallback]
+            if latencies:
+                print(f"{strategy:>10} {label:>10}: p50={statistics.median(latencies) * 1000:7.1f}ms  "
+                      f"p99={percentile(latencies, 99) * 1000:7.1f}ms")
+    rasa.shutdown()
+    llm.shutdown()
+
+
+if __name__ == "__main__":
+    main()
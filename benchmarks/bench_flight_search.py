@@ -0,0 +1,106 @@
+"""Flight search latency on a large seeded dataset.
+
+Seeds a throwaway test database (SQLite by default, the configured backend
+otherwise) with synthetic flights, prints the query plan of a route search to
+confirm the composite index is used, and times route/date searches and deep
+cursor pages.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_flight_search.py --flights 1000000 --searches 500
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from chatbot.flight_search import search_flights
+from chatbot.models import Flight
+
+CITIES = ["Delhi", "Mumbai", "Goa", "Bengaluru", "Chennai", "Kolkata", "Jaipur", "Kochi", "Pune", "Leh",
+          "Srinagar", "Hyderabad", "Ahmedabad", "Lucknow", "Varanasi", "Udaipur", "Amritsar", "Bhopal"]
+START = timezone.make_aware(datetime(2025, 1, 1))
+DAYS = 365
+
+
+def seed(count, batch=20000):
+    rng = random.Random(42)
+    for offset in range(0, count, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, count)):
+            origin, destination = rng.sample(CITIES, 2)
+            rows.append(Flight(
+                flight_number=f"QY{i:07d}",
+                origin=origin,
+                destination=destination,
+                departure_time=START + timedelta(minutes=rng.randrange(DAYS * 24 * 60)),
+                price=rng.randint(2000, 20000),
+                seats_available=rng.randint(0, 180),
+            ))
+        Flight.objects.bulk_create(rows)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("ANALYZE")
+
+
+def timed(fn, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flights", type=int, default=200000)
+    parser.add_argument("--searches", type=int, default=300)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    connection.creation.create_test_db(verbosity=0)
+    start = time.perf_counter()
+    seed(args.flights)
+    print(f"Seeded {args.flights} flights in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(7)
+
+    def route_search():
+        origin, destination = rng.sample(CITIES, 2)
+        day = (START + timedelta(days=rng.randrange(DAYS))).date()
+        return search_flights(origin=origin, destination=destination, date_from=day,
+                              date_to=day + timedelta(days=3), seats=2, limit=20)
+
+    plan = Flight.objects.annotate(o=Lower("origin"), d=Lower("destination")).filter(
+        o="delhi", d="goa", departure_time__gte=START).order_by("departure_time", "id")[:20].explain()
+    print(f"Route search plan: {plan}")
+
+    p50, p99 = timed(route_search, args.searches)
+    print(f"route+date search : p50={p50:6.2f}ms  p99={p99:6.2f}ms")
+
+    _, cursor = search_flights(destination="Goa", limit=50)
+    for _ in range(200):  # walk deep into the result set
+        _, cursor = search_flights(destination="Goa", cursor=cursor, limit=50)
+    p50, p99 = timed(lambda: search_flights(destination="Goa", cursor=cursor, limit=50), args.searches)
+    print(f"page 200 via cursor: p50={p50:6.2f}ms  p99={p99:6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
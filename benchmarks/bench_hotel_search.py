@@ -0,0 +1,100 @@
+"""Per-turn latency of the hotel-search backends used by the hotel-cards action.
+
+Seeds a throwaway test database with hotels, serves Django over a local WSGI
+server for the ``http`` backend (the old loopback behaviour), and times a
+search-plus-card-shaping turn for each backend.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_hotel_search.py --hotels 5000 --turns 500
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django
+
+django.setup()
+
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+from chatbot.hotel_search import HttpBackend, HotelSearchService
+from chatbot.models import Hotel
+
+CITIES = ["Goa", "Manali", "Shimla", "Jaipur", "Udaipur", "Munnar", "Ooty", "Leh", "Rishikesh", "Darjeeling"]
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def seed(count):
+    Hotel.objects.bulk_create(
+        Hotel(
+            name=f"Hotel {i}",
+            location=CITIES[i % len(CITIES)],
+            rating=round(random.uniform(3, 5), 1),
+            price_per_night=random.randint(1500, 15000),
+            amenities="Free Wi-Fi, Breakfast",
+        )
+        for i in range(count)
+    )
+
+
+def time_turns(service, turns):
+    latencies = []
+    for i in range(turns):
+        start = time.perf_counter()
+        service.cards(CITIES[i % len(CITIES)].lower())
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    connection.creation.create_test_db(verbosity=0)
+    seed(args.hotels)
+
+    server = make_server("127.0.0.1", 0, get_wsgi_application(),
+                         server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    backends = {
+        "cache": HotelSearchService("cache"),
+        "orm": HotelSearchService("orm"),
+        "http": HotelSearchService(HttpBackend(f"http://127.0.0.1:{server.server_address[1]}")),
+    }
+    print(f"{args.hotels} hotels, {args.turns} turns per backend ({args.hotels // len(CITIES)} hits per search)")
+    for name, service in backends.items():
+        service.cards("goa")  # warm up
+        latencies = sorted(time_turns(service, args.turns))
+        print(
+            f"{name:>5}: p50={statistics.median(latencies) * 1000:8.2f}ms  "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:8.2f}ms"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Chat-turn write throughput: one INSERT per turn vs the batched message log.
+
+Concurrent "chat handlers" (threads) each record a number of turns, either by
+calling ``UserMessage.objects.create`` inline (what the views did before) or
+by handing them to ``MessageLog``, which writes them with ``bulk_create`` from
+its writer thread. Uses a file-backed SQLite test database so commits pay the
+real fsync and write-lock cost.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_message_log.py --threads 16 --turns 200
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, close_old_connections, connection
+
+from chatbot.message_log import MessageLog
+from chatbot.models import UserMessage
+
+
+def run(record, users, turns):
+    errors = []
+
+    def handler(user):
+        try:
+            for i in range(turns):
+                try:
+                    record(user, i)
+                except OperationalError as e:  # "database is locked" under write contention
+                    errors.append(e)
+        finally:
+            close_old_connections()
+
+    UserMessage.objects.all().delete()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        list(pool.map(handler, users))
+    return start, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=200, help="turns recorded per thread")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    db = connection.settings_dict
+    if connection.vendor == "sqlite":
+        db["TEST"] = {**db.get("TEST", {}), "NAME": os.path.join(tempfile.mkdtemp(), "bench.sqlite3")}
+    connection.creation.create_test_db(verbosity=0)
+    users = [User.objects.create_user(username=f"bench{i}") for i in range(args.threads)]
+    total = args.threads * args.turns
+
+    def inline(user, i):
+        UserMessage.objects.create(user=user, message=f"question {i}", response="answer")
+
+    start, errors = run(inline, users, args.turns)
+    elapsed = time.perf_counter() - start
+    written = UserMessage.objects.count()
+    print(f"inline create : {written:6d}/{total} rows in {elapsed:6.2f}s  "
+          f"{written / elapsed:8.0f} rows/s  errors={len(errors)}")
+
+    log = MessageLog(BATCH_SIZE=args.batch_size, FLUSH_INTERVAL=0.05, DEDUP_WINDOW=0)
+
+    def batched(user, i):
+        log.log(user.id, f"question {i}", "answer")
+
+    start, errors = run(batched, users, args.turns)
+    enqueued = time.perf_counter() - start
+    log.stop()
+    elapsed = time.perf_counter() - start
+    written = UserMessage.objects.count()
+    print(f"message log   : {written:6d}/{total} rows in {elapsed:6.2f}s  "
+          f"{written / elapsed:8.0f} rows/s  errors={len(errors)}  "
+          f"(handlers done after {enqueued:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""NLU parse latency with and without the parse cache of ``actions/nlu_cache.py``.
+
+Replays the examples in ``data/nlu.yml`` as a stream of ``--messages``
+messages in which a few examples are much more common than the rest (Zipf
+weights, as with greetings and button texts in real traffic). Some messages
+are re-cased at random. The stream goes once through the model's
+``parse_message`` as is, and once with the cache installed, as
+``CachedRestInput`` does on the Rasa server.
+
+With ``--model`` (needs Rasa) a trained model is loaded and parsed for
+real. Without it a stand-in parser taking ``--stub-delay`` seconds is used,
+which still shows the hit rate of the replayed stream.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_nlu_cache.py --model models/ --messages 2000
+    python benchmarks/bench_nlu_cache.py --messages 2000 --stub-delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actions.nlu_cache import ParseCache, install  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+ENTITY_RE = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def load_examples(path):
+    with open(path, encoding="utf-8") as f:
+        nlu = yaml.safe_load(f).get("nlu", [])
+    examples = []
+    for block in nlu:
+        for line in (block.get("examples") or "").splitlines():
+            line = line.strip()
+            if line.startswith("- "):
+                examples.append(ENTITY_RE.sub(r"\1", line[2:].strip()))
+    return examples
+
+
+def message_stream(examples, total, seed=0):
+    rng = random.Random(seed)
+    shuffled = examples[:]
+    rng.shuffle(shuffled)
+    weights = [1 / (rank + 1) for rank in range(len(shuffled))]
+    stream = rng.choices(shuffled, weights=weights, k=total)
+    return [text.lower() if rng.random() < 0.3 else text for text in stream]
+
+
+class Message:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubProcessor:
+    """Stands in for Rasa's MessageProcessor when no model is given."""
+
+    model_filename = "stub"
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def parse_message(self, message, tracker=None, only_output_properties=True):
+        time.sleep(self.delay)  # inference is CPU-bound and blocks the loop in Rasa too
+        return {"text": message.text, "intent": {"name": "greet", "confidence": 0.9}, "entities": []}
+
+
+def load_processor(args):
+    if not args.model:
+        return StubProcessor(args.stub_delay), Message
+    from rasa.core.agent import Agent
+    from rasa.core.channels.channel import UserMessage
+
+    return Agent.load(args.model).processor, UserMessage
+
+
+async def replay(processor, message_cls, stream):
+    latencies = []
+    for text in stream:
+        start = time.perf_counter()
+        await processor.parse_message(message_cls(text))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="trained Rasa model (file or directory); omit to use a stand-in parser")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--cache-size", type=int, default=5000)
+    parser.add_argument("--stub-delay", type=float, default=0.02, help="stand-in parse time in seconds")
+    parser.add_argument("--nlu", default=os.path.join(ROOT, "data", "nlu.yml"))
+    args = parser.parse_args()
+
+    examples = load_examples(args.nlu)
+    stream = message_stream(examples, args.messages)
+    print(f"{len(stream)} messages replayed from {len(examples)} examples in {args.nlu}, "
+          f"{len(set(text.lower() for text in stream))} distinct")
+
+    for label, cached in (("uncached", False), ("cached", True)):
+        processor, message_cls = load_processor(args)
+        cache = ParseCache(max_size=args.cache_size)
+        if cached:
+            install(processor, cache)
+        start = time.perf_counter()
+        latencies = asyncio.run(replay(processor, message_cls, stream))
+        elapsed = time.perf_counter() - start
+        print(f"{label:>8}: {len(latencies) / elapsed:8.1f} msg/s  "
+              f"p50={statistics.median(latencies) * 1000:7.3f}ms  p99={percentile(latencies, 99) * 1000:7.3f}ms")
+        if cached:
+            print(f"          {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
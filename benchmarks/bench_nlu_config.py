@@ -0,0 +1,171 @@
+"""Train and compare Rasa configs: training time, memory, model size, parse latency and intent F1.
+
+Each config is trained on ``data/`` and ``domain.yml`` with
+``--fixed-model-name``, so runs are reproducible. Training and serving each
+run in a fresh worker process, so the reported peak memory belongs to one
+config only. The serving worker loads the model and parses every user message of
+``tests/test_stories.yml`` (``--repeat`` times, for stable latencies). It
+scores the predicted intents with a weighted F1 over the test steps whose
+intent is in the domain. Steps with other intents are counted as skipped.
+
+Needs Rasa (``pip install -r mysite/requirements.txt``).
+
+Usage (from the repository root):
+
+    python benchmarks/bench_nlu_config.py --configs config.yml config.cpu.yml --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ENTITY_RE = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def test_messages(path):
+    """``(text, intent)`` for every user step in the test stories."""
+    with open(path, encoding="utf-8") as f:
+        stories = yaml.safe_load(f).get("stories", [])
+    return [
+        (ENTITY_RE.sub(r"\1", step["user"]).strip(), step["intent"])
+        for story in stories for step in story.get("steps", [])
+        if "user" in step and "intent" in step
+    ]
+
+
+def domain_intents(path):
+    with open(path, encoding="utf-8") as f:
+        intents = yaml.safe_load(f).get("intents", [])
+    return {next(iter(intent)) if isinstance(intent, dict) else intent for intent in intents}
+
+
+def weighted_f1(pairs):
+    """Support-weighted F1 over the true labels of ``(true, predicted)`` pairs."""
+    total, score = len(pairs), 0.0
+    for label in {true for true, _ in pairs}:
+        tp = sum(1 for true, predicted in pairs if true == label and predicted == label)
+        fp = sum(1 for true, predicted in pairs if true != label and predicted == label)
+        support = sum(1 for true, _ in pairs if true == label)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / support
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        score += f1 * support / total
+    return score
+
+
+def train_worker(args):
+    from rasa.model_training import train
+
+    start = time.perf_counter()
+    result = train(
+        domain=os.path.join(ROOT, "domain.yml"),
+        config=args.config,
+        training_files=os.path.join(ROOT, "data"),
+        output=args.out,
+        fixed_model_name=args.name,
+        force_training=True,
+    )
+    return {"model": result.model, "train_seconds": time.perf_counter() - start, "train_peak_mb": peak_rss_mb()}
+
+
+def serve_worker(args):
+    from rasa.core.agent import Agent
+
+    start = time.perf_counter()
+    agent = Agent.load(args.model)
+    load_seconds = time.perf_counter() - start
+
+    intents = domain_intents(os.path.join(ROOT, "domain.yml"))
+    messages = test_messages(args.test_stories)
+
+    async def parse_all():
+        latencies, pairs = [], []
+        for text, intent in messages:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                parsed = await agent.parse_message(text)
+                latencies.append(time.perf_counter() - start)
+            if intent in intents:
+                pairs.append((intent, (parsed.get("intent") or {}).get("name")))
+        return latencies, pairs
+
+    latencies, pairs = asyncio.run(parse_all())
+    return {
+        "load_seconds": load_seconds,
+        "serve_peak_mb": peak_rss_mb(),
+        "parse_p50_ms": statistics.median(latencies) * 1000,
+        "parse_p99_ms": percentile(latencies, 99) * 1000,
+        "intent_f1": weighted_f1(pairs) if pairs else None,
+        "scored": len(pairs),
+        "skipped": len(messages) - len(pairs),
+    }
+
+
+def run_worker(*argv):
+    output = subprocess.run([sys.executable, __file__, *argv], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, text=True).stdout
+    # Rasa prints progress to stdout as well; the result is the last line.
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=["config.yml", "config.cpu.yml"])
+    parser.add_argument("--test-stories", default=os.path.join(ROOT, "tests", "test_stories.yml"))
+    parser.add_argument("--repeat", type=int, default=20, help="parses per test message")
+    parser.add_argument("--out", help="directory for the trained models (default: a temporary one)")
+    parser.add_argument("--worker", choices=["train", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    parser.add_argument("--name", help=argparse.SUPPRESS)
+    parser.add_argument("--model", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = train_worker(args) if args.worker == "train" else serve_worker(args)
+        print(json.dumps(result))
+        return
+
+    out = args.out or tempfile.mkdtemp(prefix="nlu-config-")
+    rows = []
+    for config in args.configs:
+        name = os.path.splitext(os.path.basename(config))[0].replace(".", "-")
+        print(f"training {config} ...", flush=True)
+        trained = run_worker("--worker", "train", "--config", os.path.abspath(config), "--out", out, "--name", name)
+        served = run_worker("--worker", "serve", "--model", trained["model"],
+                            "--test-stories", args.test_stories, "--repeat", str(args.repeat))
+        rows.append((config, trained, served, os.path.getsize(trained["model"]) / 1024 / 1024))
+
+    print(f"\nmodels in {out}")
+    print(f"{'config':<16} {'train s':>8} {'train MB':>9} {'model MB':>9} {'load s':>7} {'serve MB':>9} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'intent F1':>9}")
+    for config, trained, served, size in rows:
+        f1 = "n/a" if served["intent_f1"] is None else f"{served['intent_f1']:.3f}"
+        print(f"{config:<16} {trained['train_seconds']:8.1f} {trained['train_peak_mb']:9.0f} {size:9.1f} "
+              f"{served['load_seconds']:7.1f} {served['serve_peak_mb']:9.0f} {served['parse_p50_ms']:7.2f} "
+              f"{served['parse_p99_ms']:7.2f} {f1:>9}")
+    skipped = rows[0][2]["skipped"] if rows else 0
+    if skipped:
+        print(f"\n{skipped} test steps use intents that are not in domain.yml and were not scored")
+
+
+if __name__ == "__main__":
+    main()
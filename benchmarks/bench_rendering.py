@@ -0,0 +1,110 @@
+"""Per-turn cost of the catalog responses: rendered on every turn vs pre-rendered.
+
+For each catalog size, times the three catalog turns (package list,
+destinations for a category, package detail) in two ways:
+
+* ``per-turn``    - rebuilding the text and buttons from the snapshot rows on
+  every turn, as the actions used to
+* ``pre-rendered`` - a lookup in ``chatbot.rendering.CatalogResponses``
+
+It also reports the one-off cost of rendering everything when the catalog changes.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_rendering.py --sizes 100 1000 10000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django
+
+django.setup()
+
+from chatbot.catalog import CatalogSnapshot
+from chatbot.rendering import CatalogResponses
+
+CATEGORIES = ["beach", "mountain", "city"]
+
+
+def make_snapshot(size):
+    rng = random.Random(size)
+    packages = [
+        {"id": i, "name": f"Package {i}", "destination": f"Destination {i % 200}",
+         "description": "Sun, sand and a week of doing nothing at all.", "price": f"{rng.randint(5, 90)}000.00",
+         "duration_days": rng.randint(2, 12), "category": rng.choice(CATEGORIES), "image": None}
+        for i in range(size)
+    ]
+    return CatalogSnapshot(1, packages, [])
+
+
+def per_turn_list(snapshot):
+    message = "Here are some available travel packages:\n"
+    for p in snapshot.packages:
+        message += f"- {p['name']} in {p['destination']} for {p['duration_days']} days at ₹{p['price']}\n"
+    return message
+
+
+def per_turn_destinations(snapshot, category):
+    return [
+        {"title": p["destination"], "payload": f'/package_detail{{"package_name":"{p["name"]}"}}'}
+        for p in snapshot.packages_by_category.get(category, [])
+    ]
+
+
+def per_turn_detail(snapshot, name):
+    p = snapshot.packages_by_name.get(name.lower())
+    text = (
+        f"📦 *{p['name']}*\n📍 Destination: {p['destination']}\n🗒️ {p['description']}\n"
+        f"💰 Price: ₹{p['price']}\n⏱️ Duration: {p['duration_days']} days"
+    )
+    buttons = [
+        {"title": "Book a Flight", "payload": "/book_flight"},
+        {"title": "Search Hotels", "payload": f'/search_hotels{{"location": "{p["destination"]}"}}'},
+        {"title": "Back to Packages", "payload": "/travel_packages"},
+    ]
+    return text, buttons
+
+
+def per_turn(fn, turns):
+    start = time.perf_counter()
+    for i in range(turns):
+        fn(i)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'packages':>8s}  {'turn':12s} {'per-turn':>12s} {'pre-rendered':>13s}")
+    for size in args.sizes:
+        snapshot = make_snapshot(size)
+        start = time.perf_counter()
+        responses = CatalogResponses(snapshot)
+        render_ms = (time.perf_counter() - start) * 1000
+
+        cases = [
+            ("list", lambda i: per_turn_list(snapshot), lambda i: responses.package_list),
+            ("destinations", lambda i: per_turn_destinations(snapshot, CATEGORIES[i % 3]),
+             lambda i: responses.destinations_for(CATEGORIES[i % 3])),
+            ("detail", lambda i: per_turn_detail(snapshot, f"Package {i % size}"),
+             lambda i: responses.package_detail(f"Package {i % size}")),
+        ]
+        for label, before, after in cases:
+            print(f"{size:8d}  {label:12s} {per_turn(before, args.turns):10.2f}us "
+                  f"{per_turn(after, args.turns):11.2f}us")
+        print(f"{size:8d}  {'render all':12s} {render_ms:10.2f}ms (once per catalog change)")
+
+
+if __name__ == "__main__":
+    main()
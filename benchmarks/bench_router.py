@@ -0,0 +1,131 @@
+"""Latency of button clicks on ``/chat/`` with and without the local intent router.
+
+Starts a stub Rasa server and drives ``/chat/`` through Django's full handler
+stack with a mix of button payloads (greet, categories, destinations, package
+details) on a throwaway database seeded with packages. Each turn is run once
+with the router disabled (every message goes to Rasa) and once with it
+enabled. ``--delay`` is Rasa's time to parse and predict a message;
+``--events-delay`` is the time to read its tracker or append events to it,
+which is all a routed click still costs (one read to check that no form is
+active, one append to record the turn). Client, server and stub share
+one process, so keep ``--concurrency`` low or the GIL becomes the bottleneck.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_router.py --requests 500 --concurrency 5 --delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+
+from stubs import RasaStubHandler, start_stub
+
+CATEGORIES = ["beach", "mountain", "city"]
+
+
+class RasaWithEventsStub(RasaStubHandler):
+    events_delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.events_delay)
+        super().do_GET()
+
+    def do_POST(self):
+        if self.path.endswith("/tracker/events"):
+            self._read_json()
+            time.sleep(self.events_delay)
+            self._send_json({})
+        else:
+            super().do_POST()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def clicks(total, packages):
+    payloads = ["/greet", "/travel_packages"]
+    payloads += [f'/show_destinations{{"category":"{c}"}}' for c in CATEGORIES]
+    payloads += [f'/package_detail{{"package_name":"Package {i}"}}' for i in range(packages)]
+    return [payloads[i % len(payloads)] for i in range(total)]
+
+
+async def drive(messages, concurrency):
+    from django.test import AsyncClient
+    from chatbot.upstream import close_clients
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    routes = {}
+
+    async def one(message):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/chat/", json.dumps({"message": message}), content_type="application/json")
+            routes[response["X-Route"]] = routes.get(response["X-Route"], 0) + 1
+            return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(one(m) for m in messages))
+    await close_clients()
+    return latencies, routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--packages", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="stub Rasa parse+predict delay in seconds")
+    parser.add_argument("--events-delay", type=float, default=0.002, help="stub tracker events delay in seconds")
+    args = parser.parse_args()
+
+    handler = type("Stub", (RasaWithEventsStub,), {"events_delay": args.events_delay})
+    server, base_url = start_stub(handler, delay=args.delay)
+    os.environ["RASA_WEBHOOK_URL"] = f"{base_url}/webhooks/rest/webhook"
+    os.environ["RASA_EVENTS_URL"] = base_url + "/conversations/{sender_id}/tracker/events"
+    os.environ["RASA_TRACKER_URL"] = base_url + "/conversations/{sender_id}/tracker"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+    import django
+    from django.conf import settings
+    from django.test.utils import override_settings, setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    logging.disable(logging.CRITICAL)
+
+    from django.db import connection
+    from chatbot.models import TravelPackage
+
+    connection.creation.create_test_db(verbosity=0)
+    TravelPackage.objects.bulk_create([
+        TravelPackage(name=f"Package {i}", destination=f"Destination {i}", description="Sun and sand",
+                      price=20000, duration_days=5, category=CATEGORIES[i % 3])
+        for i in range(args.packages)
+    ])
+
+    messages = clicks(args.requests, args.packages)
+    print(f"{args.requests} button clicks, Rasa delay {args.delay * 1000:.0f}ms, "
+          f"tracker events delay {args.events_delay * 1000:.0f}ms")
+    for label, enabled in (("rasa only", False), ("router", True)):
+        with override_settings(CHAT_ROUTER=dict(settings.CHAT_ROUTER, ENABLED=enabled)):
+            start = time.perf_counter()
+            latencies, routes = asyncio.run(drive(messages, args.concurrency))
+            elapsed = time.perf_counter() - start
+        print(f"{label:>9}: {len(latencies) / elapsed:8.1f} req/s  "
+              f"p50={statistics.median(latencies) * 1000:7.1f}ms  "
+              f"p99={percentile(latencies, 99) * 1000:7.1f}ms  routes={routes}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
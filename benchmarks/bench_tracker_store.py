@@ -0,0 +1,103 @@
+"""Save/retrieve latency of the Django tracker store as conversations grow.
+
+Plays ``--conversations`` interleaved conversations of ``--turns`` turns
+each through ``chatbot.event_store.EventStore``, the storage behind
+``actions.tracker_store.DjangoTrackerStore``. Every turn is a retrieve
+followed by a save of the tracker's events plus one more turn (5 events),
+as Rasa does per message. A new session starts every ``--session-turns``
+turns. Latencies are reported per stage of conversation length for:
+
+* ``no cache``  - every retrieve reloads the session from the database
+* ``validated`` - LRU cache, checked for rows from other Rasa instances
+* ``cached``    - LRU cache trusted as is (single Rasa instance)
+
+Rasa is not needed; building the ``DialogueStateTracker`` from the events
+costs the same in all three modes and is left out.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_tracker_store.py --conversations 20 --turns 400
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+import django  # noqa: E402
+
+django.setup()
+logging.disable(logging.CRITICAL)
+
+from django.db import connection  # noqa: E402
+
+from chatbot.event_store import EventStore  # noqa: E402
+from chatbot.models import ConversationEvent  # noqa: E402
+
+MODES = (("no cache", 0, True), ("validated", 1000, True), ("cached", 1000, False))
+
+
+def turn_events(turn, session_start):
+    now = time.time()
+    events = []
+    if session_start:
+        events += [{"event": "action", "name": "action_session_start", "timestamp": now},
+                   {"event": "session_started", "timestamp": now}]
+    return events + [
+        {"event": "action", "name": "action_listen", "timestamp": now},
+        {"event": "user", "text": f"show me hotels in city {turn}", "timestamp": now,
+         "parse_data": {"intent": {"name": "search_hotels", "confidence": 0.97},
+                        "entities": [{"entity": "location", "value": f"city {turn}"}]}},
+        {"event": "slot", "name": "location", "value": f"city {turn}", "timestamp": now},
+        {"event": "bot", "text": f"Here are the hotels in city {turn}.", "timestamp": now,
+         "data": {"buttons": [{"title": "Book", "payload": "/book_hotel"}]}},
+    ]
+
+
+def run(store, conversations, turns, session_turns, stages):
+    retrieve = {stage: [] for stage in stages}
+    save = {stage: [] for stage in stages}
+    for turn in range(turns):
+        stage = next(s for s in stages if turn < s)
+        for conversation in range(conversations):
+            sender_id = f"user-{conversation}"
+            start = time.perf_counter()
+            events = store.load(sender_id)
+            retrieve[stage].append(time.perf_counter() - start)
+
+            events += turn_events(turn, session_start=turn % session_turns == 0)
+            start = time.perf_counter()
+            store.save(sender_id, events)
+            save[stage].append(time.perf_counter() - start)
+    return retrieve, save
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--session-turns", type=int, default=200, help="turns per session")
+    args = parser.parse_args()
+
+    stages = sorted({s for s in (10, 50, 100, 200, 400, 800, 1600) if s < args.turns} | {args.turns})
+    connection.creation.create_test_db(verbosity=0)
+    print(f"{args.conversations} conversations x {args.turns} turns, new session every {args.session_turns} turns")
+    for label, cache_size, validate in MODES:
+        ConversationEvent.objects.all().delete()
+        store = EventStore(cache_size=cache_size, validate=validate)
+        retrieve, save = run(store, args.conversations, args.turns, args.session_turns, stages)
+        print(f"{label}:")
+        previous = 0
+        for stage in stages:
+            print(f"  turns {previous:>4}-{stage:<4} retrieve p50={statistics.median(retrieve[stage]) * 1000:7.3f}ms  "
+                  f"save p50={statistics.median(save[stage]) * 1000:7.3f}ms")
+            previous = stage
+        print(f"  {store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
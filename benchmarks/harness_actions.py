@@ -0,0 +1,54 @@
+"""Actions package for ``action_server_harness.py``.
+
+Loads the real actions from ``actions/actions.py`` (so the server registers
+them all) against the harness database, and adds a deliberately slow query
+in two flavours: sent through ``run_orm`` like the real actions, and run
+inline on the event loop like every action used to.
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'mysite'))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+
+from django.conf import settings  # noqa: E402
+
+if os.environ.get("HARNESS_DB"):
+    settings.DATABASES["default"]["NAME"] = os.environ["HARNESS_DB"]
+
+from actions.actions import run_orm  # noqa: E402
+from django.db import connection  # noqa: E402
+from rasa_sdk import Action  # noqa: E402
+
+# Counting through a recursive CTE keeps SQLite busy for a few seconds.
+SLOW_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < %s) SELECT count(*) FROM c"
+SLOW_ROWS = int(os.environ.get("HARNESS_SLOW_ROWS", "4000000"))
+
+
+def slow_query():
+    with connection.cursor() as cursor:
+        cursor.execute(SLOW_QUERY, [SLOW_ROWS])
+        return cursor.fetchone()[0]
+
+
+class ActionHarnessSlowQuery(Action):
+    def name(self):
+        return "harness_slow_query"
+
+    async def run(self, dispatcher, tracker, domain):
+        rows = await run_orm(slow_query)
+        dispatcher.utter_message(text=f"counted {rows}")
+        return []
+
+
+class ActionHarnessSlowQueryBlocking(Action):
+    """Needs DJANGO_ALLOW_ASYNC_UNSAFE, like the action server used to set globally."""
+
+    def name(self):
+        return "harness_slow_query_blocking"
+
+    def run(self, dispatcher, tracker, domain):
+        rows = slow_query()
+        dispatcher.utter_message(text=f"counted {rows}")
+        return []
@@ -0,0 +1,322 @@
+"""Load test: replay conversations through the chat endpoints and the action server.
+
+Runs the whole stack locally. Django's handler stack (middleware, async views,
+message log, router, caches) runs in-process. A real action server
+(``python -m rasa_sdk``) runs on a throwaway SQLite database shared with
+Django. Rasa and OpenRouter are local stubs (``stubs.py``) with configurable
+delays. The replayed conversations are:
+
+* ``data/stories.yml`` - every user turn as the button payload the UI sends
+  (``/intent{"entity": "value"}``) to ``/chat/``, and every custom action
+  the story runs as a call to the action server's ``/webhook``, with the
+  slots the story has set so far
+* ``tests/test_stories.yml`` - the user messages, as free text, to ``/chat/``
+* synthetic multi-turn conversations: free text from ``data/nlu.yml`` to
+  ``/chat/``, and questions Rasa does not understand to ``/chat/ai/``, as the
+  UI does after a "Sorry, I didn't understand that."
+
+``--concurrency`` virtual users, each logged in as its own user, replay
+conversations back to back for ``--duration`` seconds. They start evenly
+spread over ``--ramp`` seconds. Per endpoint the report has
+requests/s, p50/p95/p99 latency, error rate (HTTP errors and the views'
+fallback replies) and database queries per request (from ``X-DB-Queries``).
+It is written as JSON to ``--output``. ``--baseline`` prints the change
+against an earlier report.
+
+The client shares a process with Django, so the numbers are relative; compare
+runs on the same machine with the same options.
+
+Usage (from the repository root, with rasa_sdk installed):
+
+    python benchmarks/loadtest.py --concurrency 20 --ramp 5 --duration 30 --output loadtest.json
+    python benchmarks/loadtest.py --baseline loadtest.json --output loadtest-new.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.append(HERE)
+
+from action_server_harness import action_call, create_database, wait_until_up  # noqa: E402
+from stubs import OpenRouterStubHandler, RasaStubHandler, start_stub  # noqa: E402
+
+ENTITY_RE = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+
+# Replies the views send with status 200 when something failed.
+ERROR_REPLIES = {"Error communicating with Rasa server.", "Something went wrong."}
+
+WEBHOOK = "action webhook"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _load_yaml(*parts):
+    with open(os.path.join(ROOT, *parts), encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def payload(intent, entities):
+    values = {}
+    for entity in entities or []:
+        values.update(entity)
+    return f"/{intent}{json.dumps(values)}" if values else f"/{intent}"
+
+
+def story_conversations(actions):
+    """Turns of each story in ``data/stories.yml``: chat payloads and calls to the custom actions in ``actions``."""
+    conversations = []
+    for story in _load_yaml("data", "stories.yml").get("stories", []):
+        turns, slots = [], {}
+        for step in story.get("steps", []):
+            if "intent" in step:
+                for entity in step.get("entities") or []:
+                    slots.update(entity)
+                turns.append(("/chat/", payload(step["intent"], step.get("entities"))))
+            elif step.get("action") in actions:
+                turns.append((WEBHOOK, action_call(step["action"], None, dict(slots))))
+            for slot in step.get("slot_was_set") or []:
+                if isinstance(slot, dict):
+                    slots.update(slot)
+        conversations.append(turns)
+    return conversations
+
+
+def test_story_conversations():
+    return [
+        [("/chat/", step["user"].strip()) for step in story.get("steps", []) if "user" in step]
+        for story in _load_yaml("tests", "test_stories.yml").get("stories", [])
+    ]
+
+
+def synthetic_conversations(count, seed):
+    examples = [
+        ENTITY_RE.sub(r"\1", line.strip()[2:])
+        for block in _load_yaml("data", "nlu.yml").get("nlu", [])
+        for line in (block.get("examples") or "").splitlines() if line.strip().startswith("- ")
+    ]
+    rng = random.Random(seed)
+    conversations = []
+    for i in range(count):
+        turns = []
+        for turn in range(rng.randint(2, 6)):
+            if rng.random() < 0.25:
+                question = f"fallback question {rng.randint(0, 50)} about visas"
+                turns += [("/chat/", question), ("/chat/ai/", question)]
+            else:
+                turns.append(("/chat/", rng.choice(examples)))
+        conversations.append(turns)
+    return conversations
+
+
+class Results:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, endpoint, elapsed, ok, queries):
+        self.samples.setdefault(endpoint, []).append((elapsed, ok, queries))
+
+    def report(self, wall_seconds):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = [elapsed for elapsed, _, _ in samples]
+            errors = sum(1 for _, ok, _ in samples if not ok)
+            queries = [q for _, _, q in samples if q is not None]
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "rps": round(len(samples) / wall_seconds, 2),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4),
+                "latency_ms": {
+                    "p50": round(statistics.median(latencies) * 1000, 2),
+                    "p95": round(percentile(latencies, 95) * 1000, 2),
+                    "p99": round(percentile(latencies, 99) * 1000, 2),
+                    "max": round(max(latencies) * 1000, 2),
+                },
+                "db_queries": {
+                    "total": sum(queries),
+                    "per_request": round(sum(queries) / len(queries), 2),
+                    "max": max(queries),
+                } if queries else None,
+            }
+        return endpoints
+
+
+async def post_chat(client, path, message, results):
+    start = time.perf_counter()
+    try:
+        response = await client.post(path, json.dumps({"message": message}), content_type="application/json")
+        ok = response.status_code < 400 and response.json().get("reply") not in ERROR_REPLIES
+        queries = int(response["X-DB-Queries"]) if response.has_header("X-DB-Queries") else None
+    except Exception:
+        ok, queries = False, None
+    results.add(path, time.perf_counter() - start, ok, queries)
+
+
+async def post_action(http, url, call, sender_id, results):
+    call = dict(call, sender_id=sender_id, tracker=dict(call["tracker"], sender_id=sender_id))
+    start = time.perf_counter()
+    try:
+        response = await http.post(url, json=call)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    results.add(WEBHOOK, time.perf_counter() - start, ok, None)
+
+
+async def virtual_user(index, client, username, conversations, args, webhook_url, http, results, deadline):
+    await asyncio.sleep(index * args.ramp / args.concurrency)
+    rng = random.Random(args.seed + index)
+    while time.monotonic() < deadline:
+        for endpoint, turn in rng.choice(conversations):
+            if time.monotonic() >= deadline:
+                return
+            if endpoint == WEBHOOK:
+                await post_action(http, webhook_url, turn, username, results)
+            else:
+                await post_chat(client, endpoint, turn, results)
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+
+
+async def drive(clients, conversations, args, webhook_url):
+    from chatbot.upstream import close_clients
+
+    results = Results()
+    deadline = time.monotonic() + args.duration
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30) as http:
+        await asyncio.gather(*(
+            virtual_user(i, client, username, conversations, args, webhook_url, http, results, deadline)
+            for i, (username, client) in enumerate(clients)
+        ))
+    wall = time.perf_counter() - start
+    await close_clients()
+    return results, wall
+
+
+def compare(report, baseline):
+    print(f"\nchange against {baseline['generated_at']} ({baseline.get('git_commit') or 'unknown commit'}):")
+    for endpoint, now in report["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None:
+            print(f"{endpoint:>15}: new")
+            continue
+        per_request = [(stats or {}).get("per_request") for stats in (before["db_queries"], now["db_queries"])]
+        print(f"{endpoint:>15}: rps {before['rps']:.1f} -> {now['rps']:.1f}  "
+              f"p95 {before['latency_ms']['p95']:.1f} -> {now['latency_ms']['p95']:.1f}ms  "
+              f"p99 {before['latency_ms']['p99']:.1f} -> {now['latency_ms']['p99']:.1f}ms  "
+              f"errors {before['error_rate']:.2%} -> {now['error_rate']:.2%}  "
+              f"queries/req {per_request[0]} -> {per_request[1]}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which the virtual users start")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load, including the ramp")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's turns")
+    parser.add_argument("--synthetic", type=int, default=50, help="synthetic conversations in the pool")
+    parser.add_argument("--rasa-delay", type=float, default=0.05)
+    parser.add_argument("--llm-delay", type=float, default=0.4)
+    parser.add_argument("--port", type=int, default=5057, help="action server port")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    rasa, rasa_url = start_stub(RasaStubHandler, delay=args.rasa_delay)
+    llm, llm_url = start_stub(OpenRouterStubHandler, delay=args.llm_delay)
+    os.environ["RASA_WEBHOOK_URL"] = f"{rasa_url}/webhooks/rest/webhook"
+    os.environ["RASA_PARSE_URL"] = f"{rasa_url}/model/parse"
+    os.environ["RASA_EVENTS_URL"] = rasa_url + "/conversations/{sender_id}/tracker/events"
+    os.environ["RASA_TRACKER_URL"] = rasa_url + "/conversations/{sender_id}/tracker"
+    os.environ["OPENROUTER_URL"] = f"{llm_url}/api/v1/chat/completions"
+    os.environ["PROFILING_HEADERS"] = "True"
+
+    db_path = os.path.join(tempfile.mkdtemp(), "loadtest.sqlite3")
+    create_database(db_path)
+    logging.disable(logging.CRITICAL)
+
+    from django.contrib.auth.models import User
+    from django.test import AsyncClient
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    clients = []
+    for i in range(args.concurrency):
+        user = User.objects.create_user(username=f"load{i}", password="x")
+        client = AsyncClient()
+        client.force_login(user)
+        clients.append((user.username, client))
+
+    env = dict(os.environ, HARNESS_DB=db_path, PYTHONPATH=os.pathsep.join([HERE, ROOT]))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "rasa_sdk", "--actions", "harness_actions", "--port", str(args.port), "--quiet"],
+        env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(base_url, server)
+        actions = {action["name"] for action in httpx.get(f"{base_url}/actions", timeout=10).json()}
+        conversations = (story_conversations(actions) + test_story_conversations()
+                         + synthetic_conversations(args.synthetic, args.seed))
+        print(f"{len(conversations)} conversations, {args.concurrency} users over {args.ramp:.0f}s, "
+              f"{args.duration:.0f}s of load", flush=True)
+        results, wall = asyncio.run(drive(clients, conversations, args, f"{base_url}/webhook"))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        rasa.shutdown()
+        llm.shutdown()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "wall_seconds": round(wall, 2),
+        "endpoints": results.report(wall),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for endpoint, stats in report["endpoints"].items():
+        latency = stats["latency_ms"]
+        queries = stats["db_queries"]["per_request"] if stats["db_queries"] else "-"
+        print(f"{endpoint:>15}: {stats['requests']:6d} req {stats['rps']:8.1f} req/s  p50={latency['p50']:7.1f}ms  "
+              f"p95={latency['p95']:7.1f}ms  p99={latency['p99']:7.1f}ms  errors={stats['error_rate']:.2%}  "
+              f"queries/req={queries}")
+    print(f"report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Local stand-ins for the Rasa REST webhook and the OpenRouter API.
+
+Both stubs are plain ``ThreadingHTTPServer`` instances with a configurable
+artificial delay so benchmarks can measure our own overhead without depending
+on a trained Rasa model or a paid LLM key.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RasaStubHandler(_StubHandler):
+    """Webhook, ``/model/parse``, tracker and tracker events. Messages containing ``fallback`` are not understood."""
+
+    def do_GET(self):
+        # Tracker state without events; no form is ever active.
+        self._send_json({"slots": {}, "active_loop": {}})
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path.endswith("/tracker/events"):
+            self._send_json({})
+            return
+        time.sleep(self.delay)
+        if self.path == "/model/parse":
+            text = body.get("text", "")
+            self._send_json({
+                "text": text,
+                "intent": {"name": "inform", "confidence": 0.2 if "fallback" in text else 0.95},
+                "entities": [],
+            })
+        elif "fallback" in body.get("message", ""):
+            self._send_json([])
+        else:
+            self._send_json([
+                {"recipient_id": body.get("sender"), "text": f"Echo: {body.get('message', '')}"}
+            ])
+
+
+class OpenRouterStubHandler(_StubHandler):
+    def do_POST(self):
+        body = self._read_json()
+        time.sleep(self.delay)
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        self._send_json({
+            "choices": [{"message": {"role": "assistant", "content": f"Stub answer for: {prompt}"}}]
+        })
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver's default listen backlog is 5: with a hundred chats opening
+    # connections at once the kernel drops SYNs and the client retries after
+    # 1s/3s, which shows up as multi-second p99s and timeouts that are the
+    # stub's, not ours. A real Rasa (Sanic) listens with a backlog of 100+.
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Callers that cancel a request (e.g. /chat/auto/ dropping the slower backend) hang up early.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub(handler_cls, delay=0.0, host="127.0.0.1", port=0):
+    """Start ``handler_cls`` in a daemon thread and return ``(server, base_url)``."""
+    handler = type(handler_cls.__name__, (handler_cls,), {"delay": delay})
+    server = _StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -14,4 +14,4 @@ from .models import FlightBooking
 
 @admin.register(FlightBooking)
 class FlightBookingAdmin(admin.ModelAdmin):
-    list_display = ('user', 'departure', 'destination', 'travel_date', 'created_at')
+    list_display = ('user', 'flight', 'seats', 'departure', 'destination', 'travel_date', 'created_at')
@@ -0,0 +1,99 @@
+"""Hotel room availability backed by a per-hotel, per-night inventory table.
+
+``HotelRoomInventory`` holds how many rooms are booked on each night, so
+"is this hotel free for N nights from D" and "which hotels are full during
+this stay" are index range scans over at most N rows per hotel, however many
+bookings exist. A stay needs ``ceil(guests / HOTEL_GUESTS_PER_ROOM)`` rooms on
+every night from check-in up to (not including) check-out.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_date
+
+from .models import Hotel, HotelRoomInventory
+
+
+class InvalidStay(ValueError):
+    pass
+
+
+class NoAvailability(Exception):
+    pass
+
+
+def rooms_needed(guests):
+    per_room = getattr(settings, 'HOTEL_GUESTS_PER_ROOM', 2)
+    return max(1, -(-int(guests) // per_room))
+
+
+def max_nights():
+    return getattr(settings, 'HOTEL_MAX_NIGHTS', 30)
+
+
+def stay_nights(check_in, nights):
+    """Validate a stay and return ``(first night, night after the last)``."""
+    try:
+        day = parse_date(check_in) if isinstance(check_in, str) else check_in
+    except ValueError:  # well formed but impossible, e.g. 2025-02-30
+        day = None
+    if day is None:
+        raise InvalidStay(f"Invalid check-in date '{check_in}', expected YYYY-MM-DD.")
+    try:
+        nights = int(nights)
+    except (TypeError, ValueError):
+        raise InvalidStay(f"Invalid number of nights '{nights}'.")
+    # The cap also bounds the per-night inventory rows a single stay can touch.
+    if not 1 <= nights <= max_nights():
+        raise InvalidStay(f"A stay must be between 1 and {max_nights()} nights.")
+    return day, day + timedelta(days=nights)
+
+
+def unavailable_hotel_ids(check_in, nights, guests):
+    """Ids of hotels that can't take ``guests`` for the whole stay."""
+    start, end = stay_nights(check_in, nights)
+    needed = rooms_needed(guests)
+    full = HotelRoomInventory.objects.filter(
+        night__gte=start, night__lt=end, rooms_booked__gt=F("hotel__rooms") - needed,
+    ).values_list("hotel_id", flat=True)
+    too_small = Hotel.objects.filter(rooms__lt=needed).values_list("id", flat=True)
+    return set(full.union(too_small))
+
+
+def is_available(hotel, check_in, nights, guests):
+    """True if ``hotel`` (a ``Hotel`` or its id) has enough rooms free on every night of the stay."""
+    hotel_id = getattr(hotel, "pk", hotel)
+    start, end = stay_nights(check_in, nights)
+    needed = rooms_needed(guests)
+    rooms = hotel.rooms if isinstance(hotel, Hotel) else Hotel.objects.values_list("rooms", flat=True).get(pk=hotel_id)
+    if rooms < needed:
+        return False
+    return not HotelRoomInventory.objects.filter(
+        hotel_id=hotel_id, night__gte=start, night__lt=end, rooms_booked__gt=rooms - needed,
+    ).exists()
+
+
+def reserve_rooms(hotel, check_in, nights, guests):
+    """Take the rooms for a stay on every night, all or nothing; returns the number of rooms.
+
+    Must be called inside ``transaction.atomic`` together with the booking rows
+    it is for, so a failed booking releases the rooms.
+    """
+    start, end = stay_nights(check_in, nights)
+    needed = rooms_needed(guests)
+    if hotel.rooms < needed:
+        raise NoAvailability(f"{hotel.name} doesn't have {needed} rooms.")
+    days = [start + timedelta(days=i) for i in range((end - start).days)]
+    with transaction.atomic():
+        HotelRoomInventory.objects.bulk_create(
+            [HotelRoomInventory(hotel=hotel, night=day) for day in days], ignore_conflicts=True,
+        )
+        # Conditional increment: a night that is already too full is simply not updated.
+        updated = HotelRoomInventory.objects.filter(
+            hotel=hotel, night__gte=start, night__lt=end, rooms_booked__lte=hotel.rooms - needed,
+        ).update(rooms_booked=F("rooms_booked") + needed)
+        if updated != len(days):
+            raise NoAvailability(f"Sorry, {hotel.name} is fully booked for those dates.")
+    return needed
@@ -0,0 +1,202 @@
+"""Flight and hotel booking against inventory.
+
+``book_flight`` reserves seats with a single conditional UPDATE
+(``seats_available = seats_available - n WHERE seats_available >= n``), so
+concurrent bookers can never oversell a flight, and creates the
+``FlightBooking`` and its ``Booking`` row in the same transaction as the
+reservation.
+
+``book_hotel`` does the same for hotel rooms through
+``availability.reserve_rooms``.
+
+Callers pass an idempotency key (the action server uses the id of the user
+message that completed the form), so a retried request returns the booking
+made the first time instead of reserving more seats.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .availability import InvalidStay, NoAvailability, reserve_rooms, stay_nights
+from .flight_search import search_flights
+from .catalog import get_catalog
+from .models import Booking, Flight, FlightBooking, Hotel, HotelBooking
+
+logger = logging.getLogger(__name__)
+
+
+class BookingError(Exception):
+    pass
+
+
+class SoldOut(BookingError):
+    pass
+
+
+class NoMatchingFlight(BookingError):
+    pass
+
+
+def reserve_seats(flight_id, seats=1):
+    """Atomically take ``seats`` from a flight; False if not enough are left."""
+    return Flight.objects.filter(pk=flight_id, seats_available__gte=seats).update(
+        seats_available=F("seats_available") - seats
+    ) == 1
+
+
+class HotelUnavailable(BookingError):
+    pass
+
+
+class InvalidBooking(BookingError):
+    pass
+
+
+def _existing(user, idempotency_key, booking_type="flight"):
+    booking = Booking.objects.filter(user=user, idempotency_key=idempotency_key, booking_type=booking_type).first()
+    if booking is None:
+        return None
+    pk = booking.reference_id.split(":", 1)[1]
+    if booking_type == "hotel":
+        return HotelBooking.objects.select_related("hotel").get(pk=pk)
+    return FlightBooking.objects.select_related("flight").get(pk=pk)
+
+
+def _candidates(flight, departure, destination, travel_date, seats):
+    if isinstance(flight, Flight):
+        return [flight]
+    if flight is not None:
+        try:
+            return [Flight.objects.get(pk=flight)]
+        except Flight.DoesNotExist:
+            raise NoMatchingFlight(f"Flight {flight} does not exist.")
+    flights, _ = search_flights(origin=departure, destination=destination, date_from=travel_date,
+                                date_to=travel_date, seats=seats, limit=5)
+    if not flights:
+        raise NoMatchingFlight(f"No flights from {departure} to {destination} on {travel_date} with {seats} seat(s) free.")
+    return flights
+
+
+def book_flight(user, flight=None, departure=None, destination=None, travel_date=None, seats=1,
+                idempotency_key=None):
+    """Book ``seats`` on ``flight`` (a ``Flight`` or its id), or on the first matching flight of the route.
+
+    Returns ``(flight_booking, created)``; ``created`` is False when
+    ``idempotency_key`` matched an earlier booking. Raises ``SoldOut`` if every
+    candidate flight ran out of seats and ``NoMatchingFlight`` if none match.
+    """
+    if idempotency_key:
+        existing = _existing(user, idempotency_key)
+        if existing is not None:
+            return existing, False
+
+    for candidate in _candidates(flight, departure, destination, travel_date, seats):
+        try:
+            with transaction.atomic():
+                # The reservation is the first write, so on SQLite the transaction takes the
+                # write lock straight away instead of upgrading from a read lock.
+                if not reserve_seats(candidate.pk, seats):
+                    continue
+                flight_booking = FlightBooking.objects.create(
+                    user=user,
+                    flight=candidate,
+                    seats=seats,
+                    departure=candidate.origin,
+                    destination=candidate.destination,
+                    travel_date=timezone.localtime(candidate.departure_time).date(),
+                )
+                Booking.objects.create(
+                    user=user,
+                    booking_type="flight",
+                    reference_id=f"Flight:{flight_booking.id}",
+                    idempotency_key=idempotency_key,
+                )
+        except IntegrityError:
+            # A concurrent retry with the same key won the race; its booking stands and ours rolled back.
+            if idempotency_key:
+                return _existing(user, idempotency_key), False
+            raise
+        logger.info(f"Booked {seats} seat(s) on {candidate.flight_number} for {user.username}")
+        return flight_booking, True
+
+    raise SoldOut("Sorry, that flight is sold out.")
+
+
+def book_hotel(user, hotel, check_in, nights, guests, idempotency_key=None):
+    """Book a stay at ``hotel`` (a ``Hotel``, its id or its name).
+
+    Returns ``(hotel_booking, created)`` like ``book_flight``; raises
+    ``HotelUnavailable`` if the hotel is unknown or full on any night and
+    ``InvalidBooking`` for an impossible date or too long a stay.
+    """
+    if idempotency_key:
+        existing = _existing(user, idempotency_key, "hotel")
+        if existing is not None:
+            return existing, False
+
+    try:
+        check_in, _ = stay_nights(check_in, nights)
+    except InvalidStay as e:
+        raise InvalidBooking(str(e))
+    nights, guests = int(nights), int(guests)
+    if not isinstance(hotel, Hotel):
+        lookup = {"pk": hotel} if isinstance(hotel, int) else {"name__iexact": str(hotel).strip()}
+        hotel = Hotel.objects.filter(**lookup).first()
+        if hotel is None:
+            raise HotelUnavailable("Sorry, I couldn't find that hotel.")
+
+    try:
+        with transaction.atomic():
+            rooms = reserve_rooms(hotel, check_in, nights, guests)
+            hotel_booking = HotelBooking.objects.create(
+                user=user,
+                hotel=hotel,
+                hotel_name=hotel.name,
+                check_in_date=check_in,
+                nights=nights,
+                guests=guests,
+                rooms=rooms,
+            )
+            Booking.objects.create(
+                user=user,
+                booking_type="hotel",
+                reference_id=f"Hotel:{hotel_booking.id}",
+                idempotency_key=idempotency_key,
+            )
+    except NoAvailability as e:
+        raise HotelUnavailable(str(e))
+    except IntegrityError:
+        if idempotency_key:
+            return _existing(user, idempotency_key, "hotel"), False
+        raise
+    logger.info(f"Booked {rooms} room(s) at {hotel.name} for {user.username}")
+    return hotel_booking, True
+
+
+def attach_details(bookings):
+    """Set ``booking.details`` on each booking from its ``reference_id`` ("Hotel:12", "Flight:7", "Package:3").
+
+    Hotel and flight bookings are fetched with one query per type however many
+    bookings there are; packages come from the catalog snapshot.
+    """
+    wanted = {}
+    for booking in bookings:
+        kind, _, pk = booking.reference_id.partition(":")
+        if pk.isdigit():
+            wanted.setdefault(kind.lower(), set()).add(int(pk))
+
+    found = {}
+    if wanted.get("hotel"):
+        found["hotel"] = HotelBooking.objects.select_related("hotel").in_bulk(wanted["hotel"])
+    if wanted.get("flight"):
+        found["flight"] = FlightBooking.objects.select_related("flight").in_bulk(wanted["flight"])
+    if wanted.get("package"):
+        packages = {p["id"]: p for p in get_catalog().packages}
+        found["package"] = {pk: packages.get(pk) for pk in wanted["package"]}
+
+    for booking in bookings:
+        kind, _, pk = booking.reference_id.partition(":")
+        booking.details = found.get(kind.lower(), {}).get(int(pk)) if pk.isdigit() else None
+    return bookings
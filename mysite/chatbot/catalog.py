@@ -0,0 +1,143 @@
+"""Read-through cache of the travel catalog (packages and hotels).
+
+The catalog changes rarely but is read on almost every chat turn, so it is
+loaded once into an immutable snapshot of serialized rows plus lookup indexes
+and served from memory. Saving or deleting a ``TravelPackage`` or ``Hotel``
+bumps a version number in the Django cache; each process notices
+the new version (immediately in the process that made the change, within
+``CATALOG_CACHE_CHECK_INTERVAL`` seconds elsewhere) and rebuilds its snapshot
+on the next read. This relies on ``CACHES['default']`` being shared by all
+processes, the action server included; a per-process LocMem cache would
+leave the others serving stale rows forever.
+
+The version is seeded from the clock rather than 1 whenever the key is
+missing (first use, a cleared or culled cache), so it never moves back to a
+value a process may still hold a snapshot for.
+
+Flights are deliberately not cached here: seat counts change with every
+booking and the table is large, so they are searched in the database by
+``chatbot.flight_search``.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Hotel, TravelPackage
+from .serializers import TravelPackageSerializer
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+
+
+class CatalogSnapshot:
+    """Serialized catalog rows and indexes built from one consistent read."""
+
+    def __init__(self, version, packages, hotels):
+        self.version = version
+        self.packages = packages
+        self.hotels = hotels
+
+        self.packages_by_name = {p["name"].lower(): p for p in packages}
+        self.packages_by_category = defaultdict(list)
+        self.packages_by_destination = defaultdict(list)
+        for package in packages:
+            self.packages_by_category[package["category"].lower()].append(package)
+            self.packages_by_destination[package["destination"].lower()].append(package)
+
+        self.hotels_by_name = {h["name"].lower(): h for h in hotels}
+        self.hotels_by_location = defaultdict(list)
+        for hotel in hotels:
+            self.hotels_by_location[hotel["location"].lower()].append(hotel)
+
+    def hotels_in(self, location):
+        """Hotels whose location contains ``location`` (case-insensitive), like ``location__icontains``."""
+        needle = location.strip().lower()
+        return [
+            hotel
+            for key, hotels in self.hotels_by_location.items() if needle in key
+            for hotel in hotels
+        ]
+
+
+def serialize_hotel(hotel):
+    # Image URLs are kept relative; callers make them absolute for their own host.
+    return {
+        "id": hotel.id,
+        "name": hotel.name,
+        "location": hotel.location,
+        "rating": str(hotel.rating),
+        "price_per_night": str(hotel.price_per_night),
+        "amenities": hotel.amenities,
+        "image": hotel.image.url if hotel.image else None,
+    }
+
+
+def build_snapshot(version):
+    packages = TravelPackageSerializer(TravelPackage.objects.order_by("id"), many=True).data
+    hotels = [serialize_hotel(hotel) for hotel in Hotel.objects.order_by("id")]
+    logger.info(f"Catalog snapshot v{version} built: {len(packages)} packages, {len(hotels)} hotels")
+    return CatalogSnapshot(version, [dict(p) for p in packages], hotels)
+
+
+_snapshot = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _seed_version():
+    return time.time_ns()
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        seed = _seed_version()
+        cache.add(VERSION_KEY, seed, None)
+        version = cache.get(VERSION_KEY, seed)
+    return version
+
+
+def get_catalog():
+    """Return the current catalog snapshot, rebuilding it if it was invalidated."""
+    global _snapshot, _checked_at
+    snapshot = _snapshot
+    interval = getattr(settings, 'CATALOG_CACHE_CHECK_INTERVAL', 5)
+    if snapshot is not None and time.monotonic() - _checked_at < interval:
+        return snapshot
+
+    with _lock:
+        version = _current_version()
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = build_snapshot(version)
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+def invalidate():
+    """Drop the local snapshot and tell other processes to rebuild theirs."""
+    global _snapshot
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _seed_version(), None)
+    with _lock:
+        _snapshot = None
+
+
+@receiver(post_save, sender=TravelPackage)
+@receiver(post_save, sender=Hotel)
+@receiver(post_delete, sender=TravelPackage)
+@receiver(post_delete, sender=Hotel)
+def invalidate_catalog(sender, **kwargs):
+    invalidate()
+    # Rebuild again once the change is committed, in case a concurrent reader
+    # repopulated the snapshot from the pre-commit state in the meantime.
+    transaction.on_commit(invalidate)
@@ -0,0 +1,270 @@
+"""Bulk import and export of the travel catalog (hotels, flights, packages).
+
+Used by the ``import_catalog`` and ``export_catalog`` management commands.
+Supplier feeds are CSV or JSON Lines with one row per record, in the columns
+of ``FEEDS``. They are read as a stream and processed in chunks. Memory
+depends on the chunk size, not the file size:
+
+* each row is validated with the model fields' own ``to_python``/``validate``
+  and validators; invalid rows are skipped and reported with their line
+* rows are matched to existing records on the feed's key (``flight_number``;
+  hotel ``name`` + ``location``; package ``name``) with one query per chunk
+* new records are inserted with ``bulk_create`` and changed ones saved with
+  ``bulk_update``, in one transaction per chunk; unchanged ones are skipped
+
+Delta feeds need only the key plus the columns that changed. A row with a
+truthy ``deleted`` column deletes the record. Bulk writes send no model
+signals, so the catalog cache is invalidated once at the end of an import;
+the new version goes to the shared ``CACHES['default']``, where the web and
+action server processes pick it up after the command exits.
+"""
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalog
+from .models import Flight, Hotel, TravelPackage
+
+DELETED = "deleted"
+TRUE_VALUES = {"1", "true", "yes", "y"}
+
+
+class Feed:
+    """How one model is read from and written to a feed."""
+
+    def __init__(self, model, key, fields):
+        self.model = model
+        self.key = key
+        self.fields = fields
+        self.model_fields = {name: model._meta.get_field(name) for name in fields}
+        # Columns a new record cannot do without.
+        self.required = [name for name, field in self.model_fields.items() if not field.has_default() and not field.null]
+
+    def key_of(self, values):
+        return tuple(values[name] for name in self.key)
+
+    def clean(self, row):
+        """``(key, values, deleted)`` for a raw feed row or JSON line. Raises ValidationError."""
+        if isinstance(row, str):
+            row = parse_json_row(row)
+        values, errors = {}, {}
+        for name, field in self.model_fields.items():
+            raw = row.get(name)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw is None or raw == "":
+                continue
+            try:
+                value = field.to_python(raw)
+                if isinstance(value, datetime) and timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                field.validate(value, None)
+                field.run_validators(value)
+                values[name] = value
+            except ValidationError as e:
+                errors[name] = e.messages
+        missing = [name for name in self.key if name not in values and name not in errors]
+        if missing:
+            errors.update({name: ["This field is required."] for name in missing})
+        if errors:
+            raise ValidationError(errors)
+        deleted = str(row.get(DELETED) or "").strip().lower() in TRUE_VALUES
+        return self.key_of(values), values, deleted
+
+    def existing(self, keys):
+        """Existing records for ``keys``, by key. The lowest id wins if a key is duplicated."""
+        first = self.key[0]
+        records = {}
+        rows = self.model.objects.filter(**{f"{first}__in": {key[0] for key in keys}}).order_by("-pk")
+        for record in rows:
+            key = tuple(getattr(record, name) for name in self.key)
+            if key in keys:
+                records[key] = record
+        return records
+
+
+FEEDS = {
+    "hotels": Feed(Hotel, key=("name", "location"),
+                   fields=("name", "location", "rating", "price_per_night", "amenities", "rooms")),
+    "flights": Feed(Flight, key=("flight_number",),
+                    fields=("flight_number", "origin", "destination", "departure_time", "price", "seats_available")),
+    "packages": Feed(TravelPackage, key=("name",),
+                     fields=("name", "destination", "description", "price", "duration_days", "category")),
+}
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.invalid = 0
+        self.errors = []  # (line, messages) for the first invalid rows
+        self.started = time.perf_counter()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def summary(self):
+        return (f"{self.rows} rows: {self.created} created, {self.updated} updated, {self.unchanged} unchanged, "
+                f"{self.deleted} deleted, {self.invalid} invalid ({self.rows_per_second:,.0f} rows/s)")
+
+
+def parse_json_row(text):
+    """The object on one JSON Lines line. Raises ValidationError if it is not one."""
+    try:
+        row = json.loads(text)
+    except ValueError as e:
+        raise ValidationError({"row": [f"Invalid JSON: {e}"]})
+    if not isinstance(row, dict):
+        raise ValidationError({"row": [f"Expected a JSON object, got {type(row).__name__}"]})
+    return row
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, row)`` from a CSV or JSON Lines text stream.
+
+    JSON lines are yielded unparsed; ``Feed.clean`` parses them, so a broken
+    line is reported as an invalid row instead of aborting the import.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, text in enumerate(stream, start=1):
+            if text.strip():
+                yield line, text
+
+
+def _write_chunk(feed, chunk, stats, batch_size):
+    """Upsert or delete one chunk of cleaned rows, ``{key: (values, deleted)}``."""
+    existing = feed.existing(chunk.keys())
+    create, delete_pks = [], []
+    # Grouped by the columns that changed, so a row is only written in those
+    # and, say, a price feed does not overwrite seats booked meanwhile.
+    update = {}
+    for key, (values, deleted) in chunk.items():
+        record = existing.get(key)
+        if deleted:
+            if record is not None:
+                delete_pks.append(record.pk)
+            continue
+        if record is None:
+            missing = [name for name in feed.required if name not in values]
+            if missing:
+                stats.invalid += 1
+                if len(stats.errors) < 20:
+                    stats.errors.append((None, {"key": list(map(str, key)), "missing": missing}))
+                continue
+            create.append(feed.model(**values))
+            continue
+        changed = [name for name, value in values.items() if getattr(record, name) != value]
+        if not changed:
+            stats.unchanged += 1
+            continue
+        for name in changed:
+            setattr(record, name, values[name])
+        update.setdefault(tuple(changed), []).append(record)
+
+    with transaction.atomic():
+        if create:
+            feed.model.objects.bulk_create(create, batch_size=batch_size)
+        for fields, records in update.items():
+            feed.model.objects.bulk_update(records, fields, batch_size=batch_size)
+        if delete_pks:
+            feed.model.objects.filter(pk__in=delete_pks).delete()
+    stats.created += len(create)
+    stats.updated += sum(len(records) for records in update.values())
+    stats.deleted += len(delete_pks)
+
+
+def import_feed(feed, rows, chunk_size=5000, batch_size=1000, max_errors=None, progress=None):
+    """Import ``(line, row)`` pairs into ``feed.model`` and return the ``ImportStats``.
+
+    ``progress`` is called with the stats after every chunk. Raises
+    ValueError once more than ``max_errors`` rows were invalid; the chunks
+    written before stay written.
+    """
+    stats = ImportStats()
+    chunk = {}
+    try:
+        for line, row in rows:
+            stats.rows += 1
+            try:
+                key, values, deleted = feed.clean(row)
+            except ValidationError as e:
+                stats.invalid += 1
+                if len(stats.errors) < 20:
+                    stats.errors.append((line, e.message_dict))
+                if max_errors is not None and stats.invalid > max_errors:
+                    raise ValueError(f"More than {max_errors} invalid rows, stopped at line {line}")
+                continue
+            # A later row for the same key overrides the earlier one; a delta row only the columns it has.
+            previous = chunk.get(key)
+            if previous is not None and not previous[1] and not deleted:
+                values = {**previous[0], **values}
+            chunk[key] = (values, deleted)
+            if len(chunk) >= chunk_size:
+                _write_chunk(feed, chunk, stats, batch_size)
+                chunk = {}
+                if progress:
+                    progress(stats)
+        if chunk:
+            _write_chunk(feed, chunk, stats, batch_size)
+            if progress:
+                progress(stats)
+    finally:
+        if feed.model is not Flight and (stats.created or stats.updated or stats.deleted):
+            catalog.invalidate()
+    return stats
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value if value is None or isinstance(value, (int, float, str)) else str(value)
+
+
+def export_feed(feed, stream, fmt, chunk_size=5000):
+    """Write every record of ``feed.model`` to ``stream`` in the feed's columns. Returns the row count."""
+    rows = feed.model.objects.order_by("pk").values_list(*feed.fields).iterator(chunk_size=chunk_size)
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(feed.fields)
+        for row in rows:
+            writer.writerow([_plain(value) for value in row])
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(feed.fields, map(_plain, row)))) + "\n")
+            count += 1
+    return count
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of {path}; pass --format csv or jsonl")
+
+
+def open_text(path, mode):
+    """Open ``path`` for streaming; ``-`` is stdin or stdout, left open on exit."""
+    if path == "-":
+        return nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
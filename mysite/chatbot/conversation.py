@@ -0,0 +1,151 @@
+"""Conversation context for ``chat_with_ai``: recent turns within a token budget.
+
+Only the current session counts as context: turns from the last ``WINDOW``
+seconds (30 minutes by default). A user coming back later starts without
+history, so their context-free prompts are answered from the reply cache
+again rather than carrying every past turn.
+
+Each user's last ``MAX_TURNS`` turns are kept, with their times, in the shared
+Django cache under ``conversation:<user id>``. The message log appends every
+turn it records to an existing entry (``remember``), in whichever process
+logs it. On a miss the entry is loaded from ``UserMessage`` with one indexed
+query, so a chat turn normally reads history without touching the database.
+
+``build_messages`` fills the prompt newest-first until ``TOKEN_BUDGET``
+estimated tokens are used. Turns that do not fit are dropped, or with
+``SUMMARIZE`` condensed into one short system note listing what the user asked
+earlier. Tokens are estimated locally at ~4 characters per token, close
+enough for budgeting without shipping a tokenizer.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import UserMessage
+from .profiling import COUNT_BUCKETS, metrics
+
+DEFAULTS = {
+    'MAX_TURNS': 20,
+    'WINDOW': 30 * 60,  # seconds; None keeps every cached turn
+    'TOKEN_BUDGET': 1500,  # history tokens, on top of the system prompt and the new message
+    'SUMMARIZE': False,
+    'SUMMARY_TOKENS': 150,
+    'CACHE_TTL': 60 * 60 * 24,
+}
+
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 8000)
+
+# Role and framing tokens each chat message costs on top of its text.
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_HEADER = "Earlier in this conversation the user asked about:"
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'LLM_CONTEXT', {})}
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD
+
+
+def _key(user_id):
+    return f"conversation:{user_id}"
+
+
+def recent_turns(user_id):
+    """The user's turns in this session as ``[message, response]`` pairs, oldest first.
+
+    At most ``MAX_TURNS``, and none older than ``WINDOW`` seconds.
+    """
+    options = get_options()
+    turns = cache.get(_key(user_id))
+    if turns is None:
+        rows = UserMessage.objects.filter(user_id=user_id)
+        if options['WINDOW']:
+            rows = rows.filter(timestamp__gte=timezone.now() - timedelta(seconds=options['WINDOW']))
+        rows = rows.order_by("-timestamp", "-id").values_list("message", "response", "timestamp")
+        turns = [[m, r, at.timestamp()] for m, r, at in rows[:options['MAX_TURNS']]][::-1]
+        cache.set(_key(user_id), turns, options['CACHE_TTL'])
+    since = time.time() - options['WINDOW'] if options['WINDOW'] else 0
+    return [[message, response] for message, response, at in turns if at >= since]
+
+
+def remember(user_id, message, response):
+    """Append a turn to the user's cached history if it is cached; a miss is reloaded on the next read."""
+    options = get_options()
+    turns = cache.get(_key(user_id))
+    if turns is not None:
+        turns = (turns + [[message, response, time.time()]])[-options['MAX_TURNS']:]
+        cache.set(_key(user_id), turns, options['CACHE_TTL'])
+
+
+def forget(user_id):
+    cache.delete(_key(user_id))
+
+
+def summarize(turns, budget):
+    """A note listing the most recent earlier user messages that fit within ``budget`` tokens."""
+    lines, used = [], estimate_tokens(SUMMARY_HEADER)
+    for message, _ in reversed(turns):
+        line = f"- {message[:120]}"
+        cost = estimate_tokens(line) - MESSAGE_OVERHEAD
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join([SUMMARY_HEADER] + lines[::-1]) if lines else None
+
+
+class Context:
+    """The messages for one LLM request and what went into them."""
+
+    def __init__(self, messages, turns, dropped, summarized, tokens):
+        self.messages = messages
+        self.turns = turns
+        self.dropped = dropped
+        self.summarized = summarized
+        self.tokens = tokens
+
+
+def build_messages(system_prompt, user_message, turns, options=None):
+    """Chat messages for ``user_message`` with as much recent history as fits the budget."""
+    options = options or get_options()
+    budget = options['TOKEN_BUDGET']
+    history, used, kept = [], 0, 0
+    for message, response in reversed(turns):
+        cost = estimate_tokens(message) + estimate_tokens(response)
+        if used + cost > budget:
+            break
+        history[:0] = [{"role": "user", "content": message}, {"role": "assistant", "content": response}]
+        used += cost
+        kept += 1
+
+    messages = [{"role": "system", "content": system_prompt}]
+    older = turns[:len(turns) - kept]
+    summary = summarize(older, options['SUMMARY_TOKENS']) if older and options['SUMMARIZE'] else None
+    if summary:
+        messages.append({"role": "system", "content": summary})
+    messages += history
+    messages.append({"role": "user", "content": user_message})
+    tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    return Context(messages, kept, len(older), bool(summary), tokens)
+
+
+def build_context(user_id, system_prompt, user_message):
+    """``build_messages`` over the user's cached history (no history for anonymous users)."""
+    turns = recent_turns(user_id) if user_id else []
+    return build_messages(system_prompt, user_message, turns)
+
+
+def observe(context, view):
+    """Record prompt size in the ``/metrics`` histograms."""
+    metrics.observe("chatbot_prompt_tokens", view, context.tokens, TOKEN_BUCKETS,
+                    "Estimated prompt tokens per LLM request")
+    metrics.observe("chatbot_context_turns", view, context.turns, COUNT_BUCKETS,
+                    "History turns included in the LLM prompt")
+    metrics.observe("chatbot_context_dropped_turns", view, context.dropped, COUNT_BUCKETS,
+                    "Cached history turns left out of the LLM prompt by the token budget")
@@ -0,0 +1,166 @@
+"""Rasa conversation events in the Django database, with an LRU of active conversations.
+
+The storage half of ``actions.tracker_store.DjangoTrackerStore``. It works on
+serialized events (Rasa's ``event.as_dict()``), so it has no Rasa
+dependency. Events are appended to ``ConversationEvent``, one row each, and
+are never updated. A tracker only needs the events since its last
+``session_started``, so that is all that is loaded: one indexed query.
+
+The ``cache_size`` most recently used conversations are kept in memory with
+the id of their last row. With ``validate`` on, a cached conversation is
+checked for rows written by other Rasa instances with one query on
+``(sender_id, id > last id)``. That query usually returns nothing, which is
+much cheaper than reloading and decoding the whole session. Turn
+``validate`` off only when a single Rasa instance writes the table.
+
+The store is synchronous; call it off the event loop.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import ConversationEvent
+
+SESSION_STARTED = "session_started"
+
+
+def _session_starts(events):
+    return [index for index, event in enumerate(events) if event.get("event") == SESSION_STARTED]
+
+
+def since_session_start(events):
+    """The tail of ``events`` starting at the last ``session_started`` event (all of them if there is none)."""
+    starts = _session_starts(events)
+    return events[starts[-1]:] if starts else events
+
+
+def unsaved(events, stored):
+    """The part of a tracker's ``events`` after the ``stored`` events of its current session.
+
+    The tracker may hold more than the stored session: earlier sessions, or
+    the ``action_session_start`` that preceded ``session_started`` when the
+    session began in this turn. So the stored session is found by its first
+    and last events rather than assumed to be a prefix.
+    """
+    if not stored:
+        return events
+    for start in reversed(_session_starts(events) or [0]):
+        end = start + len(stored)
+        if events[start] == stored[0] and events[end - 1:end] == stored[-1:]:
+            return events[end:]
+    starts = _session_starts(events)
+    return events[(starts[-1] if starts else 0) + len(stored):]
+
+
+class _Conversation:
+    def __init__(self, events, last_id):
+        self.events = events
+        self.last_id = last_id
+
+
+class EventStore:
+    def __init__(self, cache_size=1000, validate=True):
+        self.cache_size = cache_size
+        self.validate = validate
+        self.counts = {"hits": 0, "misses": 0, "refreshed": 0, "appended": 0}
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rows(self, sender_id, all_sessions=False):
+        rows = ConversationEvent.objects.filter(sender_id=sender_id)
+        if not all_sessions:
+            session_start = ConversationEvent.objects.filter(
+                sender_id=sender_id, type_name=SESSION_STARTED,
+            ).aggregate(id=Max("id"))["id"]
+            if session_start is not None:
+                rows = rows.filter(id__gte=session_start)
+        return rows.order_by("id").values_list("id", "data")
+
+    def _cached(self, sender_id):
+        with self._lock:
+            conversation = self._conversations.get(sender_id)
+            if conversation is not None:
+                self._conversations.move_to_end(sender_id)
+            return conversation
+
+    def _cache(self, sender_id, conversation):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._conversations[sender_id] = conversation
+            self._conversations.move_to_end(sender_id)
+            while len(self._conversations) > self.cache_size:
+                self._conversations.popitem(last=False)
+
+    def _conversation(self, sender_id):
+        conversation = self._cached(sender_id)
+        if conversation is None:
+            self.counts["misses"] += 1
+            rows = list(self._rows(sender_id))
+            conversation = _Conversation([json.loads(data) for _, data in rows], rows[-1][0] if rows else 0)
+            self._cache(sender_id, conversation)
+            return conversation
+
+        self.counts["hits"] += 1
+        if self.validate:
+            newer = list(
+                ConversationEvent.objects.filter(sender_id=sender_id, id__gt=conversation.last_id)
+                .order_by("id").values_list("id", "data")
+            )
+            if newer:
+                self.counts["refreshed"] += 1
+                conversation.events = since_session_start(conversation.events + [json.loads(data) for _, data in newer])
+                conversation.last_id = newer[-1][0]
+        return conversation
+
+    def load(self, sender_id, all_sessions=False):
+        """Serialized events of the conversation's current session (every session with ``all_sessions``)."""
+        if all_sessions:
+            return [json.loads(data) for _, data in self._rows(sender_id, all_sessions=True)]
+        # Copies, so callers may modify the dicts without touching the cache.
+        return [dict(event) for event in self._conversation(sender_id).events]
+
+    def save(self, sender_id, events):
+        """Append the events the store has not seen yet and return how many were written.
+
+        ``events`` are the tracker's serialized events, which include the
+        stored events of its current session.
+        """
+        conversation = self._conversation(sender_id)
+        new = unsaved(events, conversation.events)
+        if not new:
+            return 0
+        rows = [
+            ConversationEvent(sender_id=sender_id, type_name=event.get("event", ""),
+                              timestamp=event.get("timestamp"), data=json.dumps(event))
+            for event in new
+        ]
+        with transaction.atomic():
+            rows = ConversationEvent.objects.bulk_create(rows)
+        self.counts["appended"] += len(rows)
+        if rows[-1].pk is None:
+            # The backend does not return ids from bulk inserts; reload on the next read.
+            self.forget(sender_id)
+        else:
+            conversation.events = since_session_start(conversation.events + [dict(event) for event in new])
+            conversation.last_id = rows[-1].pk
+        return len(rows)
+
+    def keys(self):
+        return list(ConversationEvent.objects.values_list("sender_id", flat=True).distinct())
+
+    def forget(self, sender_id):
+        with self._lock:
+            self._conversations.pop(sender_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._conversations.clear()
+
+    def stats(self):
+        with self._lock:
+            cached = len(self._conversations)
+        return {**self.counts, "cached": cached}
@@ -0,0 +1,94 @@
+"""Flight search with keyset (cursor) pagination.
+
+Flights are the largest and most volatile part of the catalog (seat counts
+change with every booking), so they are queried straight from the database.
+Searches filter on the ``(lower(origin), lower(destination), departure_time)``
+composite indexes declared on ``Flight`` and page with a cursor over
+``(departure_time, id)`` rather than OFFSET, so every page costs the same no
+matter how deep it is.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Flight
+from .pagination import after_cursor, encode_cursor
+from .serializers import FlightSerializer
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def _day_start(value):
+    try:
+        day = parse_date(value) if isinstance(value, str) else value
+    except ValueError:  # well-formed but impossible, e.g. 2025-02-30
+        day = None
+    if day is None:
+        raise InvalidSearch(f"Invalid date '{value}', expected YYYY-MM-DD.")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def search_flights(origin=None, destination=None, date_from=None, date_to=None,
+                   min_price=None, max_price=None, seats=None, cursor=None, limit=20):
+    """Return ``(flights, next_cursor)`` ordered by departure time.
+
+    ``date_from``/``date_to`` are inclusive calendar days in the site time
+    zone; ``seats`` is the number of seats the traveller needs.
+    """
+    queryset = Flight.objects.all()
+    if origin:
+        queryset = queryset.annotate(origin_lower=Lower("origin")).filter(origin_lower=origin.strip().lower())
+    if destination:
+        queryset = queryset.annotate(destination_lower=Lower("destination")).filter(
+            destination_lower=destination.strip().lower()
+        )
+    if date_from:
+        queryset = queryset.filter(departure_time__gte=_day_start(date_from))
+    if date_to:
+        queryset = queryset.filter(departure_time__lt=_day_start(date_to) + timedelta(days=1))
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if seats:
+        queryset = queryset.filter(seats_available__gte=seats)
+    if cursor:
+        queryset = after_cursor(queryset, "departure_time", cursor)
+
+    flights = list(queryset.order_by("departure_time", "id")[:limit + 1])
+    next_cursor = None
+    if len(flights) > limit:
+        next_cursor = encode_cursor(flights[limit - 1].departure_time, flights[limit - 1].pk)
+    return flights[:limit], next_cursor
+
+
+def flight_card(flight):
+    """Shape a serialized flight into the ``flight_cards`` payload rendered by chat.js."""
+    return {
+        "title": flight["flight_number"],
+        "subtitle": f"{flight['origin']} to {flight['destination']}",
+        "price": str(flight["price"]),
+        "departure": flight["departure_time"],
+        "seats": str(flight["seats_available"]),
+        "buttons": [{"title": "Book Now", "payload": f'book_flight{{"flight_number": "{flight["flight_number"]}"}}'}]
+    }
+
+
+def flight_cards_for_slots(departure=None, destination=None, travel_date=None, limit=3):
+    """Flight cards for the user's trip slots; any missing slot simply isn't filtered on.
+
+    Without a travel date only upcoming flights are offered.
+    """
+    try:
+        date_from = travel_date or timezone.localdate()
+        flights, _ = search_flights(
+            origin=departure, destination=destination, date_from=date_from,
+            date_to=travel_date, seats=1, limit=limit,
+        )
+    except InvalidSearch:
+        flights, _ = search_flights(origin=departure, destination=destination, seats=1, limit=limit)
+    return [flight_card(flight) for flight in FlightSerializer(flights, many=True).data]
@@ -0,0 +1,333 @@
+"""Hotel search shared by the Django API and the Rasa action server.
+
+``HotelSearchService`` hides where hotel rows come from behind a small
+backend interface so the action server can query in-process instead of
+calling back into Django over HTTP:
+
+* ``cache`` - ranked, typo-tolerant search over a ``HotelIndex`` built from
+  the catalog snapshot (default, no queries when warm). Edits made in any
+  process are picked up within ``CATALOG_CACHE_CHECK_INTERVAL`` seconds
+  through the catalog version in the shared cache (see ``catalog.py``).
+* ``orm``   - a direct ``Hotel`` query (substring match, no ranking)
+* ``http``  - the ``/api/hotels/`` endpoint of a running Django server
+
+Every backend implements ``search(text, filters, offset, limit)`` and
+returns ``(total, rows)`` where rows are dicts shaped like
+``catalog.serialize_hotel``. A ``stay`` filter of ``(check_in, nights,
+guests)`` leaves out hotels without enough free rooms (see
+``availability.py``).
+"""
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from urllib.parse import urlencode
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .availability import unavailable_hotel_ids
+from .catalog import get_catalog, serialize_hotel
+from .models import Hotel
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Score contributed by a query token, by the field it matched in.
+FIELD_WEIGHTS = {'location': 3.0, 'name': 2.0}
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.7
+FUZZY_MIN_SIMILARITY = 0.4
+
+
+def tokenize(text):
+    return _WORD_RE.findall((text or "").lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _squash(text):
+    """'Free Wi-Fi' -> 'freewifi', so amenity filters ignore spacing and punctuation."""
+    return "".join(tokenize(text))
+
+
+class HotelIndex:
+    """In-memory inverted index over hotel names and locations.
+
+    Query tokens are matched exactly, as prefixes ("man" -> "manali") or
+    fuzzily through a trigram index ("manalli" -> "manali"); a hotel must
+    match every query token. Results are ranked by match quality, then
+    rating, then price.
+    """
+
+    def __init__(self, hotels):
+        self.hotels = hotels
+        self.ratings = [Decimal(h["rating"]) for h in hotels]
+        self.prices = [Decimal(h["price_per_night"]) for h in hotels]
+        self.by_price = sorted(range(len(hotels)), key=self.prices.__getitem__)
+        self.sorted_prices = [self.prices[i] for i in self.by_price]
+        self.amenities = [
+            tuple(_squash(a) for a in (h["amenities"] or "").split(",") if a.strip())
+            for h in hotels
+        ]
+
+        self.postings = {field: defaultdict(set) for field in FIELD_WEIGHTS}
+        for i, hotel in enumerate(hotels):
+            for field in FIELD_WEIGHTS:
+                for token in tokenize(hotel[field]):
+                    self.postings[field][token].add(i)
+
+        self.vocabulary = sorted(set().union(*(p.keys() for p in self.postings.values())))
+        self.trigram_index = defaultdict(set)
+        for token in self.vocabulary:
+            for gram in trigrams(token):
+                self.trigram_index[gram].add(token)
+
+    def expand(self, token):
+        """Vocabulary terms matching ``token`` with their match weight."""
+        matches = {}
+        start = bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            matches[term] = 1.0 if term == token else PREFIX_WEIGHT * len(token) / len(term)
+        if matches:
+            return matches
+
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for term in self.trigram_index.get(gram, ()):
+                shared[term] += 1
+        for term, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(term)) - count)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                matches[term] = FUZZY_WEIGHT * similarity
+        return matches
+
+    def _passes(self, i, filters):
+        if filters.get("exclude_ids") and self.hotels[i]["id"] in filters["exclude_ids"]:
+            return False
+        if filters.get("min_rating") is not None and self.ratings[i] < filters["min_rating"]:
+            return False
+        if filters.get("min_price") is not None and self.prices[i] < filters["min_price"]:
+            return False
+        if filters.get("max_price") is not None and self.prices[i] > filters["max_price"]:
+            return False
+        for wanted in filters.get("amenities") or ():
+            if not any(wanted in have for have in self.amenities[i]):
+                return False
+        return True
+
+    def _price_range(self, filters):
+        """Hotel ids inside the price filter, via bisection on the price-sorted ids."""
+        low = filters.get("min_price")
+        high = filters.get("max_price")
+        start = 0 if low is None else bisect_left(self.sorted_prices, low)
+        end = len(self.by_price) if high is None else bisect_right(self.sorted_prices, high)
+        return self.by_price[start:end]
+
+    def search(self, text, filters=None, offset=0, limit=None):
+        filters = filters or {}
+        filters = dict(filters, amenities=[_squash(a) for a in filters.get("amenities") or () if _squash(a)])
+
+        # For each query token, the posting sets it hits and the score each one contributes.
+        matches = []
+        for token in tokenize(text):
+            hits = [
+                (self.postings[field][term], weight * field_weight)
+                for term, weight in self.expand(token).items()
+                for field, field_weight in FIELD_WEIGHTS.items()
+                if term in self.postings[field]
+            ]
+            if not hits:
+                return 0, []
+            matches.append(hits)
+
+        scores = {}
+        if matches:
+            # Start from the most selective token and only check the survivors against the rest.
+            matches.sort(key=lambda hits: sum(len(ids) for ids, _ in hits))
+            for i in set().union(*(ids for ids, _ in matches[0])):
+                total = 0.0
+                for hits in matches:
+                    best = max((score for ids, score in hits if i in ids), default=None)
+                    if best is None:
+                        break
+                    total += best
+                else:
+                    scores[i] = total
+            candidates = [i for i in scores if self._passes(i, filters)]
+        elif filters.get("min_price") is not None or filters.get("max_price") is not None:
+            candidates = [i for i in self._price_range(filters) if self._passes(i, filters)]
+        else:
+            candidates = [i for i in range(len(self.hotels)) if self._passes(i, filters)]
+
+        end = None if limit is None else offset + limit
+        key = lambda i: (-scores.get(i, 0.0), -self.ratings[i], self.prices[i], i)  # noqa: E731
+        if end is not None and end < len(candidates) // 4:
+            page = heapq.nsmallest(end, candidates, key=key)[offset:]
+        else:
+            page = sorted(candidates, key=key)[offset:end]
+        return len(candidates), [self.hotels[i] for i in page]
+
+
+_index_lock = threading.Lock()
+_index = (None, None)  # (catalog snapshot, HotelIndex built from it)
+
+
+def get_hotel_index():
+    """Return the ``HotelIndex`` for the current catalog snapshot, rebuilding it after invalidation."""
+    global _index
+    snapshot = get_catalog()
+    built_for, index = _index
+    if built_for is snapshot:
+        return index
+    with _index_lock:
+        built_for, index = _index
+        if built_for is not snapshot:
+            index = HotelIndex(snapshot.hotels)
+            _index = (snapshot, index)
+            logger.info(f"Hotel index built: {len(snapshot.hotels)} hotels, {len(index.vocabulary)} terms")
+        return index
+
+
+def _with_availability(filters):
+    """Resolve a ``stay`` filter into the ids of hotels that are full during it (one query)."""
+    if not filters or not filters.get("stay"):
+        return filters
+    return dict(filters, exclude_ids=unavailable_hotel_ids(*filters["stay"]))
+
+
+class CacheBackend:
+    name = 'cache'
+
+    def search(self, text, filters=None, offset=0, limit=None):
+        return get_hotel_index().search(text, _with_availability(filters), offset, limit)
+
+
+class OrmBackend:
+    name = 'orm'
+
+    def search(self, text, filters=None, offset=0, limit=None):
+        filters = _with_availability(filters) or {}
+        queryset = Hotel.objects.order_by("-rating", "price_per_night", "id")
+        if text:
+            queryset = queryset.filter(location__icontains=text.strip())
+        if filters.get("min_rating") is not None:
+            queryset = queryset.filter(rating__gte=filters["min_rating"])
+        if filters.get("min_price") is not None:
+            queryset = queryset.filter(price_per_night__gte=filters["min_price"])
+        if filters.get("max_price") is not None:
+            queryset = queryset.filter(price_per_night__lte=filters["max_price"])
+        for amenity in filters.get("amenities") or ():
+            queryset = queryset.filter(amenities__icontains=amenity)
+        if filters.get("exclude_ids"):
+            queryset = queryset.exclude(id__in=filters["exclude_ids"])
+        end = None if limit is None else offset + limit
+        return queryset.count(), [serialize_hotel(hotel) for hotel in queryset[offset:end]]
+
+
+class HttpBackend:
+    name = 'http'
+
+    def __init__(self, base_url=None, timeout=10):
+        self.base_url = (base_url or settings.SITE_URL).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def search(self, text, filters=None, offset=0, limit=None):
+        filters = filters or {}
+        page_size = limit or settings.HOTEL_SEARCH_MAX_PAGE_SIZE
+        params = {"location": text, "page": offset // page_size + 1, "page_size": page_size}
+        params.update({k: v for k, v in filters.items() if v is not None and k not in ("amenities", "stay")})
+        if filters.get("amenities"):
+            params["amenities"] = ",".join(filters["amenities"])
+        if filters.get("stay"):
+            params["check_in"], params["nights"], params["guests"] = filters["stay"]
+        response = self.session.get(f"{self.base_url}/api/hotels/?{urlencode(params)}", timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        return body["count"], body["results"]
+
+
+BACKENDS = {
+    CacheBackend.name: CacheBackend,
+    OrmBackend.name: OrmBackend,
+    HttpBackend.name: HttpBackend,
+}
+
+
+def absolute_media_url(path, base_url=None):
+    if not path:
+        path = f"{settings.MEDIA_URL}hotel_images/default.webp"
+    if path.startswith(("http://", "https://")):
+        return path
+    return f"{(base_url or settings.SITE_URL).rstrip('/')}{path}"
+
+
+def hotel_card(hotel, base_url=None):
+    """Shape a hotel row into the ``hotel_cards`` payload rendered by chat.js."""
+    return {
+        "image": absolute_media_url(hotel.get("image"), base_url),
+        "title": hotel["name"],
+        "subtitle": hotel["location"],
+        "rating": str(hotel["rating"]),
+        "price": str(hotel["price_per_night"]),
+        "amenities": hotel["amenities"],
+        "buttons": [
+            {
+                "title": "Book Now",
+                "payload": f'/book_hotel{{"hotel_name": "{hotel["name"]}"}}'
+            }
+        ]
+    }
+
+
+class HotelSearchService:
+    def __init__(self, backend=None):
+        if backend is None or isinstance(backend, str):
+            backend = BACKENDS[backend or settings.HOTEL_SEARCH_BACKEND]()
+        self.backend = backend
+
+    def search(self, text, filters=None, page=1, page_size=None):
+        """Return ``(total, rows)`` for one page of ranked results."""
+        page_size = page_size or settings.HOTEL_SEARCH_PAGE_SIZE
+        return self.backend.search(text, filters, (page - 1) * page_size, page_size)
+
+    def cards(self, location, filters=None, base_url=None, limit=None):
+        _, hotels = self.search(location, filters, page_size=limit or settings.HOTEL_CARDS_LIMIT)
+        return [hotel_card(hotel, base_url) for hotel in hotels]
+
+
+_services = {}
+
+
+def get_hotel_search(serving_api=False):
+    """Return the process-wide service using ``settings.HOTEL_SEARCH_BACKEND``.
+
+    ``serving_api`` is for ``/api/hotels/`` itself: the ``http`` backend would
+    call straight back into that view, so there it means ``cache``.
+    """
+    name = settings.HOTEL_SEARCH_BACKEND
+    if serving_api and name == HttpBackend.name:
+        name = CacheBackend.name
+    service = _services.get(name)
+    if service is None:
+        service = _services.setdefault(name, HotelSearchService(name))
+    return service
+
+
+@receiver(setting_changed)
+def reset_hotel_search(setting, **kwargs):
+    if setting == 'HOTEL_SEARCH_BACKEND':
+        _services.clear()
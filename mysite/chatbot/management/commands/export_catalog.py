@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.catalog_import import FEEDS, detect_format, export_feed, open_text
+
+
+class Command(BaseCommand):
+    help = "Stream hotels, flights or packages to a CSV or JSON Lines file that import_catalog reads back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("feed", choices=sorted(FEEDS))
+        parser.add_argument("path", help="output file, or - for stdout (needs --format)")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=5000, help="rows fetched from the database at a time")
+
+    def handle(self, *args, **options):
+        try:
+            fmt = detect_format(options["path"], options["format"])
+            start = time.perf_counter()
+            with open_text(options["path"], "w") as stream:
+                count = export_feed(FEEDS[options["feed"]], stream, fmt, chunk_size=options["chunk_size"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if options["path"] != "-":
+            rate = count / max(time.perf_counter() - start, 1e-9)
+            self.stdout.write(self.style.SUCCESS(f"{options['feed']}: {count} rows exported ({rate:,.0f} rows/s)"))
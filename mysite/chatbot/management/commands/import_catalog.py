@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.catalog_import import FEEDS, detect_format, import_feed, open_text, read_rows
+
+
+class Command(BaseCommand):
+    help = ("Stream a CSV or JSON Lines feed of hotels, flights or packages into the database, "
+            "creating new records and updating changed ones. Rows with deleted=true are removed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("feed", choices=sorted(FEEDS))
+        parser.add_argument("path", help="feed file, or - for stdin (needs --format)")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=5000, help="rows matched and written per transaction")
+        parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT/UPDATE statement")
+        parser.add_argument("--max-errors", type=int, default=None, help="stop after this many invalid rows")
+
+    def handle(self, *args, **options):
+        feed = FEEDS[options["feed"]]
+        try:
+            fmt = detect_format(options["path"], options["format"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def progress(stats):
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"  {stats.summary()}")
+
+        try:
+            with open_text(options["path"], "r") as stream:
+                stats = import_feed(feed, read_rows(stream, fmt), chunk_size=options["chunk_size"],
+                                    batch_size=options["batch_size"], max_errors=options["max_errors"],
+                                    progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, messages in stats.errors:
+            where = f"line {line}" if line else "row"
+            self.stderr.write(f"Invalid {where}: {messages}")
+        self.stdout.write(self.style.SUCCESS(f"{options['feed']}: {stats.summary()}"))
@@ -0,0 +1,197 @@
+"""Write-behind log for chat turns (``UserMessage`` rows).
+
+Chat views and the ``action_save_message`` Rasa action hand turns to
+``get_message_log()`` instead of inserting them inline. In the default
+``batched`` mode turns are queued in memory and a background thread writes
+them with ``bulk_create`` once ``BATCH_SIZE`` turns are waiting or
+``FLUSH_INTERVAL`` seconds have passed, so a chat turn never waits on (or
+serializes behind) the SQLite write lock. The queue is flushed at interpreter
+exit. ``sync`` mode writes each turn immediately, which tests rely on.
+
+Both the Django chat path and the Rasa action record the same turn. The
+views send a ``turn_id`` to Rasa in the message metadata and log with it, and
+``action_save_message`` logs with the same id; each id is claimed in the
+shared Django cache (``CACHE_ALIAS``) for ``DEDUP_WINDOW`` seconds and later
+copies are dropped. Turns logged without an id are always written, so a user asking the
+same thing twice gets both turns recorded.
+
+``forget`` marks a user's history as cleared in the shared cache; queued
+turns from before the mark are dropped when flushed, in any process.
+
+Recorded turns are also appended to the user's cached conversation history
+(``chatbot.conversation``), which ``chat_with_ai`` reads for context.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import conversation
+from .models import UserMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'batched',  # or 'sync'
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+    'DEDUP_WINDOW': 30,
+    'CACHE_ALIAS': 'default',  # dedup claims and clear marks; must be shared by every process
+}
+
+# How long a clear-history mark is kept; queued turns are flushed long before.
+CLEARED_TTL = 3600
+
+
+class MessageLog:
+    def __init__(self, **options):
+        options = {**DEFAULTS, **options}
+        self.batched = options['MODE'] == 'batched'
+        self.batch_size = options['BATCH_SIZE']
+        self.flush_interval = options['FLUSH_INTERVAL']
+        self.dedup_window = options['DEDUP_WINDOW']
+        self.cache = caches[options['CACHE_ALIAS']]
+        self._queue = queue.Queue(maxsize=options['MAX_QUEUE'])
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.purged = 0
+
+    def _claim(self, user_id, turn_id):
+        """True the first time a turn is seen within the dedup window."""
+        if not self.dedup_window or not turn_id:
+            return True
+        return self.cache.add(f"msglog:{user_id}:{turn_id}", 1, self.dedup_window)
+
+    def log(self, user_id, message, response, turn_id=None):
+        """Record one chat turn. Returns False if it was a duplicate or could not be queued.
+
+        ``turn_id`` identifies the turn across processes (see the module docstring).
+        """
+        if not self._claim(user_id, turn_id):
+            self.duplicates += 1
+            logger.debug(f"Skipping duplicate message log for user {user_id}: {message}")
+            return False
+        conversation.remember(user_id, message, response)
+        row = UserMessage(user_id=user_id, message=message, response=response, timestamp=timezone.now())
+        if not self.batched:
+            self._write([row])
+            return True
+
+        self.start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            logger.error(f"Message log queue full, dropping message for user {user_id}")
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def alog(self, user_id, message, response, turn_id=None):
+        """``log`` for async callers, run off the event loop.
+
+        Batched mode only touches the cache (dedup claim, conversation history),
+        so it does not need to queue for the thread-sensitive executor; sync
+        mode writes the database and does.
+        """
+        return await sync_to_async(self.log, thread_sensitive=not self.batched)(user_id, message, response, turn_id)
+
+    def forget(self, user_id):
+        """Drop turns of ``user_id`` that are queued (here or in another process) but not yet written."""
+        self.cache.set(f"msglog:cleared:{user_id}", timezone.now(), CLEARED_TTL)
+
+    def _drop_cleared(self, rows):
+        keys = {row.user_id: f"msglog:cleared:{row.user_id}" for row in rows}
+        cleared = self.cache.get_many(keys.values())
+        if not cleared:
+            return rows
+        kept = [row for row in rows if cleared.get(keys[row.user_id]) is None
+                or row.timestamp > cleared[keys[row.user_id]]]
+        self.purged += len(rows) - len(kept)
+        return kept
+
+    def _write(self, rows):
+        UserMessage.objects.bulk_create(rows)
+        self.written += len(rows)
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written."""
+        with self._flush_lock:
+            rows = []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if rows:
+                rows = self._drop_cleared(rows)
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.error(f"Failed to write {len(batch)} queued messages: {e}")
+            return len(rows)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._queue.empty():
+                close_old_connections()
+                self.flush()
+        close_old_connections()
+
+    def start(self):
+        if self._thread is None:
+            with self._flush_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="message-log-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the writer thread and flush whatever is still queued."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_message_log():
+    """Return the process-wide log configured by ``settings.MESSAGE_LOG``."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = MessageLog(**getattr(settings, 'MESSAGE_LOG', {}))
+    return _log
+
+
+@receiver(setting_changed)
+def reset_message_log(setting, **kwargs):
+    global _log
+    if setting == 'MESSAGE_LOG' and _log is not None:
+        _log.stop()
+        _log = None
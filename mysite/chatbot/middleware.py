@@ -0,0 +1,84 @@
+"""Django's stock middleware with its hooks run on the event loop under ASGI.
+
+``MiddlewareMixin.__acall__`` sends every ``process_request`` and
+``process_response`` through ``sync_to_async(thread_sensitive=True)``. With
+the seven stock middlewares in ``settings.MIDDLEWARE`` that is fourteen hops
+per request onto the one thread-sensitive thread, each queued behind the hops
+of every other in-flight chat; under load that is where an async ``/chat/``
+spends most of its time. Most of these hooks only read headers and cookies, so
+the subclasses below call them inline and fall back to a thread hop only in
+the cases that can touch the database or cache (``request_io`` /
+``response_io``). Under WSGI they behave exactly like the originals.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, csrf, security
+
+
+class InlineHooksMixin:
+    def request_io(self, request):
+        """True if ``process_request`` may hit the database or cache for this request."""
+        return False
+
+    def response_io(self, request):
+        """True if ``process_response`` may hit the database or cache for this request."""
+        return False
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, "process_request"):
+            if self.request_io(request):
+                response = await sync_to_async(self.process_request, thread_sensitive=True)(request)
+            else:
+                response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, "process_response"):
+            if self.response_io(request):
+                response = await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+            else:
+                response = self.process_response(request, response)
+        return response
+
+
+class SecurityMiddleware(InlineHooksMixin, security.SecurityMiddleware):
+    pass
+
+
+class SessionMiddleware(InlineHooksMixin, sessions.SessionMiddleware):
+    # The session store is lazy: it is only loaded when the view (or
+    # request.user) reads it, and that happens in a thread already.
+    def response_io(self, request):
+        session = getattr(request, "session", None)
+        return session is not None and (session.modified or settings.SESSION_SAVE_EVERY_REQUEST)
+
+
+class CommonMiddleware(InlineHooksMixin, common.CommonMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(InlineHooksMixin, csrf.CsrfViewMiddleware):
+    # With CSRF_USE_SESSIONS the token lives in the session rather than a cookie.
+    def request_io(self, request):
+        return settings.CSRF_USE_SESSIONS
+
+    def response_io(self, request):
+        return settings.CSRF_USE_SESSIONS
+
+
+class AuthenticationMiddleware(InlineHooksMixin, auth.AuthenticationMiddleware):
+    # request.user is a lazy object; loading it is left to the view.
+    pass
+
+
+class MessageMiddleware(InlineHooksMixin, messages.MessageMiddleware):
+    # Storing messages can load earlier ones from the session.
+    def response_io(self, request):
+        storage = getattr(request, "_messages", None)
+        return storage is not None and (storage.used or storage.added_new)
+
+
+class XFrameOptionsMiddleware(InlineHooksMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
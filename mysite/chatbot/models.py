@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 # User Profile with Avatar
 class UserProfile(models.Model):
@@ -23,15 +26,40 @@ class UserMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
     response = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the turn happens, not when the batched message log writes it.
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Per-user history pages, newest first (keyset on timestamp, id).
+            models.Index(fields=['user', '-timestamp', '-id'], name='usermessage_user_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
 
 
+# Rasa conversation events, appended by actions.tracker_store.DjangoTrackerStore.
+# Rows are never updated; a tracker is rebuilt from its events in id order.
+class ConversationEvent(models.Model):
+    sender_id = models.CharField(max_length=255)
+    type_name = models.CharField(max_length=255)
+    timestamp = models.FloatField(null=True)
+    data = models.TextField()
+
+    class Meta:
+        indexes = [
+            # A conversation's events in order, and "events after id N" for cache refreshes.
+            models.Index(fields=['sender_id', 'id'], name='convevent_sender_id_idx'),
+            # The conversation's last session start.
+            models.Index(fields=['sender_id', 'type_name', 'id'], name='convevent_sender_type_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sender_id} - {self.type_name}"
+
+
 # Travel package model
 class TravelPackage(models.Model):
     CATEGORY_CHOICES = [
@@ -59,14 +87,33 @@ class Hotel(models.Model):
     price_per_night = models.DecimalField(max_digits=8, decimal_places=2)
     amenities = models.TextField()
     image = models.ImageField(upload_to='hotel_images/', default='hotel_images/default.webp', null=True, blank=True)  # NEW FIELD
+    rooms = models.PositiveIntegerField(default=10)
 
     def __str__(self):
         return self.name
 
 
+# Rooms booked per hotel per night; a row only exists for nights that have bookings.
+class HotelRoomInventory(models.Model):
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name='inventory')
+    night = models.DateField()
+    rooms_booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hotel', 'night'], name='hotel_inventory_hotel_night'),
+        ]
+        indexes = [
+            # "Which hotels are full on any night of this stay" scans a date range across hotels.
+            models.Index(fields=['night', 'hotel'], name='hotel_inventory_night_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hotel.name} - {self.night}: {self.rooms_booked} booked"
+
+
 
 # Flight model
-from django.db import models
 class Flight(models.Model):
     flight_number = models.CharField(max_length=20, unique=True)
     origin = models.CharField(max_length=100)
@@ -74,6 +121,16 @@ class Flight(models.Model):
     departure_time = models.DateTimeField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     seats_available = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            # Route searches: origin + destination + departure window, case-insensitive.
+            models.Index(Lower('origin'), Lower('destination'), F('departure_time'), name='flight_route_departure_idx'),
+            models.Index(Lower('destination'), F('departure_time'), name='flight_dest_departure_idx'),
+            # Unfiltered listings and keyset pagination over (departure_time, id).
+            models.Index(fields=['departure_time', 'id'], name='flight_departure_idx'),
+        ]
+
     def __str__(self):
         return f"{self.flight_number}: {self.origin} to {self.destination}"
     
@@ -90,9 +147,18 @@ class Booking(models.Model):
     reference_id = models.CharField(max_length=100)
     booked_on = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default='Confirmed')
+    # Client-supplied key so a retried booking request returns the original booking.
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
 
     class Meta:
         ordering = ['-booked_on']
+        indexes = [
+            # Per-user booking pages, newest first (keyset on booked_on, id).
+            models.Index(fields=['user', '-booked_on', '-id'], name='booking_user_booked_on_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='booking_user_idempotency_key'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.booking_type} - {self.status}"
@@ -101,7 +167,9 @@ class Booking(models.Model):
 # Hotel booking model
 class HotelBooking(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hotel_bookings')
+    hotel = models.ForeignKey(Hotel, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
     hotel_name = models.CharField(max_length=255)
+    rooms = models.PositiveIntegerField(default=1)
     check_in_date = models.DateField()
     nights = models.IntegerField()
     guests = models.IntegerField()
@@ -115,6 +183,8 @@ class HotelBooking(models.Model):
 
 class FlightBooking(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='flight_bookings')
+    flight = models.ForeignKey(Flight, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
+    seats = models.PositiveIntegerField(default=1)
     departure = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
     travel_date = models.DateField()
@@ -0,0 +1,253 @@
+"""Per-request profiling: query count, DB time, upstream HTTP time and serialization time.
+
+``ProfilingMiddleware`` starts a ``RequestProfile`` for every request and
+stores it in a context variable, so it follows the request into
+``sync_to_async`` threads and async views. Work is attributed to it by:
+
+* a database execute wrapper installed on every connection (``db``)
+* ``timed("upstream")`` around calls to Rasa/OpenRouter in ``upstream.py``
+* ``timed("serialize")`` around serializer ``.data`` in the API views
+  (this includes any queries the serializer triggers, e.g. an N+1)
+
+With ``PROFILING['HEADERS']`` (on when DEBUG) every response carries
+``X-DB-Queries`` and a ``Server-Timing`` header. Every request is also folded
+into per-view histograms served in Prometheus text format at ``/metrics``.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_current = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.timings = {"db": 0.0, "upstream": 0.0, "serialize": 0.0}
+
+    def add(self, kind, seconds):
+        self.timings[kind] = self.timings.get(kind, 0.0) + seconds
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current_profile():
+    return _current.get()
+
+
+def add_time(kind, seconds):
+    profile = _current.get()
+    if profile is not None:
+        profile.add(kind, seconds)
+
+
+@contextmanager
+def timed(kind):
+    """Add the time spent in the block to the current request's ``kind`` bucket."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(kind, time.perf_counter() - start)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.add("db", time.perf_counter() - start)
+
+
+def instrument(connection):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+def instrument_open_connections():
+    for connection in connections.all(initialized_only=True):
+        instrument(connection)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.total += 1
+
+
+class Metrics:
+    """Histograms keyed by ``(metric name, view)``, kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self.help = {}
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """Register a callable returning extra exposition lines (e.g. gauges) to append to ``render``."""
+        self._collectors.append(collector)
+
+    def observe(self, name, view, value, buckets=TIME_BUCKETS, help_text=""):
+        with self._lock:
+            histogram = self._histograms.get((name, view))
+            if histogram is None:
+                histogram = self._histograms[(name, view)] = Histogram(buckets)
+                self.help.setdefault(name, help_text)
+            histogram.observe(value)
+
+    def record_request(self, view, profile, duration):
+        self.observe("chatbot_request_duration_seconds", view, duration, help_text="Total request time")
+        self.observe("chatbot_db_queries", view, profile.queries, COUNT_BUCKETS, "SQL queries per request")
+        for kind, seconds in profile.timings.items():
+            self.observe(f"chatbot_{kind}_seconds", view, seconds, help_text=f"Time spent in {kind} per request")
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition of every histogram."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            lines, seen = [], set()
+            for (name, view), histogram in items:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{view="{view}"}} {histogram.total}')
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.url_name or match.view_name
+
+
+class ProfilingMiddleware:
+    """Profile each request; works under both WSGI and ASGI without adapting the chain."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.headers = getattr(settings, 'PROFILING', {}).get('HEADERS', settings.DEBUG)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_open_connections()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile)
+
+    def _finish(self, request, response, profile):
+        view = _view_name(request)
+        if view == "metrics":
+            return response
+        if self.headers:
+            response["X-DB-Queries"] = str(profile.queries)
+            response["Server-Timing"] = ", ".join(
+                [f"{kind};dur={seconds * 1000:.2f}" for kind, seconds in profile.timings.items()]
+                + [f"total;dur={profile.elapsed * 1000:.2f}"]
+            )
+        if response.streaming:
+            # Stream bodies are produced after this returns; record once they finish.
+            response.streaming_content = self._record_after_stream(response, view, profile)
+        else:
+            metrics.record_request(view, profile, profile.elapsed)
+        return response
+
+    def _record_after_stream(self, response, view, profile):
+        content = response.streaming_content
+        if response.is_async:
+            async def wrapper():
+                _current.set(profile)
+                try:
+                    async for chunk in content:
+                        yield chunk
+                finally:
+                    _current.set(None)
+                    metrics.record_request(view, profile, profile.elapsed)
+        else:
+            def wrapper():
+                _current.set(profile)
+                try:
+                    yield from content
+                finally:
+                    _current.set(None)
+                    metrics.record_request(view, profile, profile.elapsed)
+        return wrapper()
+
+
+def metrics_view(request):
+    """Aggregated request histograms; only served to local/internal addresses."""
+    allowed = {"127.0.0.1", "::1", *getattr(settings, 'INTERNAL_IPS', ())}
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden("Metrics are only available locally.")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
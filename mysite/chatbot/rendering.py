@@ -0,0 +1,108 @@
+"""Pre-rendered chat responses for the travel-package catalog.
+
+The package list, the destination buttons for each category and the detail
+card for each package depend only on the catalog, so they are rendered once
+per catalog snapshot rather than on every turn. Whenever the catalog is
+invalidated (a ``TravelPackage`` or ``Hotel`` is saved or deleted) it builds a
+new snapshot, and the responses are re-rendered from that snapshot on the
+next read. A turn is then a dictionary lookup.
+
+The returned payloads are shared between turns; callers must not mutate them.
+"""
+import logging
+import threading
+
+from .catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+NO_PACKAGES = "Sorry, no travel packages are currently available."
+
+CATEGORY_BUTTONS = [
+    {"title": "🏖️ Beach Holidays", "payload": '/show_destinations{"category":"beach"}'},
+    {"title": "⛰️ Mountain Adventures", "payload": '/show_destinations{"category":"mountain"}'},
+    {"title": "🏙️ City Tours", "payload": '/show_destinations{"category":"city"}'},
+]
+
+BACK_TO_PACKAGES = {"title": "Back to Packages", "payload": "/travel_packages"}
+
+
+def render_package_list(packages):
+    if not packages:
+        return NO_PACKAGES
+    lines = [
+        f"- {p['name']} in {p['destination']} for {p['duration_days']} days at ₹{p['price']}"
+        for p in packages
+    ]
+    return "Here are some available travel packages:\n" + "\n".join(lines) + "\n"
+
+
+def render_destinations(category, packages):
+    return {
+        "text": f"Here are the {category} destinations available:",
+        "buttons": [
+            {"title": p["destination"], "payload": f'/package_detail{{"package_name":"{p["name"]}"}}'}
+            for p in packages
+        ],
+    }
+
+
+def render_package_detail(package):
+    return {
+        "text": (
+            f"📦 *{package['name']}*\n"
+            f"📍 Destination: {package['destination']}\n"
+            f"🗒️ {package['description']}\n"
+            f"💰 Price: ₹{package['price']}\n"
+            f"⏱️ Duration: {package['duration_days']} days"
+        ),
+        "buttons": [
+            {"title": "Book a Flight", "payload": "/book_flight"},
+            {"title": "Search Hotels", "payload": f'/search_hotels{{"location": "{package["destination"]}"}}'},
+            BACK_TO_PACKAGES,
+        ],
+        "slots": {"location": package["destination"], "package_name": package["name"]},
+    }
+
+
+class CatalogResponses:
+    """Every catalog response, rendered from one snapshot."""
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.package_list = render_package_list(snapshot.packages)
+        self.destinations = {
+            category: render_destinations(category, packages)
+            for category, packages in snapshot.packages_by_category.items()
+        }
+        self.package_details = {
+            name: render_package_detail(package) for name, package in snapshot.packages_by_name.items()
+        }
+
+    def destinations_for(self, category):
+        """Destination buttons for ``category``, or None if it has no packages."""
+        return self.destinations.get(category.strip().lower())
+
+    def package_detail(self, package_name):
+        """Detail card for ``package_name`` (case-insensitive), or None if there is no such package."""
+        return self.package_details.get(package_name.strip().lower())
+
+
+_responses = None
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_responses():
+    """Return the responses for the current catalog snapshot, re-rendering them if it changed."""
+    global _responses, _snapshot
+    snapshot = get_catalog()
+    if snapshot is _snapshot:
+        return _responses
+    with _lock:
+        if snapshot is not _snapshot:
+            _responses = CatalogResponses(snapshot)
+            _snapshot = snapshot
+            logger.info(f"Catalog responses rendered for v{snapshot.version}: "
+                        f"{len(_responses.package_details)} packages")
+        return _responses
@@ -0,0 +1,352 @@
+"""Response cache for LLM replies served by ``chat_with_ai``.
+
+Prompts are keyed on a normalized form of the text so trivial rewordings
+("hotels in goa", "Hotels in Goa please!", "goa hotels") share one entry.
+Word order is ignored unless the prompt has a word that gives it direction
+("from", "to", "than"); then the key keeps the order, so "flights from delhi
+to mumbai" and "flights from mumbai to delhi" never share an answer. Keys are
+scoped to the model that wrote the reply. An opt-in TF-IDF index
+(``SIMILARITY_THRESHOLD``) additionally matches near-duplicates above a
+cosine-similarity threshold; it compares words and word pairs, so reordered
+directional questions score low.
+
+Hits, near-hits and misses are exported at ``/metrics``.
+
+Two storage backends are available, selected by ``settings.LLM_RESPONSE_CACHE``:
+
+* ``local``  - an in-process LRU with TTL and a size cap.
+* ``django`` - any cache configured in ``settings.CACHES`` so every worker
+  shares entries and counters. Eviction is left to that cache backend.
+"""
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .profiling import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'local',
+    'CACHE_ALIAS': 'default',
+    'TTL': 60 * 60,
+    'MAX_ENTRIES': 1000,
+    'SIMILARITY_THRESHOLD': None,  # e.g. 0.8 to enable near-duplicate matching
+    'KEY_PREFIX': 'llm-reply',
+}
+
+# Filler only: "from", "to", "than" and the like stay, they decide what is asked.
+STOPWORDS = frozenset(
+    "a an and are at be can could do for give i in is it me my of on or please "
+    "show some tell that the there this what which with would you".split()
+)
+
+# Words that make word order part of the question.
+DIRECTIONAL = frozenset("from to than into before after".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed and a naive plural strip."""
+    tokens = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _key(tokens):
+    if DIRECTIONAL.isdisjoint(tokens):
+        tokens = sorted(tokens)
+    return " ".join(tokens)
+
+
+def _scoped(key, model):
+    return f"{model}|{key}" if model else key
+
+
+def _features(tokens):
+    """Words plus adjacent word pairs, so similarity depends on word order."""
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def normalize(text):
+    """Normalized prompt, e.g. 'Show me hotels in Goa please!' -> 'goa hotel'."""
+    return _key(tokenize(text))
+
+
+class LocalBackend:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.on_evict = None
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self._evicted(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted, _ = self._data.popitem(last=False)
+                self._evicted(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evicted(self, key):
+        if self.on_evict:
+            self.on_evict(key)
+
+
+class DjangoCacheBackend:
+    """Stores entries in a Django cache so all workers share them."""
+
+    def __init__(self, alias, ttl, prefix):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.prefix = prefix
+        self.on_evict = None
+
+    def _key(self, key):
+        return f"{self.prefix}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, self.ttl)
+
+    def clear(self):
+        self.cache.delete_many([f"{self.prefix}:stats:{name}" for name in ResponseCache.COUNTERS])
+
+    def incr(self, name):
+        key = f"{self.prefix}:stats:{name}"
+        if not self.cache.add(key, 1, None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+
+    def counters(self):
+        keys = {f"{self.prefix}:stats:{name}": name for name in ResponseCache.COUNTERS}
+        values = self.cache.get_many(list(keys))
+        return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+class SimilarityIndex:
+    """TF-IDF index over cached prompts for near-duplicate lookups."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._docs = OrderedDict()  # key -> Counter of tokens
+        self._postings = {}  # token -> set of keys
+        self._df = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key, tokens):
+        with self._lock:
+            if key in self._docs:
+                self._docs.move_to_end(key)
+                return
+            counts = Counter(tokens)
+            self._docs[key] = counts
+            for token in counts:
+                self._df[token] += 1
+                self._postings.setdefault(token, set()).add(key)
+            while len(self._docs) > self.max_entries:
+                self._remove(next(iter(self._docs)))
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        counts = self._docs.pop(key, None)
+        if counts is None:
+            return
+        for token in counts:
+            self._df[token] -= 1
+            if not self._df[token]:
+                del self._df[token]
+            keys = self._postings.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[token]
+
+    def _vector(self, counts):
+        total = len(self._docs) + 1
+        vector = {
+            token: count * (math.log(total / (1 + self._df.get(token, 0))) + 1)
+            for token, count in counts.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {token: weight / norm for token, weight in vector.items()}
+
+    def best_match(self, tokens, threshold, prefix=""):
+        """Return ``(key, score)`` of the most similar indexed prompt whose key starts with ``prefix``, or ``(None, 0)``."""
+        with self._lock:
+            query = self._vector(Counter(tokens))
+            candidates = set()
+            for token in query:
+                candidates |= self._postings.get(token, set())
+            best_key, best_score = None, 0.0
+            for key in candidates:
+                if not key.startswith(prefix):
+                    continue
+                doc = self._vector(self._docs[key])
+                score = sum(weight * doc.get(token, 0.0) for token, weight in query.items())
+                if score > best_score:
+                    best_key, best_score = key, score
+        if best_score >= threshold:
+            return best_key, best_score
+        return None, 0.0
+
+
+class ResponseCache:
+    COUNTERS = ('hits', 'near_hits', 'misses', 'stores')
+
+    def __init__(self, **options):
+        options = {**DEFAULTS, **options}
+        self.threshold = options['SIMILARITY_THRESHOLD']
+        if options['BACKEND'] == 'django':
+            self.backend = DjangoCacheBackend(options['CACHE_ALIAS'], options['TTL'], options['KEY_PREFIX'])
+        else:
+            self.backend = LocalBackend(options['MAX_ENTRIES'], options['TTL'])
+        self.index = SimilarityIndex(options['MAX_ENTRIES']) if self.threshold else None
+        if self.index:
+            self.backend.on_evict = self.index.remove
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        if isinstance(self.backend, DjangoCacheBackend):
+            self.backend.incr(name)
+        else:
+            with self._lock:
+                self._counters[name] += 1
+
+    def get(self, prompt, model=None):
+        """Return the cached reply ``model`` gave to ``prompt`` (or a near-duplicate), else None."""
+        tokens = tokenize(prompt)
+        if not tokens:
+            return None
+        key = _scoped(_key(tokens), model)
+        reply = self.backend.get(key)
+        if reply is not None:
+            self._count('hits')
+            return reply
+        if self.index:
+            match, score = self.index.best_match(_features(tokens), self.threshold, _scoped("", model))
+            if match:
+                reply = self.backend.get(match)
+                if reply is not None:
+                    logger.info(f"LLM cache near-hit ({score:.2f}): '{prompt}' ~ '{match}'")
+                    self._count('near_hits')
+                    return reply
+                self.index.remove(match)
+        self._count('misses')
+        return None
+
+    def set(self, prompt, reply, model=None):
+        tokens = tokenize(prompt)
+        if not tokens or not reply:
+            return
+        key = _scoped(_key(tokens), model)
+        self.backend.set(key, reply)
+        if self.index:
+            self.index.add(key, _features(tokens))
+        self._count('stores')
+
+    async def aget(self, prompt, model=None):
+        if isinstance(self.backend, LocalBackend):
+            return self.get(prompt, model)
+        return await sync_to_async(self.get, thread_sensitive=False)(prompt, model)
+
+    async def aset(self, prompt, reply, model=None):
+        if isinstance(self.backend, LocalBackend):
+            return self.set(prompt, reply, model)
+        return await sync_to_async(self.set, thread_sensitive=False)(prompt, reply, model)
+
+    def clear(self):
+        self.backend.clear()
+        if self.index:
+            self.index = SimilarityIndex(self.index.max_entries)
+            self.backend.on_evict = self.index.remove
+        with self._lock:
+            self._counters.clear()
+
+    def stats(self):
+        if isinstance(self.backend, DjangoCacheBackend):
+            counters = self.backend.counters()
+        else:
+            with self._lock:
+                counters = {name: self._counters[name] for name in self.COUNTERS}
+            counters['size'] = len(self.backend)
+        lookups = counters['hits'] + counters['near_hits'] + counters['misses']
+        counters['hit_rate'] = (counters['hits'] + counters['near_hits']) / lookups if lookups else 0.0
+        return counters
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide cache configured by ``settings.LLM_RESPONSE_CACHE``."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(**getattr(settings, 'LLM_RESPONSE_CACHE', {}))
+    return _cache
+
+
+LOOKUP_RESULTS = (("hit", "hits"), ("near_hit", "near_hits"), ("miss", "misses"))
+
+
+def _metric_lines():
+    """Lookup and store counters of the process-wide cache, in Prometheus text format."""
+    stats = get_response_cache().stats()
+    lines = ["# HELP chatbot_llm_cache_lookups_total LLM reply cache lookups by result",
+             "# TYPE chatbot_llm_cache_lookups_total counter"]
+    lines += [f'chatbot_llm_cache_lookups_total{{result="{result}"}} {stats[name]}' for result, name in LOOKUP_RESULTS]
+    lines += ["# HELP chatbot_llm_cache_stores_total Replies stored in the LLM reply cache",
+              "# TYPE chatbot_llm_cache_stores_total counter",
+              f"chatbot_llm_cache_stores_total {stats['stores']}"]
+    return lines
+
+
+metrics.add_collector(_metric_lines)
@@ -0,0 +1,207 @@
+"""Answer button payloads in Django instead of round-tripping them through Rasa.
+
+Most chat traffic is button clicks whose payload already names the intent,
+in Rasa's ``/intent{"entity": "value"}`` shorthand, so there is nothing for
+NLU to do. The router parses those payloads (and messages that are just an
+intent name), checks the intent against ``domain.yml``, and answers the
+intents whose reply depends only on the domain responses or the catalog. It
+uses a dispatch table compiled once per process.
+
+Everything else goes to Rasa as before: free text, the booking forms, and
+intents whose actions read conversation state. Payloads sent while Rasa has
+a form (loop) active also go to Rasa, as the form decides what they mean;
+the caller checks the tracker before answering locally. Slots that Rasa would
+have filled from the payload entities or set in the action are returned as
+``slots``, and ``tracker_events`` turns a routed reply into the user, slot
+and bot events the caller appends to the Rasa tracker, so later turns and
+Rasa's policies see the conversation as if Rasa had answered it.
+
+Handlers are registered with ``@register("intent")``. A handler takes the
+router and the payload entities and returns a reply dict (``reply``,
+``buttons``, ``custom``, ``slots``), or None to hand the turn to Rasa.
+"""
+import json
+import logging
+import re
+import threading
+
+import yaml
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .rendering import BACK_TO_PACKAGES, CATEGORY_BUTTONS, get_responses
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_RE = re.compile(r"^/?(?P<intent>\w+)(?P<entities>\{.*\})?$", re.DOTALL)
+
+HANDLERS = {}
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def reset_router():
+    global _router
+    _router = None
+
+
+def register(intent):
+    """Decorator adding a local handler for ``intent`` to every router built afterwards."""
+    def decorator(handler):
+        HANDLERS[intent] = handler
+        reset_router()
+        return handler
+    return decorator
+
+
+def load_domain(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Could not load Rasa domain from {path}, routing everything to Rasa: {str(e)}")
+        return {}
+
+
+class IntentRouter:
+    def __init__(self, domain, handlers=None):
+        # Intents may be listed as plain names or as {name: {options}}.
+        self.intents = frozenset(
+            next(iter(intent)) if isinstance(intent, dict) else intent
+            for intent in domain.get("intents", [])
+        )
+        self.slots = frozenset(domain.get("slots", {}))
+        self.responses = domain.get("responses", {})
+        self.table = {
+            intent: handler
+            for intent, handler in (HANDLERS if handlers is None else handlers).items()
+            if intent in self.intents
+        }
+
+    def parse(self, message):
+        """Return ``(intent, entities)`` for a structured payload naming a domain intent, else None."""
+        match = PAYLOAD_RE.match(message)
+        if not match or match["intent"] not in self.intents:
+            return None
+        entities = {}
+        if match["entities"]:
+            try:
+                entities = json.loads(match["entities"])
+            except ValueError:
+                return None
+            if not isinstance(entities, dict):
+                return None
+        return match["intent"], entities
+
+    def route(self, message):
+        """Answer ``message`` locally, or return None if it has to go to Rasa."""
+        parsed = self.parse(message)
+        if parsed is None:
+            return None
+        intent, entities = parsed
+        handler = self.table.get(intent)
+        if handler is None:
+            return None
+        reply = handler(self, entities)
+        if reply is None:
+            return None
+        # Entities fill the slots of the same name, as the from_entity mappings do in Rasa.
+        slots = {name: value for name, value in entities.items() if name in self.slots}
+        slots.update(reply.get("slots", {}))
+        return {
+            "intent": intent,
+            "entities": entities,
+            "reply": reply.get("reply", ""),
+            "buttons": reply.get("buttons", []),
+            "custom": reply.get("custom"),
+            "slots": slots,
+        }
+
+    def utter(self, name):
+        """The first variant of a domain response as a reply dict."""
+        variants = self.responses.get(name)
+        if not variants:
+            return None
+        return {"reply": variants[0].get("text", "").strip(), "buttons": variants[0].get("buttons", [])}
+
+
+@register("greet")
+def greet(router, entities):
+    return router.utter("utter_greet")
+
+
+@register("thank")
+def thank(router, entities):
+    return router.utter("utter_thank")
+
+
+@register("goodbye")
+def goodbye(router, entities):
+    return router.utter("utter_goodbye")
+
+
+@register("travel_packages")
+def travel_packages(router, entities):
+    return {"reply": "Choose a travel category:", "buttons": CATEGORY_BUTTONS}
+
+
+@register("show_destinations")
+def show_destinations(router, entities):
+    category = entities.get("category")
+    if not category:
+        return None  # Rasa may still have the slot from an earlier turn
+    rendered = get_responses().destinations_for(category)
+    if not rendered:
+        return {"reply": f"Sorry, we couldn't find any packages in the {category} category."}
+    return {"reply": rendered["text"], "buttons": rendered["buttons"]}
+
+
+@register("package_detail")
+def package_detail(router, entities):
+    package_name = entities.get("package_name")
+    if not package_name:
+        return None
+    rendered = get_responses().package_detail(package_name)
+    if not rendered:
+        return {"reply": f"Sorry, I couldn’t find a travel package named '{package_name}'.",
+                "buttons": [BACK_TO_PACKAGES]}
+    return {"reply": rendered["text"], "buttons": rendered["buttons"], "slots": rendered["slots"]}
+
+
+def tracker_events(message, routed):
+    """Rasa events for a turn answered locally: the user message, the slots it set, the reply."""
+    parse_data = {
+        "text": message,
+        "intent": {"name": routed["intent"], "confidence": 1.0},
+        "entities": [{"entity": name, "value": value} for name, value in routed["entities"].items()],
+    }
+    events = [{"event": "user", "text": message, "parse_data": parse_data}]
+    events += [{"event": "slot", "name": name, "value": value} for name, value in routed["slots"].items()]
+    events.append({
+        "event": "bot",
+        "text": routed["reply"],
+        "data": {"buttons": routed["buttons"] or None, "custom": routed["custom"]},
+    })
+    events.append({"event": "action", "name": "action_listen"})
+    return events
+
+
+def get_router():
+    """Return the process-wide router configured by ``settings.CHAT_ROUTER``, or None if it is disabled."""
+    global _router
+    options = getattr(settings, 'CHAT_ROUTER', {})
+    if not options.get('ENABLED', True):
+        return None
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter(load_domain(options.get('DOMAIN', settings.BASE_DIR.parent / 'domain.yml')))
+    return _router
+
+
+@receiver(setting_changed)
+def reset_router_on_setting_change(setting, **kwargs):
+    if setting == 'CHAT_ROUTER':
+        reset_router()
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
-    UserMessage, TravelPackage, Hotel, Flight, Booking, UserProfile
+    UserMessage, TravelPackage, Hotel, Flight, Booking, UserProfile, HotelBooking, FlightBooking
 )
 
 class CombinedUserSerializer(serializers.ModelSerializer):
@@ -70,9 +70,38 @@ class FlightSerializer(serializers.ModelSerializer):
         model = Flight
         fields = '__all__'
 
+class HotelBookingSerializer(serializers.ModelSerializer):
+    location = serializers.CharField(source='hotel.location', default=None, read_only=True)
+    price_per_night = serializers.DecimalField(source='hotel.price_per_night', max_digits=8, decimal_places=2,
+                                               default=None, read_only=True)
+
+    class Meta:
+        model = HotelBooking
+        fields = ['id', 'hotel', 'hotel_name', 'location', 'price_per_night', 'check_in_date', 'nights', 'guests',
+                  'rooms', 'created_at']
+
+class FlightBookingSerializer(serializers.ModelSerializer):
+    flight_number = serializers.CharField(source='flight.flight_number', default=None, read_only=True)
+    departure_time = serializers.DateTimeField(source='flight.departure_time', default=None, read_only=True)
+
+    class Meta:
+        model = FlightBooking
+        fields = ['id', 'flight', 'flight_number', 'departure', 'destination', 'departure_time', 'travel_date',
+                  'seats', 'created_at']
+
 class BookingSerializer(serializers.ModelSerializer):
     user = CombinedUserSerializer(read_only=True)  # Updated to use CombinedUserSerializer
+    details = serializers.SerializerMethodField()
 
     class Meta:
         model = Booking
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'user', 'booking_type', 'reference_id', 'booked_on', 'status', 'details']
+
+    def get_details(self, obj):
+        # Filled in for the whole page by booking.attach_details, never per row.
+        details = getattr(obj, 'details', None)
+        if isinstance(details, HotelBooking):
+            return HotelBookingSerializer(details).data
+        if isinstance(details, FlightBooking):
+            return FlightBookingSerializer(details).data
+        return details
\ No newline at end of file
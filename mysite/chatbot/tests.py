@@ -1,3 +1,1341 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import catalog, conversation, rendering, upstream
+from .availability import InvalidStay, is_available, stay_nights, unavailable_hotel_ids
+from .event_store import EventStore
+from .hotel_search import CacheBackend, HotelSearchService, HttpBackend, OrmBackend, get_hotel_search
+from .flight_search import InvalidSearch, flight_cards_for_slots, search_flights
+from .booking import HotelUnavailable, InvalidBooking, NoMatchingFlight, SoldOut, book_flight, book_hotel
+from .message_log import MessageLog
+from .profiling import metrics
+from .models import Booking, ConversationEvent, Flight, FlightBooking, Hotel, TravelPackage, UserMessage
+from .response_cache import ResponseCache, get_response_cache, normalize
+from .router import IntentRouter
+
+
+def fake_llm_client(handler):
+    """Pooled-client stand-in whose requests are answered by ``handler`` in-process."""
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@override_settings(MESSAGE_LOG={'MODE': 'sync', 'DEDUP_WINDOW': 0})
+class StreamingChatWithAITests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="secret")
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        get_response_cache().clear()
+
+    async def test_tokens_are_streamed_before_completion_finishes(self):
+        release = asyncio.Event()
+
+        async def completion_stream():
+            yield b'data: {"choices": [{"delta": {"content": "Goa "}}]}\n\n'
+            # Hold the rest of the completion back until the view has relayed the first token.
+            await release.wait()
+            yield b": OPENROUTER PROCESSING\n\n"
+            yield b'data: {"choices": [{"delta": {"content": "is sunny."}}]}\n\n'
+            yield b"data: [DONE]\n\n"
+
+        def handler(request):
+            self.assertTrue(json.loads(request.content)["stream"])
+            return httpx.Response(200, content=completion_stream(), headers={"Content-Type": "text/event-stream"})
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(handler)):
+            response = await self.async_client.post(
+                "/chat/ai/", {"message": "weather in goa", "stream": True}, content_type="application/json"
+            )
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+
+            chunks = response.streaming_content.__aiter__()
+            first = await chunks.__anext__()
+            self.assertEqual(first, b'data: {"token": "Goa "}\n\n')
+            release.set()
+            rest = b"".join([chunk async for chunk in chunks])
+
+        self.assertIn(b'data: {"token": "is sunny."}', rest)
+        self.assertIn(b'event: done\ndata: {"reply": "Goa is sunny."}', rest)
+        saved = await UserMessage.objects.aget(user=self.user)
+        self.assertEqual(saved.response, "Goa is sunny.")
+
+    async def test_upstream_failure_emits_error_event(self):
+        def handler(request):
+            return httpx.Response(502)
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(handler)):
+            response = await self.async_client.post(
+                "/chat/ai/", {"message": "hi", "stream": True}, content_type="application/json"
+            )
+            body = b"".join([chunk async for chunk in response.streaming_content])
+
+        self.assertTrue(body.startswith(b"event: error\n"))
+        self.assertFalse(await UserMessage.objects.filter(user=self.user).aexists())
+
+
+class ResponseCacheTests(TestCase):
+    def test_rewordings_share_a_key(self):
+        self.assertEqual(normalize("hotels in goa"), normalize("Show me hotels in Goa please!"))
+        self.assertEqual(normalize("hotels in goa"), normalize("goa hotels please"))
+
+    def test_replies_are_scoped_to_the_model(self):
+        cache = ResponseCache(SIMILARITY_THRESHOLD=0.5)
+        cache.set("best beach hotels in goa", "Try Taj Fort Aguada.", "deepseek/deepseek-r1")
+        self.assertEqual(cache.get("goa beach hotels best", "deepseek/deepseek-r1"), "Try Taj Fort Aguada.")
+        self.assertIsNone(cache.get("best beach hotels in goa", "openai/gpt-4o"))
+        self.assertIsNone(cache.get("best beach hotels goa india", "openai/gpt-4o"))
+
+    def test_order_and_direction_are_part_of_the_key(self):
+        self.assertNotEqual(normalize("flights from delhi to mumbai"), normalize("flights from mumbai to delhi"))
+        self.assertNotEqual(normalize("is goa cheaper than bali"), normalize("is bali cheaper than goa"))
+        cache = ResponseCache(SIMILARITY_THRESHOLD=0.8)
+        cache.set("flights from delhi to mumbai", "IndiGo at 6am.")
+        self.assertIsNone(cache.get("flights from mumbai to delhi"))
+        self.assertEqual(cache.get("Flights from Delhi to Mumbai?"), "IndiGo at 6am.")
+
+    def test_near_duplicates_match_above_threshold(self):
+        cache = ResponseCache(SIMILARITY_THRESHOLD=0.7)
+        cache.set("best beach hotels in goa", "Try Taj Fort Aguada.")
+        self.assertEqual(cache.get("best beach hotels goa india"), "Try Taj Fort Aguada.")
+        self.assertIsNone(cache.get("flights to delhi"))
+        stats = cache.stats()
+        self.assertEqual((stats["near_hits"], stats["misses"]), (1, 1))
+
+    def test_lru_eviction_and_ttl(self):
+        cache = ResponseCache(MAX_ENTRIES=2, TTL=60)
+        cache.set("goa", "a")
+        cache.set("manali", "b")
+        cache.get("goa")
+        cache.set("delhi", "c")
+        self.assertIsNone(cache.get("manali"))
+        self.assertEqual(cache.get("goa"), "a")
+
+        with mock.patch("chatbot.response_cache.time.monotonic", return_value=10 ** 9):
+            self.assertIsNone(cache.get("goa"))
+
+    def test_django_backend_shares_entries_and_counters(self):
+        first = ResponseCache(BACKEND="django", KEY_PREFIX="test-llm")
+        second = ResponseCache(BACKEND="django", KEY_PREFIX="test-llm")
+        first.clear()
+        first.set("hotels in goa", "Goa has many hotels.")
+        self.assertEqual(second.get("hotels in goa please"), "Goa has many hotels.")
+        self.assertEqual(first.stats()["hits"], 1)
+
+    async def test_chat_with_ai_serves_repeat_prompts_from_cache(self):
+        get_response_cache().clear()
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "Stay in Calangute."}}]})
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(handler)):
+            first = await self.async_client.post("/chat/ai/", {"message": "hotels in goa"}, content_type="application/json")
+            second = await self.async_client.post("/chat/ai/", {"message": "Hotels in Goa please"}, content_type="application/json")
+            third = await self.async_client.post("/chat/ai/", {"message": "goa hotels please"}, content_type="application/json")
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((first["X-Cache"], second["X-Cache"], third["X-Cache"]), ("MISS", "HIT", "HIT"))
+        self.assertEqual(third.json()["reply"], "Stay in Calangute.")
+
+        exposition = (await self.async_client.get("/metrics")).content.decode()
+        self.assertIn('chatbot_llm_cache_lookups_total{result="hit"} 2', exposition)
+        self.assertIn('chatbot_llm_cache_lookups_total{result="miss"} 1', exposition)
+
+
+@override_settings(MESSAGE_LOG={'MODE': 'sync', 'DEDUP_WINDOW': 0})
+class ConversationContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        metrics.reset()
+        self.user = User.objects.create_user(username="alice", password="secret")
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def test_history_is_trimmed_to_the_token_budget_newest_first(self):
+        turns = [[f"question {i} " + "x" * 400, f"answer {i} " + "y" * 400] for i in range(5)]
+        options = dict(conversation.DEFAULTS, TOKEN_BUDGET=500)
+        context = conversation.build_messages("system", "and now?", turns, options)
+
+        self.assertEqual((context.turns, context.dropped, context.summarized), (2, 3, False))
+        self.assertTrue(context.messages[1]["content"].startswith("question 3"))
+        self.assertEqual(context.messages[-1], {"role": "user", "content": "and now?"})
+
+        context = conversation.build_messages("system", "and now?", turns, dict(options, SUMMARIZE=True))
+        self.assertTrue(context.summarized)
+        self.assertIn("- question 2", context.messages[1]["content"])
+        self.assertEqual(context.tokens, sum(conversation.estimate_tokens(m["content"]) for m in context.messages))
+
+    def test_recent_turns_are_read_from_cache_once_loaded(self):
+        UserMessage.objects.create(user=self.user, message="flights to goa?", response="Try IndiGo.")
+        self.assertEqual(conversation.recent_turns(self.user.id), [["flights to goa?", "Try IndiGo."]])
+        conversation.remember(self.user.id, "and hotels?", "Sea View.")
+        with self.assertNumQueries(0):
+            self.assertEqual(conversation.recent_turns(self.user.id)[-1], ["and hotels?", "Sea View."])
+        self.client.post("/clear_chat/")
+        self.assertEqual(conversation.recent_turns(self.user.id), [])
+
+    def test_only_turns_from_the_current_session_are_context(self):
+        UserMessage.objects.create(user=self.user, message="flights to goa?", response="Try IndiGo.",
+                                   timestamp=timezone.now() - timedelta(hours=3))
+        self.assertEqual(conversation.recent_turns(self.user.id), [])
+        conversation.remember(self.user.id, "and hotels?", "Sea View.")
+        self.assertEqual(conversation.recent_turns(self.user.id), [["and hotels?", "Sea View."]])
+        with mock.patch("chatbot.conversation.time.time", return_value=time.time() + 3600):
+            self.assertEqual(conversation.recent_turns(self.user.id), [])
+
+    async def test_returning_user_is_served_from_the_reply_cache(self):
+        await UserMessage.objects.acreate(user=self.user, message="hi", response="Hello!",
+                                          timestamp=timezone.now() - timedelta(days=2))
+        await get_response_cache().aset("hotels in goa", "Sea View is lovely.", settings.OPENROUTER_MODEL)
+        response = await self.async_client.post("/chat/ai/", {"message": "hotels in goa"},
+                                                content_type="application/json")
+        self.assertEqual((response["X-Cache"], response.json()["reply"]), ("HIT", "Sea View is lovely."))
+
+    async def test_follow_up_prompt_carries_earlier_turns(self):
+        prompts = []
+
+        def handler(request):
+            prompts.append(json.loads(request.content)["messages"])
+            return httpx.Response(200, json={"choices": [{"message": {"content": f"Reply {len(prompts)}"}}]})
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(handler)):
+            await self.async_client.post("/chat/ai/", {"message": "beaches in goa"}, content_type="application/json")
+            second = await self.async_client.post("/chat/ai/", {"message": "beaches in goa"}, content_type="application/json")
+
+        self.assertEqual(len(prompts[0]), 2)
+        self.assertEqual(prompts[1][1:3], [{"role": "user", "content": "beaches in goa"},
+                                           {"role": "assistant", "content": "Reply 1"}])
+        # The repeat is a follow-up now, so it is not answered from the reply cache.
+        self.assertEqual(second["X-Cache"], "MISS")
+        self.assertIn('chatbot_prompt_tokens_count{view="chat_with_ai"} 2', metrics.render())
+
+
+@override_settings(MESSAGE_LOG={'MODE': 'sync', 'DEDUP_WINDOW': 0},
+                   CHAT_AUTO={'CONFIDENCE': 0.7, 'RASA_DEADLINE': 2.0, 'LLM_DEADLINE': 2.0})
+class ChatAutoTests(TestCase):
+    """/chat/auto/ against stub Rasa and LLM backends with per-backend delays."""
+
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        self.delays = {"parse": 0.0, "webhook": 0.0, "llm": 0.0}
+        self.confidence = 0.95
+        self.calls = []
+
+    async def backends(self, request):
+        path = request.url.path
+        backend = "parse" if path == "/model/parse" else "webhook" if path.startswith("/webhooks") else "llm"
+        self.calls.append(backend)
+        await asyncio.sleep(self.delays[backend])
+        if backend == "parse":
+            return httpx.Response(200, json={"intent": {"name": "search_hotels", "confidence": self.confidence}})
+        if backend == "webhook":
+            return httpx.Response(200, json=[{"text": "Rasa: here are hotels"}])
+        return httpx.Response(200, json={"choices": [{"message": {"content": "LLM: try Goa"}}]})
+
+    async def chat(self, message):
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(self.backends)):
+            start = time.perf_counter()
+            response = await self.async_client.post("/chat/auto/", {"message": message}, content_type="application/json")
+            return response, time.perf_counter() - start
+
+    async def test_confident_rasa_answer_wins_and_llm_is_cancelled(self):
+        self.delays["llm"] = 60
+        response, elapsed = await self.chat("hotels in goa")
+        self.assertEqual((response["X-Route"], response.json()["reply"]), ("rasa", "Rasa: here are hotels"))
+        self.assertIn("llm", self.calls)
+        self.assertLess(elapsed, 1.0)
+
+    async def test_webhook_is_only_called_once_nlu_is_confident(self):
+        self.delays["parse"] = 0.2
+        await self.chat("hotels in goa")
+        self.assertEqual(self.calls[-1], "webhook")
+        self.assertEqual(self.calls.count("webhook"), 1)
+
+    async def test_low_confidence_falls_back_in_max_not_sum_of_latencies(self):
+        self.confidence = 0.3
+        self.delays = {"parse": 0.3, "webhook": 0.3, "llm": 0.3}
+        response, elapsed = await self.chat("what should I pack for ladakh")
+        self.assertEqual((response["X-Route"], response.json()["reply"]), ("llm", "LLM: try Goa"))
+        self.assertLess(elapsed, 0.55)
+        # The tracker is left alone: no form opened, no "Sorry" reply saved by Rasa.
+        self.assertNotIn("webhook", self.calls)
+
+    @override_settings(CHAT_AUTO={'CONFIDENCE': 0.7, 'RASA_DEADLINE': 0.1, 'LLM_DEADLINE': 2.0})
+    async def test_rasa_past_its_deadline_is_abandoned(self):
+        self.delays.update(parse=60, webhook=60)
+        response, elapsed = await self.chat("hotels in goa")
+        self.assertEqual(response["X-Route"], "llm")
+        self.assertLess(elapsed, 1.0)
+        self.assertNotIn("webhook", self.calls)
+
+    async def test_button_payloads_skip_nlu_and_llm(self):
+        response, _ = await self.chat("/book_flight")
+        self.assertEqual(response["X-Route"], "rasa")
+        self.assertEqual(self.calls, ["webhook"])
+
+
+FAST_BACKENDS = {
+    name: {'FAILURE_THRESHOLD': 3, 'RESET_TIMEOUT': 60, 'MIN_TIMEOUT': 0.05, 'MAX_TIMEOUT': 1.0,
+           'MIN_SAMPLES': 5, 'RETRIES': 1, 'BACKOFF': 0.001, 'MAX_CONCURRENCY': 10, 'QUEUE_TIMEOUT': 0.05}
+    for name in ("rasa", "llm")
+}
+
+
+@override_settings(UPSTREAM_BACKENDS=FAST_BACKENDS)
+class UpstreamResilienceTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+        upstream._backends.clear()  # fresh breakers and counters for each test
+
+    async def call_with(self, handler, fn, *args):
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(handler)):
+            return await fn(*args)
+
+    async def test_breaker_opens_and_chat_falls_back_without_calling_rasa(self):
+        def down(request):
+            self.calls += 1
+            return httpx.Response(503)
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(down)):
+            for _ in range(5):
+                response = await self.async_client.post("/chat/", {"message": "hi there"}, content_type="application/json")
+                self.assertEqual(response.json()["reply"], "Error communicating with Rasa server.")
+
+        # Sending a message is not idempotent, so a 503 is not retried; the breaker opened after 3 calls.
+        self.assertEqual(self.calls, 3)
+        stats = upstream.get_backend("rasa").stats()
+        self.assertEqual((stats["state"], stats["short_circuited"]), ("open", 2))
+        self.assertIn('chatbot_upstream_circuit_state{backend="rasa"} 2', metrics.render())
+
+    async def test_half_open_probe_closes_the_circuit(self):
+        backend = upstream.get_backend("rasa")
+        backend.breaker.reset_timeout = 0
+        for _ in range(3):
+            backend.breaker.record_failure()
+
+        slots = await self.call_with(lambda request: httpx.Response(200, json={"slots": {"location": "Goa"}}),
+                                     upstream.get_rasa_slots, "alice")
+        self.assertEqual(slots, {"location": "Goa"})
+        self.assertEqual(backend.breaker.state, "closed")
+
+    async def test_idempotent_calls_are_retried_after_transport_errors(self):
+        def flaky(request):
+            self.calls += 1
+            if self.calls == 1:
+                raise httpx.ReadError("connection reset")
+            return httpx.Response(200, json={"intent": {"name": "greet", "confidence": 0.9}})
+
+        parsed = await self.call_with(flaky, upstream.parse_rasa, "hello")
+        self.assertEqual(parsed["intent"]["name"], "greet")
+        self.assertEqual(upstream.get_backend("rasa").counts["retry"], 1)
+
+    def test_timeout_follows_observed_p95_within_bounds(self):
+        backend = upstream.get_backend("llm")
+        self.assertEqual(backend.timeout(), 1.0)  # too few samples yet
+        for seconds in (0.1, 0.1, 0.1, 0.1, 0.2):
+            backend.latency.add(seconds)
+        self.assertAlmostEqual(backend.timeout(), 0.4)
+        for _ in range(20):
+            backend.latency.add(5.0)
+        self.assertEqual(backend.timeout(), 1.0)
+
+    async def test_concurrency_limit_rejects_excess_calls(self):
+        backend = upstream.get_backend("llm")
+        backend.max_concurrency = 1
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return httpx.Response(200, json={"choices": []})
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(slow)):
+            first = asyncio.create_task(upstream.post_llm({}))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(upstream.UpstreamUnavailable):
+                await upstream.post_llm({})
+            release.set()
+            await first
+        self.assertEqual(backend.counts["rejected"], 1)
+
+    async def test_chats_beyond_the_limit_queue_instead_of_failing(self):
+        limit, in_flight, peak = 5, [0], [0]
+
+        async def rasa(request):
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.02)
+            in_flight[0] -= 1
+            return httpx.Response(200, json=[{"text": "Hi!"}])
+
+        # Shipped queueing: no QUEUE_TIMEOUT, so calls wait up to MAX_TIMEOUT for a slot.
+        options = {'MAX_CONCURRENCY': limit, 'MAX_TIMEOUT': 5.0}
+        with override_settings(UPSTREAM_BACKENDS={'rasa': options}), \
+                mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(rasa)):
+            responses = await asyncio.gather(*(
+                self.async_client.post("/chat/", {"message": f"hello {i}"}, content_type="application/json")
+                for i in range(10 * limit)
+            ))
+            counts = upstream.get_backend("rasa").counts
+        self.assertEqual([r.json()["reply"] for r in responses], ["Hi!"] * (10 * limit))
+        self.assertEqual((counts["rejected"], counts["success"]), (0, 10 * limit))
+        self.assertEqual(peak[0], limit)
+
+    def test_concurrency_limit_is_shared_by_event_loops(self):
+        # Under WSGI every request runs on its own loop, in its own thread.
+        backend = upstream.get_backend("llm")
+        backend.max_concurrency = 1
+        started, release = threading.Event(), threading.Event()
+
+        async def slow(request):
+            started.set()
+            await asyncio.get_running_loop().run_in_executor(None, release.wait)
+            return httpx.Response(200, json={"choices": []})
+
+        with mock.patch("chatbot.upstream.get_client", side_effect=lambda: fake_llm_client(slow)):
+            first = threading.Thread(target=async_to_sync(upstream.post_llm), args=({},))
+            first.start()
+            started.wait(5)
+            with self.assertRaises(upstream.UpstreamUnavailable):
+                async_to_sync(upstream.post_llm)({})
+            release.set()
+            first.join(5)
+            async_to_sync(upstream.post_llm)({})
+        self.assertEqual((backend.counts["rejected"], backend.counts["success"]), (1, 2))
+
+    async def test_waiting_call_gets_the_freed_slot(self):
+        backend = upstream.get_backend("llm")
+        backend.max_concurrency, backend.queue_timeout = 1, 1.0
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return httpx.Response(200, json={"choices": []})
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(slow)):
+            first = asyncio.create_task(upstream.post_llm({}))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(upstream.post_llm({}))
+            await asyncio.sleep(0.01)
+            release.set()
+            await asyncio.gather(first, second)
+        self.assertEqual((backend.counts["rejected"], backend._limiter.in_use), (0, 0))
+
+    async def test_stream_broken_midway_is_one_failure(self):
+        async def body():
+            yield b'data: {"choices": [{"delta": {"content": "Goa "}}]}\n\n'
+            raise httpx.ReadError("connection reset")
+
+        backend = upstream.get_backend("llm")
+        client = fake_llm_client(lambda request: httpx.Response(200, content=body()))
+        with mock.patch("chatbot.upstream.get_client", return_value=client):
+            with self.assertRaises(httpx.ReadError):
+                async with backend.stream("POST", "http://llm.test/") as response:
+                    async for _ in response.aiter_bytes():
+                        pass
+        self.assertEqual((backend.counts["success"], backend.counts["failure"]), (0, 1))
+
+    def test_without_a_loop_pool_each_call_closes_its_client(self):
+        # What mysite/wsgi.py sets: every request runs on its own short-lived loop.
+        clients = []
+
+        def new_client():
+            clients.append(fake_llm_client(lambda request: httpx.Response(200, json={"choices": []})))
+            return clients[-1]
+
+        with mock.patch.object(upstream, "POOL_PER_LOOP", False), \
+                mock.patch("chatbot.upstream._new_client", side_effect=new_client), \
+                mock.patch("chatbot.upstream.get_client", side_effect=AssertionError("pooled client used")):
+            for _ in range(2):
+                async_to_sync(upstream.post_llm)({})
+        self.assertEqual(len(clients), 2)
+        self.assertTrue(all(client.is_closed for client in clients))
+
+    @override_settings(UPSTREAM_POOL_SHARDS=4)
+    async def test_pooled_clients_are_sharded_and_all_closed(self):
+        clients = [upstream.get_client() for _ in range(8)]
+        self.assertEqual(len(set(clients)), 4)
+        self.assertEqual(clients[:4], clients[4:])
+        self.assertEqual(clients[0]._transport._pool._max_connections, 100 // 4)
+        await upstream.close_clients()
+        self.assertTrue(all(client.is_closed for client in clients))
+
+
+def rasa_turn(text, session_start=False):
+    """Serialized events of one Rasa turn, optionally opening a new session."""
+    now = time.time()
+    events = []
+    if session_start:
+        events += [{"event": "action", "name": "action_session_start", "timestamp": now},
+                   {"event": "session_started", "timestamp": now}]
+    return events + [
+        {"event": "action", "name": "action_listen", "timestamp": now},
+        {"event": "user", "text": text, "parse_data": {"intent": {"name": "greet"}}, "timestamp": now},
+        {"event": "bot", "text": f"reply to {text}", "timestamp": now},
+    ]
+
+
+class EventStoreTests(TestCase):
+    def test_save_appends_only_new_events(self):
+        store = EventStore()
+        events = rasa_turn("hi", session_start=True)
+        self.assertEqual(store.save("alice", events), 5)
+        events += rasa_turn("goa")
+        self.assertEqual(store.save("alice", events), 3)
+        self.assertEqual(store.save("alice", events), 0)
+        self.assertEqual(ConversationEvent.objects.filter(sender_id="alice").count(), 8)
+        # The session is loaded from session_started, without the action_session_start before it.
+        self.assertEqual(EventStore().load("alice"), events[1:])
+
+    def test_load_returns_events_since_last_session_start(self):
+        store = EventStore()
+        first = rasa_turn("hi", session_start=True)
+        store.save("alice", first)
+        store.save("alice", first + rasa_turn("later", session_start=True))
+
+        current = EventStore().load("alice")
+        self.assertEqual(current[0]["event"], "session_started")
+        self.assertEqual(len(current), 4)
+        self.assertEqual(store.load("alice"), current)
+        self.assertEqual(len(store.load("alice", all_sessions=True)), 10)
+        # A tracker loaded with only the current session appends after it.
+        self.assertEqual(store.save("alice", current + rasa_turn("more")), 3)
+        self.assertEqual(len(EventStore().load("alice")), 7)
+
+    def test_hot_conversation_is_served_from_cache(self):
+        store = EventStore(validate=False)
+        store.save("alice", rasa_turn("hi", session_start=True))
+        with self.assertNumQueries(0):
+            self.assertEqual(len(store.load("alice")), 4)
+
+    def test_validation_picks_up_events_from_other_instances(self):
+        ours, theirs = EventStore(), EventStore()
+        events = rasa_turn("hi", session_start=True)
+        ours.save("alice", events)
+        theirs.save("alice", events + rasa_turn("from elsewhere"))
+        with self.assertNumQueries(1):
+            self.assertEqual(ours.load("alice")[-1]["text"], "reply to from elsewhere")
+        self.assertEqual(ours.stats()["refreshed"], 1)
+
+    def test_cache_evicts_least_recently_used(self):
+        store = EventStore(cache_size=2)
+        for sender in ("a", "b", "c"):
+            store.save(sender, rasa_turn("hi"))
+        self.assertEqual(store.stats()["cached"], 2)
+        self.assertEqual(sorted(store.keys()), ["a", "b", "c"])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        TravelPackage.objects.create(
+            name="Goa Getaway", destination="Goa", description="Beaches", price="15000.00",
+            duration_days=4, category="beach",
+        )
+        Hotel.objects.create(name="Sea View", location="Goa", rating="4.5", price_per_night="5000.00", amenities="Pool")
+        Hotel.objects.create(name="Snow Peak", location="Manali", rating="4.1", price_per_night="3000.00", amenities="Heater")
+
+    def test_catalog_reads_hit_no_queries_once_warm(self):
+        self.client.get("/api/hotels/?location=goa")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/hotels/?location=goa")
+            self.client.get("/api/travel-packages/")
+        results = response.json()["results"]
+        self.assertEqual([hotel["name"] for hotel in results], ["Sea View"])
+        self.assertTrue(results[0]["image"].startswith("http://testserver/media/"))
+
+    def test_model_changes_invalidate_snapshot(self):
+        self.assertEqual(len(catalog.get_catalog().packages_by_category["beach"]), 1)
+        TravelPackage.objects.create(
+            name="Kerala Backwaters", destination="Alleppey", description="Houseboats", price="20000.00",
+            duration_days=5, category="beach",
+        )
+        self.assertEqual(len(catalog.get_catalog().packages_by_category["beach"]), 2)
+        Hotel.objects.filter(name="Snow Peak").delete()
+        self.assertEqual(catalog.get_catalog().hotels_in("manali"), [])
+
+    @override_settings(CATALOG_CACHE_CHECK_INTERVAL=0)
+    def test_version_bump_from_another_process_rebuilds_snapshot(self):
+        self.assertEqual(catalog.get_catalog().hotels_in("goa")[0]["rating"], "4.5")
+        # Another process (admin, action server, import command) edits and bumps the
+        # version through its own cache connection; no signal reaches this one.
+        Hotel.objects.filter(name="Sea View").update(rating="4.8")
+        other = caches.create_connection("default")
+        other.incr(catalog.VERSION_KEY)
+        self.assertEqual(catalog.get_catalog().hotels_in("goa")[0]["rating"], "4.8")
+
+    @override_settings(CATALOG_CACHE_CHECK_INTERVAL=0)
+    def test_version_never_moves_back_when_the_key_is_evicted(self):
+        for _ in range(3):
+            catalog.invalidate()
+        before = catalog.get_catalog().version
+        # Culled by the file cache (or the cache was cleared): the next reader re-seeds it.
+        cache.delete(catalog.VERSION_KEY)
+        Hotel.objects.filter(name="Sea View").update(rating="4.8")
+        snapshot = catalog.get_catalog()
+        self.assertGreater(snapshot.version, before)
+        self.assertEqual(snapshot.hotels_in("goa")[0]["rating"], "4.8")
+
+
+class CatalogImportTests(TestCase):
+    def feed(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        catalog.invalidate()
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_upserts_on_name_and_location(self):
+        Hotel.objects.create(name="Sea View", location="Goa", rating="4.0", price_per_night="5000.00", amenities="Pool")
+        self.assertEqual(catalog.get_catalog().hotels_in("goa")[0]["rating"], "4.0")
+        path = self.feed("hotels.csv", (
+            "name,location,rating,price_per_night,amenities,rooms\n"
+            "Sea View,Goa,4.6,5000,Pool,\n"
+            "Sea View,Manali,3.9,2500,Heater,5\n"
+            "Snow Peak,Manali,9.99,3000,Heater,4\n"
+        ))
+        out, err = self.run_import("hotels", path, "--chunk-size", "2")
+        self.assertIn("3 rows: 1 created, 1 updated, 0 unchanged, 0 deleted, 1 invalid", out)
+        self.assertIn("line 4", err)
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertEqual(Hotel.objects.get(location="Manali").rooms, 5)
+        # Bulk writes send no signals; the import invalidates the catalog itself.
+        self.assertEqual(catalog.get_catalog().hotels_in("goa")[0]["rating"], "4.6")
+
+        out, _ = self.run_import("hotels", path)
+        self.assertIn("0 created, 0 updated, 2 unchanged", out)
+
+    def test_import_invalidation_is_seen_by_other_processes(self):
+        # Another process reads the version through its own connection to the shared cache.
+        other = caches.create_connection("default")
+        before = other.get(catalog.VERSION_KEY)
+        path = self.feed("packages.jsonl", '{"name": "Goa Getaway", "destination": "Goa", "description": "Beaches", '
+                                           '"price": "15000", "duration_days": 4, "category": "beach"}\n')
+        self.run_import("packages", path)
+        self.assertGreater(caches.create_connection("default").get(catalog.VERSION_KEY), before)
+
+    def test_jsonl_delta_updates_deletes_and_requires_fields_for_new_rows(self):
+        departure = timezone.now() + timedelta(days=3)
+        for number in ("AI101", "AI102"):
+            Flight.objects.create(flight_number=number, origin="Delhi", destination="Goa",
+                                  departure_time=departure, price="4500.00", seats_available=10)
+        path = self.feed("flights.jsonl", "\n".join(json.dumps(row) for row in [
+            {"flight_number": "AI101", "price": "3999.00"},
+            {"flight_number": "AI101", "seats_available": 4},
+            {"flight_number": "AI102", "deleted": True},
+            {"flight_number": "AI103", "price": "5000"},
+            {"flight_number": "AI104", "origin": "Delhi", "destination": "Leh", "price": "7000",
+             "departure_time": "2030-01-05T06:30:00", "seats_available": 30},
+        ]))
+        out, err = self.run_import("flights", path)
+        self.assertIn("1 created, 1 updated, 0 unchanged, 1 deleted, 1 invalid", out)
+        self.assertIn("AI103", err)
+        flight = Flight.objects.get(flight_number="AI101")
+        self.assertEqual((str(flight.price), flight.seats_available, flight.destination), ("3999.00", 4, "Goa"))
+        self.assertFalse(Flight.objects.filter(flight_number="AI102").exists())
+        self.assertTrue(timezone.is_aware(Flight.objects.get(flight_number="AI104").departure_time))
+
+    def test_malformed_jsonl_lines_are_invalid_rows(self):
+        path = self.feed("packages.jsonl", "\n".join([
+            '{"name": "Goa Getaway", "destination": "Goa", "description": "-", "price": "1", '
+            '"duration_days": 2, "category": "beach"}',
+            '{"name": "Broken",',
+            '[1, 2]',
+            '{"name": "Kerala", "destination": "Alleppey", "description": "-", "price": "2", '
+            '"duration_days": 3, "category": "beach"}',
+        ]))
+        out, err = self.run_import("packages", path)
+        self.assertIn("4 rows: 2 created, 0 updated, 0 unchanged, 0 deleted, 2 invalid", out)
+        self.assertIn("Invalid line 2", err)
+        self.assertIn("Invalid line 3", err)
+
+    def test_export_round_trips_through_import(self):
+        TravelPackage.objects.create(name="Goa Getaway", destination="Goa", description="Beaches, sun",
+                                     price="15000.00", duration_days=4, category="beach")
+        path = os.path.join(self.tmp.name, "packages.csv")
+        call_command("export_catalog", "packages", path, stdout=StringIO())
+        TravelPackage.objects.update(price="1.00")
+        out, _ = self.run_import("packages", path)
+        self.assertIn("1 updated", out)
+        self.assertEqual(str(TravelPackage.objects.get().price), "15000.00")
+
+        bad = self.feed("packages.jsonl", json.dumps({"name": "Odd", "destination": "X", "description": "-",
+                                                      "price": "1", "duration_days": 2, "category": "desert"}))
+        out, err = self.run_import("packages", bad)
+        self.assertIn("1 invalid", out)
+        self.assertIn("category", err)
+
+
+class CatalogResponseTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        TravelPackage.objects.create(
+            name="Goa Getaway", destination="Goa", description="Beaches", price="15000.00",
+            duration_days=4, category="beach",
+        )
+
+    def test_responses_are_rendered_once_per_snapshot(self):
+        responses = rendering.get_responses()
+        with self.assertNumQueries(0):
+            self.assertIs(rendering.get_responses(), responses)
+        self.assertIn("- Goa Getaway in Goa for 4 days at ₹15000.00", responses.package_list)
+        detail = responses.package_detail(" goa getaway ")
+        self.assertIn("📍 Destination: Goa", detail["text"])
+        self.assertEqual(detail["slots"], {"location": "Goa", "package_name": "Goa Getaway"})
+        self.assertEqual(responses.destinations_for("Beach")["buttons"],
+                         [{"title": "Goa", "payload": '/package_detail{"package_name":"Goa Getaway"}'}])
+        self.assertIsNone(responses.destinations_for("city"))
+
+    def test_package_changes_re_render(self):
+        rendering.get_responses()
+        TravelPackage.objects.create(
+            name="Paris Lights", destination="Paris", description="Museums", price="90000.00",
+            duration_days=6, category="city",
+        )
+        responses = rendering.get_responses()
+        self.assertIn("Paris Lights", responses.package_list)
+        self.assertEqual(len(responses.destinations_for("city")["buttons"]), 1)
+        TravelPackage.objects.all().delete()
+        self.assertEqual(rendering.get_responses().package_list, rendering.NO_PACKAGES)
+
+
+@override_settings(MESSAGE_LOG={'MODE': 'sync', 'DEDUP_WINDOW': 0})
+class IntentRouterTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        TravelPackage.objects.create(
+            name="Goa Getaway", destination="Goa", description="Beaches", price="15000.00",
+            duration_days=4, category="beach",
+        )
+        self.user = User.objects.create_user(username="alice", password="secret")
+        self.async_client.force_login(self.user)
+        self.calls = []
+        self.active_loop = {}
+
+    def upstream(self, request):
+        if request.method == "GET":
+            self.calls.append((request.url.path, None))
+            return httpx.Response(200, json={"slots": {}, "active_loop": self.active_loop})
+        self.calls.append((request.url.path, json.loads(request.content)))
+        if request.url.path.endswith("/tracker/events"):
+            return httpx.Response(200, json={})
+        return httpx.Response(200, json=[{"text": "From Rasa"}])
+
+    async def chat(self, message):
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(self.upstream)):
+            return await self.async_client.post("/chat/", {"message": message}, content_type="application/json")
+
+    def test_parses_payloads_for_domain_intents_only(self):
+        router = IntentRouter({"intents": ["greet", {"package_detail": {"use_entities": True}}]})
+        self.assertEqual(router.parse('/package_detail{"package_name": "Goa Getaway"}'),
+                         ("package_detail", {"package_name": "Goa Getaway"}))
+        self.assertEqual(router.parse("greet"), ("greet", {}))
+        self.assertIsNone(router.parse("/book_flight"))
+        self.assertIsNone(router.parse('/package_detail{"package_name": '))
+        self.assertIsNone(router.parse("show me goa packages"))
+
+    async def test_button_payload_is_answered_without_rasa(self):
+        response = await self.chat('/package_detail{"package_name":"goa getaway"}')
+
+        self.assertEqual(response["X-Route"], "local")
+        reply = response.json()["reply"]
+        self.assertIn("📍 Destination: Goa", reply)
+        # The webhook is skipped; the turn is recorded in the tracker as if Rasa had answered it.
+        self.assertEqual([path for path, _ in self.calls],
+                         ["/conversations/alice/tracker", "/conversations/alice/tracker/events"])
+        events = self.calls[1][1]
+        self.assertEqual([e["event"] for e in events], ["user", "slot", "slot", "bot", "action"])
+        self.assertEqual(events[0]["parse_data"]["intent"], {"name": "package_detail", "confidence": 1.0})
+        self.assertEqual(events[0]["parse_data"]["entities"], [{"entity": "package_name", "value": "goa getaway"}])
+        self.assertEqual(events[1:3], [
+            {"event": "slot", "name": "package_name", "value": "Goa Getaway"},
+            {"event": "slot", "name": "location", "value": "Goa"},
+        ])
+        self.assertEqual(events[3]["text"], reply)
+        self.assertTrue(await UserMessage.objects.filter(user=self.user, response__contains="Goa").aexists())
+
+    async def test_domain_responses_skip_the_webhook(self):
+        response = await self.chat("/greet")
+        self.assertEqual(response["X-Route"], "local")
+        self.assertTrue(response.json()["reply"].startswith("Hi! I'm Qyra"))
+        self.assertNotIn("/webhooks/rest/webhook", [path for path, _ in self.calls])
+
+    async def test_payloads_during_a_form_go_to_rasa(self):
+        self.active_loop = {"name": "hotel_booking_form"}
+        response = await self.chat("/greet")
+        self.assertEqual(response["X-Route"], "rasa")
+        self.assertEqual([path for path, _ in self.calls], ["/conversations/alice/tracker", "/webhooks/rest/webhook"])
+
+    async def test_free_text_and_forms_go_to_rasa(self):
+        for message in ["I want to fly to Goa", "/book_flight", "/show_destinations"]:
+            response = await self.chat(message)
+            self.assertEqual(response["X-Route"], "rasa")
+            self.assertEqual(response.json()["reply"], "From Rasa")
+        self.assertEqual([path for path, _ in self.calls], ["/webhooks/rest/webhook"] * 3)
+
+
+class HotelSearchTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        for name, location, rating, price, amenities in [
+            ("Snow Peak", "Manali", "4.1", "3000.00", "Heater, Free Wi-Fi"),
+            ("Manali Grand", "Manali", "4.8", "9000.00", "Spa, Free Wi-Fi"),
+            ("River Camp", "Old Manali", "3.9", "1500.00", "Bonfire"),
+            ("Sea View", "Goa", "4.5", "5000.00", "Pool"),
+        ]:
+            Hotel.objects.create(name=name, location=location, rating=rating, price_per_night=price, amenities=amenities)
+
+    def search(self, **params):
+        return self.client.get("/api/hotels/", params).json()
+
+    def test_typos_match_and_results_are_ranked(self):
+        body = self.search(location="manalli")
+        self.assertEqual(body["count"], 3)
+        # The name match boosts "Manali Grand" above the others; then rating decides.
+        self.assertEqual([h["name"] for h in body["results"]], ["Manali Grand", "Snow Peak", "River Camp"])
+
+    def test_filters_combine(self):
+        body = self.search(location="manali", min_rating="4", max_price="5000", amenities="wifi")
+        self.assertEqual([h["name"] for h in body["results"]], ["Snow Peak"])
+
+    def test_pagination(self):
+        first = self.search(location="manali", page_size=2)
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(first["count"], 3)
+        self.assertEqual(len(first["results"]), 2)
+        self.assertEqual([h["name"] for h in second["results"]], ["River Camp"])
+        self.assertIsNone(second["next"])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get("/api/hotels/", {"min_rating": "high"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CATALOG_CACHE_CHECK_INTERVAL=0)
+    def test_default_service_is_ranked_and_sees_other_processes_edits(self):
+        # What the action server uses.
+        service = HotelSearchService()
+        total, rows = service.search("manalli")
+        self.assertEqual((total, rows[0]["name"]), (3, "Manali Grand"))
+        # An import in another process: bulk writes send no signals, it bumps the shared version.
+        Hotel.objects.bulk_create([Hotel(name="Manali Woods", location="Manali", rating="4.0",
+                                         price_per_night="2000.00", amenities="")])
+        caches.create_connection("default").incr(catalog.VERSION_KEY)
+        total, _ = service.search("manalli")
+        self.assertEqual(total, 4)
+
+    def test_backend_follows_setting(self):
+        with override_settings(HOTEL_SEARCH_BACKEND="orm"):
+            self.assertIsInstance(get_hotel_search().backend, OrmBackend)
+            # Substring match, no typo tolerance: the API really went through the ORM.
+            self.assertEqual(self.search(location="manalli")["count"], 0)
+        with override_settings(HOTEL_SEARCH_BACKEND="http"):
+            self.assertIsInstance(get_hotel_search().backend, HttpBackend)
+            # /api/hotels/ is what that backend calls, so it must not call itself.
+            self.assertEqual(self.search(location="manalli")["count"], 3)
+        self.assertIsInstance(get_hotel_search().backend, CacheBackend)
+
+
+class FlightSearchTests(TestCase):
+    def setUp(self):
+        start = timezone.make_aware(datetime(2025, 8, 10, 6, 0))
+        for i in range(5):
+            Flight.objects.create(
+                flight_number=f"AI{100 + i}", origin="Delhi", destination="Goa",
+                departure_time=start + timedelta(hours=6 * i), price=4000 + 500 * i, seats_available=i,
+            )
+        Flight.objects.create(
+            flight_number="6E200", origin="Mumbai", destination="Goa",
+            departure_time=start, price=3000, seats_available=50,
+        )
+
+    def test_filters_on_route_date_price_and_seats(self):
+        body = self.client.get("/api/flights/", {
+            "origin": "delhi", "destination": "GOA", "date": "2025-08-10", "max_price": "5500", "seats": 1,
+        }).json()
+        self.assertEqual([f["flight_number"] for f in body["results"]], ["AI101", "AI102"])
+
+    def test_cursor_pagination_walks_every_flight_once(self):
+        seen = []
+        url, params = "/api/flights/", {"destination": "goa", "page_size": 2}
+        while url:
+            body = self.client.get(url, params).json()
+            seen += [f["flight_number"] for f in body["results"]]
+            url, params = body["next"], None
+        self.assertEqual(seen, ["AI100", "6E200", "AI101", "AI102", "AI103", "AI104"])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/api/flights/", {"cursor": "nope"}).status_code, 400)
+
+    def test_impossible_dates_are_invalid_searches(self):
+        with self.assertRaises(InvalidSearch):
+            search_flights(date_from="2025-02-30")
+        response = self.client.get("/api/flights/", {"date_from": "2025-02-30"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expected YYYY-MM-DD", response.json()["error"])
+        # A bad travel_date slot falls back to an undated search instead of failing the turn.
+        self.assertTrue(flight_cards_for_slots(destination="goa", travel_date="2025-02-30"))
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bob", password="secret")
+        other = User.objects.create_user(username="eve", password="secret")
+        UserMessage.objects.bulk_create(
+            [UserMessage(user=self.user, message=f"q{i}", response=f"a{i}") for i in range(7)]
+            + [UserMessage(user=other, message="secret", response="secret")]
+        )
+        self.client.force_login(self.user)
+
+    def test_api_pages_only_the_requesters_messages(self):
+        seen, before = [], None
+        while True:
+            params = {"page_size": 3, **({"before": before} if before else {})}
+            with self.assertNumQueries(3):  # session, user, one page with user and profile joined
+                body = self.client.get("/api/messages/", params).json()
+            seen += [m["message"] for m in body["results"]]
+            before = body["next"]
+            if not before:
+                break
+        self.assertEqual(sorted(seen), [f"q{i}" for i in range(7)])
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_api_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/messages/").status_code, 403)
+
+    def test_chat_page_embeds_latest_page_oldest_first(self):
+        with self.settings(CHAT_HISTORY_PAGE_SIZE=5):
+            response = self.client.get("/")
+        history = response.context["chat_history"]
+        self.assertEqual(len(history), 5)
+        self.assertIsNotNone(response.context["history_cursor"])
+        self.assertContains(response, 'id="server-chat-history"')
+
+
+class MessageLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="carol", password="secret")
+        self.async_client.force_login(self.user)
+        cache.clear()
+        caches["message_log"].clear()
+
+    def test_turns_are_queued_and_written_in_one_batch(self):
+        log = MessageLog(BATCH_SIZE=50)
+        log.start = lambda: None  # flush by hand instead of from the writer thread
+        with self.assertNumQueries(0):
+            for i in range(5):
+                self.assertTrue(log.log(self.user.id, f"q{i}", f"a{i}"))
+        with self.assertNumQueries(1):
+            self.assertEqual(log.flush(), 5)
+        messages = list(UserMessage.objects.filter(user=self.user).order_by("timestamp", "id"))
+        self.assertEqual([m.message for m in messages], [f"q{i}" for i in range(5)])
+        self.assertEqual(len({m.timestamp for m in messages}), 5)
+
+    async def test_batched_alog_does_its_cache_io_off_the_event_loop(self):
+        log = MessageLog(BATCH_SIZE=50)
+        log.start = lambda: None
+        loop_thread, threads = threading.current_thread(), []
+        remember = conversation.remember
+
+        def recording_remember(*args):
+            threads.append(threading.current_thread())
+            remember(*args)
+
+        with mock.patch("chatbot.conversation.remember", side_effect=recording_remember):
+            self.assertTrue(await log.alog(self.user.id, "q", "a", "t1"))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], loop_thread)
+        self.assertEqual(log._queue.qsize(), 1)
+
+    def test_same_turn_from_view_and_action_is_written_once(self):
+        view_log, action_log = MessageLog(MODE='sync'), MessageLog(MODE='sync')
+        self.assertTrue(view_log.log(self.user.id, "Show me hotels in Goa", "Here are some hotels in Goa: ...", "t1"))
+        self.assertFalse(action_log.log(self.user.id, "Show me hotels in Goa", "Here are some hotels in Goa:", "t1"))
+        self.assertEqual(UserMessage.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(action_log.duplicates, 1)
+
+    def test_repeated_questions_are_separate_turns(self):
+        log = MessageLog(MODE='sync')
+        self.assertTrue(log.log(self.user.id, "hi", "Hello!", "t1"))
+        self.assertTrue(log.log(self.user.id, "hi", "Hello!", "t2"))
+        self.assertTrue(log.log(self.user.id, "hi", "Hello!"))
+        self.assertEqual(UserMessage.objects.filter(user=self.user).count(), 3)
+
+    @override_settings(MESSAGE_LOG={'MODE': 'sync'})
+    async def test_view_sends_its_turn_id_to_rasa_for_the_action_to_log_with(self):
+        sent = []
+
+        def webhook(request):
+            sent.append(json.loads(request.content)["metadata"]["turn_id"])
+            return httpx.Response(200, json=[{"text": "Here are some hotels in Goa:"}])
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(webhook)):
+            await self.async_client.post("/chat/", {"message": "hotels in goa"}, content_type="application/json")
+        # What action_save_message does in the action server for the same turn.
+        action_log = MessageLog(MODE='sync')
+        logged = await sync_to_async(action_log.log)(self.user.id, "hotels in goa", "Here are some hotels in Goa:", sent[0])
+        self.assertFalse(logged)
+        self.assertEqual(await UserMessage.objects.filter(user=self.user).acount(), 1)
+
+    def test_clearing_history_drops_turns_still_queued(self):
+        other = User.objects.create_user(username="dan", password="secret")
+        # The cache /clear_chat/ marks the history as cleared in (settings.MESSAGE_LOG).
+        log = MessageLog(BATCH_SIZE=50, CACHE_ALIAS="message_log")
+        log.start = lambda: None
+        log.log(self.user.id, "q1", "a1")
+        log.log(other.id, "q2", "a2")
+        self.client.force_login(self.user)
+        self.client.post("/clear_chat/")
+        log.log(self.user.id, "q3", "a3")
+        log.flush()
+        self.assertEqual(list(UserMessage.objects.filter(user=self.user).values_list("message", flat=True)), ["q3"])
+        self.assertTrue(UserMessage.objects.filter(user=other).exists())
+        self.assertEqual(log.purged, 1)
+
+    def test_stop_flushes_the_queue(self):
+        log = MessageLog(FLUSH_INTERVAL=60)
+        log._run = lambda: None
+        log.log(self.user.id, "hi", "hello")
+        log.stop()
+        self.assertTrue(UserMessage.objects.filter(user=self.user, message="hi").exists())
+
+
+@override_settings(PROFILING={'HEADERS': True})
+class AsyncMiddlewareTests(TestCase):
+    async def test_session_written_by_a_view_is_saved_under_asgi(self):
+        await sync_to_async(User.objects.create_user)(username="alice", password="secret")
+        response = await self.async_client.post("/login/", {"username": "alice", "password": "secret"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("sessionid", response.cookies)
+        self.assertEqual(response.headers["X-Frame-Options"], "DENY")
+
+        cookie = response.cookies["sessionid"].value
+        response = await self.async_client.get("/api/bookings/", headers={"cookie": f"sessionid={cookie}"})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="dave", password="secret")
+        UserMessage.objects.create(user=self.user, message="hi", response="hello")
+        self.client.force_login(self.user)
+        get_response_cache().clear()
+        metrics.reset()
+
+    def test_query_count_and_timings_are_reported_in_headers(self):
+        response = self.client.get("/api/messages/")
+        self.assertEqual(response["X-DB-Queries"], "3")
+        timings = dict(part.split(";dur=") for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timings), {"db", "upstream", "serialize", "total"})
+        self.assertGreater(float(timings["db"]), 0)
+
+    async def test_upstream_time_is_attributed_in_async_views(self):
+        async def slow(request):
+            await asyncio.sleep(0.02)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "Sunny."}}]})
+
+        with mock.patch("chatbot.upstream.get_client", return_value=fake_llm_client(slow)):
+            response = await self.async_client.post(
+                "/chat/ai/", {"message": "weather in leh"}, content_type="application/json"
+            )
+        timings = dict(part.split(";dur=") for part in response["Server-Timing"].split(", "))
+        self.assertGreaterEqual(float(timings["upstream"]), 20)
+
+    def test_metrics_aggregates_requests_per_view(self):
+        for _ in range(3):
+            self.client.get("/api/messages/")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('chatbot_db_queries_count{view="api-messages"} 3', body)
+        self.assertIn('chatbot_db_queries_bucket{view="api-messages",le="3"} 3', body)
+        self.assertIn('chatbot_request_duration_seconds_sum{view="api-messages"}', body)
+
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.9").status_code, 403)
+
+
+class FlightBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="frank", password="secret")
+        departure = timezone.make_aware(datetime(2025, 8, 10, 9, 30))
+        self.full = Flight.objects.create(flight_number="AI300", origin="Delhi", destination="Goa",
+                                          departure_time=departure, price=5000, seats_available=0)
+        self.flight = Flight.objects.create(flight_number="AI301", origin="Delhi", destination="Goa",
+                                            departure_time=departure + timedelta(hours=2), price=5200,
+                                            seats_available=2)
+
+    def test_booking_reserves_seats_and_links_both_rows(self):
+        flight_booking, created = book_flight(self.user, departure="delhi", destination="goa",
+                                              travel_date="2025-08-10", seats=2)
+        self.assertTrue(created)
+        self.assertEqual(flight_booking.flight, self.flight)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 0)
+        self.assertTrue(Booking.objects.filter(user=self.user, reference_id=f"Flight:{flight_booking.id}").exists())
+
+    def test_sold_out_flight_is_not_oversold(self):
+        book_flight(self.user, self.flight, seats=2)
+        with self.assertRaises(SoldOut):
+            book_flight(self.user, self.flight.pk)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 0)
+        self.assertEqual(FlightBooking.objects.count(), 1)
+
+    def test_retry_with_same_key_returns_original_booking(self):
+        first, created = book_flight(self.user, self.flight, idempotency_key="msg-1")
+        again, created_again = book_flight(self.user, self.flight, idempotency_key="msg-1")
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.pk, again.pk)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_available, 1)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+
+    def test_no_matching_flight(self):
+        with self.assertRaises(NoMatchingFlight):
+            book_flight(self.user, departure="Delhi", destination="Leh", travel_date="2025-08-10")
+
+
+class HotelAvailabilityTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        self.user = User.objects.create_user(username="grace", password="secret")
+        self.small = Hotel.objects.create(name="Tiny Inn", location="Goa", rating="4.9", price_per_night="2000.00",
+                                          amenities="Pool", rooms=2)
+        self.big = Hotel.objects.create(name="Beach Resort", location="Goa", rating="4.0", price_per_night="6000.00",
+                                        amenities="Pool", rooms=50)
+
+    def test_rooms_are_taken_on_every_night_of_the_stay(self):
+        book_hotel(self.user, self.small, "2025-12-30", 3, 4)  # 4 guests -> both rooms
+        self.assertFalse(is_available(self.small, "2025-12-31", 1, 1))
+        self.assertTrue(is_available(self.small, "2025-12-28", 2, 2))  # checks out the day the stay starts
+        self.assertTrue(is_available(self.small, "2026-01-02", 5, 2))
+        with self.assertRaises(HotelUnavailable):
+            book_hotel(self.user, "tiny inn", "2025-12-27", 7, 1)
+
+    def test_failed_booking_leaves_inventory_untouched(self):
+        book_hotel(self.user, self.small, "2025-12-31", 1, 2)
+        with self.assertRaises(HotelUnavailable):
+            book_hotel(self.user, self.small, "2025-12-30", 3, 4)
+        self.assertTrue(is_available(self.small, "2025-12-30", 1, 4))
+        self.assertTrue(is_available(self.small, "2026-01-01", 1, 4))
+
+    def test_which_hotels_are_free(self):
+        book_hotel(self.user, self.small, "2025-12-31", 1, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(unavailable_hotel_ids("2025-12-30", 2, 1), {self.small.id})
+        self.assertEqual(unavailable_hotel_ids("2026-01-01", 1, 6), {self.small.id})  # needs 3 rooms
+
+        body = self.client.get("/api/hotels/", {"location": "goa", "check_in": "2025-12-31"}).json()
+        self.assertEqual([h["name"] for h in body["results"]], ["Beach Resort"])
+        self.assertEqual(self.client.get("/api/hotels/", {"check_in": "31/12/2025"}).status_code, 400)
+
+    def test_impossible_dates_and_overlong_stays_are_invalid(self):
+        for check_in, nights in [("2025-02-30", 1), ("2025-12-31", 0), ("2025-12-31", 31), ("2025-12-31", "two")]:
+            with self.assertRaises(InvalidStay):
+                stay_nights(check_in, nights)
+        with self.assertRaises(InvalidBooking):
+            book_hotel(self.user, self.small, "2025-02-30", 1, 1)
+        response = self.client.get("/api/hotels/", {"check_in": "2025-12-31", "nights": "5000"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("between 1 and 30 nights", response.json()["error"])
+
+    def test_retry_does_not_take_more_rooms(self):
+        first, _ = book_hotel(self.user, self.small, "2025-12-31", 1, 2, idempotency_key="msg-9")
+        again, created = book_hotel(self.user, self.small, "2025-12-31", 1, 2, idempotency_key="msg-9")
+        self.assertFalse(created)
+        self.assertEqual(first.pk, again.pk)
+        self.assertTrue(is_available(self.small, "2025-12-31", 1, 2))
+
+
+class BookingListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="heidi", password="secret")
+        self.other = User.objects.create_user(username="ivan", password="secret")
+        self.hotel = Hotel.objects.create(name="Sea View", location="Goa", rating="4.5", price_per_night="5000.00",
+                                          amenities="Pool")
+        self.flight = Flight.objects.create(flight_number="AI500", origin="Delhi", destination="Goa",
+                                            departure_time=timezone.make_aware(datetime(2025, 8, 10, 9)),
+                                            price=5000, seats_available=100)
+        self.client.force_login(self.user)
+
+    def add_bookings(self, count, user=None):
+        user = user or self.user
+        for i in range(count):
+            if i % 2:
+                book_flight(user, self.flight)
+            else:
+                book_hotel(user, self.hotel, date(2025, 9, 1) + timedelta(days=i), 1, 2)
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        self.add_bookings(2)
+        with self.assertNumQueries(5):  # session, user, page (+user, profile), hotel bookings, flight bookings
+            small = self.client.get("/api/bookings/").json()
+        self.add_bookings(20)
+        with self.assertNumQueries(5):
+            large = self.client.get("/api/bookings/", {"page_size": 50}).json()
+        self.assertEqual(len(small["results"]), 2)
+        self.assertEqual(len(large["results"]), 22)
+
+    def test_rows_are_enriched_and_scoped_to_the_user(self):
+        self.add_bookings(2)
+        self.add_bookings(3, user=self.other)
+        results = self.client.get("/api/bookings/").json()["results"]
+        self.assertEqual(len(results), 2)
+        by_type = {r["booking_type"]: r["details"] for r in results}
+        self.assertEqual(by_type["flight"]["flight_number"], "AI500")
+        self.assertEqual(by_type["hotel"]["location"], "Goa")
+        self.assertEqual(by_type["hotel"]["rooms"], 1)
+        self.assertTrue(all(r["user"]["username"] == "heidi" for r in results))
+        self.assertTrue(all("idempotency_key" not in r for r in results))
+
+    def test_pages_with_cursor(self):
+        self.add_bookings(5)
+        seen, before = [], None
+        while True:
+            body = self.client.get("/api/bookings/", {"page_size": 2, **({"before": before} if before else {})}).json()
+            seen += [r["id"] for r in body["results"]]
+            before = body["next"]
+            if not before:
+                break
+        self.assertEqual(seen, sorted(Booking.objects.filter(user=self.user).values_list("id", flat=True), reverse=True))
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/bookings/").status_code, 403)
+
+
+def load_actions():
+    """The Rasa action server's ``actions.actions`` module (it lives next to mysite/)."""
+    root = str(settings.BASE_DIR.parent)
+    if root not in sys.path:
+        sys.path.append(root)
+    from actions import actions
+    return actions
+
+
+def fake_tracker(slots=None, sender_id="anonymous", **latest_message):
+    from rasa_sdk import Tracker
+    latest_message = {"text": "", "intent": {}, "entities": [], **latest_message}
+    return Tracker(sender_id, slots or {}, latest_message, [], False, None, {}, "")
+
+
+def run_orm_inline(fn, *args, **kwargs):
+    """Stand-in for ``actions.run_orm`` that stays on the test's database connection."""
+    return sync_to_async(fn)(*args, **kwargs)
+
+
+class HotelFormValidationTests(TestCase):
+    def setUp(self):
+        from rasa_sdk.executor import CollectingDispatcher
+        self.form = load_actions().ValidateHotelBookingForm()
+        self.dispatcher = CollectingDispatcher()
+
+    async def test_unparseable_guests_and_nights_are_asked_again(self):
+        tracker = fake_tracker()
+        self.assertEqual(await self.form.validate_guests("lots", self.dispatcher, tracker, {}), {"guests": None})
+        self.assertEqual(self.form.validate_nights("45", self.dispatcher, tracker, {}), {"nights": None})
+        self.assertEqual(self.form.validate_nights("3 nights", self.dispatcher, tracker, {}), {"nights": 3})
+
+    async def test_availability_errors_are_not_reported_as_invalid_guests(self):
+        broken = mock.AsyncMock(side_effect=RuntimeError("database is locked"))
+        with mock.patch.object(self.form, "_full_for_stay", broken):
+            with self.assertRaises(RuntimeError):
+                await self.form.validate_guests("2", self.dispatcher, fake_tracker(), {})
+        self.assertEqual(self.dispatcher.messages, [])
+
+
+class FlightBookingActionTests(TestCase):
+    def test_retry_after_the_flight_was_deleted_still_confirms(self):
+        from rasa_sdk.executor import CollectingDispatcher
+        actions = load_actions()
+        user = User.objects.create_user(username="judy", password="secret")
+        flight = Flight.objects.create(flight_number="AI310", origin="Delhi", destination="Goa",
+                                       departure_time=timezone.make_aware(datetime(2025, 8, 10, 9, 30)),
+                                       price=5000, seats_available=5)
+        book_flight(user, flight, idempotency_key="msg-1")
+        flight.delete()  # the booking's flight is set to NULL
+
+        dispatcher = CollectingDispatcher()
+        tracker = fake_tracker({"departure": "Delhi", "destination": "Goa", "travel_date": "2025-08-10"},
+                               sender_id="judy", message_id="msg-1")
+        with mock.patch.object(actions, "run_orm", run_orm_inline):
+            async_to_sync(actions.ActionSubmitFlightBooking().run)(dispatcher, tracker, {})
+        self.assertEqual(dispatcher.messages[0]["text"], "✅ Flight booked from *Delhi* to *Goa* on *2025-08-10*.")
+
+
+@override_settings(CATALOG_CACHE_CHECK_INTERVAL=60)
+class ActionServerConcurrencyTests(TestCase):
+    # Counting through a recursive CTE keeps SQLite busy for about a second, touching no tables.
+    SLOW_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < %s) SELECT count(*) FROM c"
+
+    def setUp(self):
+        catalog.invalidate()
+        TravelPackage.objects.create(name="Goa Getaway", destination="Goa", description="Beaches",
+                                     price="15000.00", duration_days=4, category="beach")
+        self.actions = load_actions()
+        rendering.get_responses()  # warm, so the turns below need no queries of their own
+
+    def slow_query(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute(self.SLOW_QUERY, [2000000])
+            return cursor.fetchone()[0]
+
+    async def test_slow_query_does_not_delay_other_turns(self):
+        from rasa_sdk.executor import CollectingDispatcher
+        actions = self.actions
+        finished = {}
+
+        async def slow():
+            await actions.run_orm(self.slow_query)
+            finished["slow"] = time.perf_counter()
+
+        async def turn(i):
+            action, slots = [
+                (actions.ActionShowDestinations(), {"category": "beach"}),
+                (actions.ActionPackageDetail(), {"package_name": "Goa Getaway"}),
+            ][i % 2]
+            dispatcher = CollectingDispatcher()
+            await action.run(dispatcher, fake_tracker(slots), {})
+            finished[i] = time.perf_counter()
+            return dispatcher.messages
+
+        started = time.perf_counter()
+        slow_call = asyncio.ensure_future(slow())
+        await asyncio.sleep(0.05)  # the query is running on one of the ORM pool's threads
+        replies = await asyncio.gather(*(turn(i) for i in range(10)))
+        await slow_call
+
+        # Destinations come back as buttons, package details as text.
+        self.assertTrue(all("Goa Getaway" in json.dumps(messages) for messages in replies))
+        last_turn = max(at for key, at in finished.items() if key != "slow")
+        self.assertLess(last_turn, finished["slow"])
+        self.assertLess(last_turn - started, (finished["slow"] - started) / 2)
@@ -0,0 +1,549 @@
+"""Calls from Django to Rasa and OpenRouter.
+
+Every call goes through a ``Backend`` (``rasa`` or ``llm``, configured by
+``settings.UPSTREAM_BACKENDS``) that protects the chat views when the backend
+degrades:
+
+* a circuit breaker opens after ``FAILURE_THRESHOLD`` consecutive failures
+  (transport errors, timeouts, 5xx, 429). While open, calls fail immediately
+  with ``UpstreamUnavailable``. After ``RESET_TIMEOUT`` seconds one probe is
+  let through and decides whether it closes again.
+* the timeout adapts to the backend: ``TIMEOUT_FACTOR`` x the observed p95,
+  clamped to ``[MIN_TIMEOUT, MAX_TIMEOUT]`` (``MAX_TIMEOUT`` until enough
+  samples are in).
+* failed calls are retried up to ``RETRIES`` times with full-jitter backoff.
+  Calls that are not idempotent, such as sending a message to Rasa, are
+  retried only when the request never reached the server.
+* at most ``MAX_CONCURRENCY`` calls are in flight per process, across event
+  loops (under WSGI each request has a loop of its own). Excess calls queue
+  for a slot for up to ``QUEUE_TIMEOUT`` seconds (by default ``MAX_TIMEOUT``,
+  as long as a call may take), then get ``UpstreamUnavailable``. A burst of
+  chats is therefore slowed down, not turned away.
+
+``UpstreamUnavailable`` is an ``httpx.HTTPError``, so the views' existing
+error handling turns it into their usual fallback replies without waiting
+for a timeout. Breaker state and latency stats are served at ``/metrics``.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+import httpx
+from decouple import config
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .profiling import add_time, metrics, timed
+
+logger = logging.getLogger(__name__)
+
+# Pooled clients per event loop. Under uvicorn/daphne there is a single loop
+# per process, so every in-flight chat shares the same keep-alive connections
+# to Rasa and OpenRouter instead of opening a new socket each time.
+#
+# The pool is split into UPSTREAM_POOL_SHARDS clients used in turn: httpcore
+# scans every connection in a pool each time a request is queued or finishes,
+# so one client with 100 connections spends more CPU on bookkeeping than on
+# the requests themselves once ~100 chats are in flight (3-4x fewer req/s in
+# benchmarks/bench_chat_async.py than ten clients with 10 connections each).
+_clients = weakref.WeakKeyDictionary()  # loop -> (clients, itertools.cycle over them)
+
+# Under WSGI (runserver, gunicorn) every async view runs on a new event loop
+# that is closed when the request ends, so a per-loop client would never be
+# closed and its sockets would leak. mysite/wsgi.py turns pooling off; each
+# call then opens a client of its own and closes it when done.
+POOL_PER_LOOP = True
+
+
+def _new_client(shards=1):
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max(1, settings.UPSTREAM_MAX_CONNECTIONS // shards),
+            max_keepalive_connections=max(1, settings.UPSTREAM_MAX_KEEPALIVE // shards),
+        ),
+        timeout=settings.UPSTREAM_TIMEOUT,
+    )
+
+
+def get_client():
+    """Return the next of the running event loop's shared async HTTP clients."""
+    loop = asyncio.get_running_loop()
+    pool = _clients.get(loop)
+    if pool is None or any(client.is_closed for client in pool[0]):
+        shards = max(1, settings.UPSTREAM_POOL_SHARDS)
+        clients = [_new_client(shards) for _ in range(shards)]
+        pool = _clients[loop] = (clients, itertools.cycle(clients))
+    return next(pool[1])
+
+
+@asynccontextmanager
+async def _client():
+    """One of the loop's pooled clients, or a client for this call only when pooling is off."""
+    if POOL_PER_LOOP:
+        yield get_client()
+    else:
+        async with _new_client() as client:
+            yield client
+
+
+async def close_clients():
+    """Close the pooled clients bound to the running event loop, if any."""
+    pool = _clients.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        for client in pool[0]:
+            await client.aclose()
+
+
+class UpstreamUnavailable(httpx.HTTPError):
+    """The backend was not called: its circuit is open or it is at its concurrency limit."""
+
+
+DEFAULTS = {
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30.0,
+    'MIN_TIMEOUT': 1.0,
+    'MAX_TIMEOUT': 10.0,
+    'TIMEOUT_FACTOR': 2.0,
+    'MIN_SAMPLES': 20,
+    'WINDOW': 200,
+    'RETRIES': 1,
+    'BACKOFF': 0.1,
+    'MAX_CONCURRENCY': 100,
+    'QUEUE_TIMEOUT': None,  # None: MAX_TIMEOUT
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go through now. In half-open state only one probe at a time is allowed."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def record_cancelled(self):
+        """The call was abandoned by its caller; it says nothing about the backend."""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyWindow:
+    """The most recent call durations, for percentiles."""
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+
+class SharedLimiter:
+    """A concurrency limit shared by every event loop (and thread) in the process.
+
+    A freed slot is handed straight to the oldest waiter, on that waiter's loop.
+    """
+
+    def __init__(self):
+        self.in_use = 0
+        self._waiters = deque()  # (loop, future)
+        self._lock = threading.Lock()
+
+    async def acquire(self, limit, timeout):
+        """Take a slot, waiting up to ``timeout`` seconds; False if none came free."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < limit and not self._waiters:
+                self.in_use += 1
+                return True
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            # asyncio.wait, unlike wait_for, neither cancels the waiter nor swallows our own cancellation.
+            await asyncio.wait([waiter], timeout=timeout)
+        except BaseException:
+            self._abandon(loop, waiter)
+            raise
+        if waiter.done():
+            return True
+        self._abandon(loop, waiter)
+        return False
+
+    def _abandon(self, loop, waiter):
+        with self._lock:
+            if (loop, waiter) in self._waiters:
+                self._waiters.remove((loop, waiter))
+                return
+        # The slot was already handed over: give it back, or cancel the pending
+        # hand-off so that _wake passes it on.
+        if waiter.done():
+            self.release()
+        else:
+            waiter.cancel()
+
+    def _wake(self, waiter):
+        if waiter.cancelled():
+            self.release()
+        else:
+            waiter.set_result(True)
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.in_use -= 1
+                return
+            loop, waiter = self._waiters.popleft()
+        try:
+            loop.call_soon_threadsafe(self._wake, waiter)
+        except RuntimeError:  # the waiter's loop has been closed
+            self.release()
+
+
+def _is_failure_status(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+class Backend:
+    def __init__(self, name, **options):
+        options = {**DEFAULTS, **options}
+        self.name = name
+        self.breaker = CircuitBreaker(options['FAILURE_THRESHOLD'], options['RESET_TIMEOUT'])
+        self.latency = LatencyWindow(options['WINDOW'])
+        self.min_timeout = options['MIN_TIMEOUT']
+        self.max_timeout = options['MAX_TIMEOUT']
+        self.timeout_factor = options['TIMEOUT_FACTOR']
+        self.min_samples = options['MIN_SAMPLES']
+        self.retries = options['RETRIES']
+        self.backoff = options['BACKOFF']
+        self.max_concurrency = options['MAX_CONCURRENCY']
+        self.queue_timeout = options['QUEUE_TIMEOUT'] or self.max_timeout
+        self._limiter = SharedLimiter()
+        self.in_flight = 0
+        self.counts = {"success": 0, "failure": 0, "retry": 0, "short_circuited": 0, "rejected": 0}
+
+    def timeout(self):
+        """Per-attempt timeout: a multiple of the observed p95, within the configured bounds."""
+        if self.breaker.state != CLOSED or len(self.latency) < self.min_samples:
+            return self.max_timeout
+        p95 = self.latency.percentile(95)
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_factor))
+
+    @asynccontextmanager
+    async def _slot(self):
+        if not await self._limiter.acquire(self.max_concurrency, self.queue_timeout):
+            self.counts["rejected"] += 1
+            raise UpstreamUnavailable(f"{self.name} is at its concurrency limit ({self.max_concurrency})")
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._limiter.release()
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self.counts["short_circuited"] += 1
+            raise UpstreamUnavailable(f"{self.name} circuit is open")
+
+    def _succeeded(self, seconds=None):
+        self.counts["success"] += 1
+        self.breaker.record_success()
+        if seconds is not None:
+            self.latency.add(seconds)
+
+    def _failed(self, seconds=None):
+        self.counts["failure"] += 1
+        self.breaker.record_failure()
+        if seconds is not None:
+            self.latency.add(seconds)
+
+    async def request(self, method, url, idempotent=True, **kwargs):
+        """Send one request through the breaker, limiter and retry policy; returns a successful response."""
+        attempts = 1 + self.retries
+        for attempt in range(attempts):
+            async with self._slot():
+                self._admit()
+                timeout = self.timeout()
+                started = time.perf_counter()
+                try:
+                    with timed("upstream"):
+                        async with _client() as client:
+                            response = await client.request(method, url, timeout=timeout, **kwargs)
+                except httpx.TimeoutException as e:
+                    # Timed-out calls count at the timeout, so the p95 (and the timeout) can grow.
+                    self._failed(timeout)
+                    error, sent = e, not isinstance(e, (httpx.ConnectTimeout, httpx.PoolTimeout))
+                except httpx.TransportError as e:
+                    self._failed()
+                    error, sent = e, not isinstance(e, httpx.ConnectError)
+                except BaseException:
+                    self.breaker.record_cancelled()
+                    raise
+                else:
+                    elapsed = time.perf_counter() - started
+                    if not _is_failure_status(response.status_code):
+                        self._succeeded(elapsed)
+                        response.raise_for_status()
+                        return response
+                    self._failed(elapsed)
+                    error, sent = httpx.HTTPStatusError(
+                        f"{self.name} returned {response.status_code}", request=response.request, response=response,
+                    ), True
+
+            if attempt == attempts - 1 or (sent and not idempotent):
+                raise error
+            self.counts["retry"] += 1
+            logger.warning(f"Retrying {self.name} after {error!r} (attempt {attempt + 1} of {attempts})")
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Stream a response through the breaker and limiter. Not retried, and not timed for the p95.
+
+        The outcome is recorded once the stream is over: a failure status or a
+        transport error at any point is a failure, a fully read body a success.
+        """
+        async with self._slot():
+            self._admit()
+            outcome = None
+            try:
+                async with _client() as client, \
+                        client.stream(method, url, timeout=self.max_timeout, **kwargs) as response:
+                    if _is_failure_status(response.status_code):
+                        outcome = "failure"
+                    yield response
+                outcome = outcome or "success"
+            except httpx.TransportError:
+                outcome = "failure"
+                raise
+            finally:
+                if outcome == "success":
+                    self._succeeded()
+                elif outcome == "failure":
+                    self._failed()
+                else:
+                    self.breaker.record_cancelled()
+
+    def stats(self):
+        p50, p95 = self.latency.percentile(50), self.latency.percentile(95)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "opened": self.breaker.opened,
+            "timeout": self.timeout(),
+            "p50": p50,
+            "p95": p95,
+            "samples": len(self.latency),
+            "in_flight": self.in_flight,
+            **self.counts,
+        }
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name):
+    """Return the process-wide ``Backend`` for ``name`` configured by ``settings.UPSTREAM_BACKENDS``."""
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                options = getattr(settings, 'UPSTREAM_BACKENDS', {}).get(name, {})
+                backend = _backends[name] = Backend(name, **options)
+    return backend
+
+
+@receiver(setting_changed)
+def reset_backends(setting, **kwargs):
+    if setting == 'UPSTREAM_BACKENDS':
+        _backends.clear()
+
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _metric_lines():
+    """Gauges and counters for every backend used so far, in Prometheus text format."""
+    gauges = [
+        ("chatbot_upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+         lambda s: STATE_VALUES[s["state"]]),
+        ("chatbot_upstream_timeout_seconds", "Current per-attempt timeout", lambda s: s["timeout"]),
+        ("chatbot_upstream_latency_p95_seconds", "p95 of recent call durations", lambda s: s["p95"]),
+        ("chatbot_upstream_in_flight", "Calls in flight", lambda s: s["in_flight"]),
+    ]
+    counters = ["success", "failure", "retry", "short_circuited", "rejected"]
+    stats = {name: backend.stats() for name, backend in sorted(_backends.items())}
+    lines = []
+    for metric, help_text, value in gauges:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{backend="{name}"}} {value(s) or 0}' for name, s in stats.items()]
+    lines += ["# HELP chatbot_upstream_calls_total Upstream call outcomes", "# TYPE chatbot_upstream_calls_total counter"]
+    for name, s in stats.items():
+        lines += [f'chatbot_upstream_calls_total{{backend="{name}",outcome="{c}"}} {s[c]}' for c in counters]
+    return lines
+
+
+metrics.add_collector(_metric_lines)
+
+
+def llm_headers():
+    return {
+        "Authorization": f"Bearer {config('DEEPSEEK_API_KEY')}",
+        "HTTP-Referer": "http://127.0.0.1:8000",  # Update with your site URL
+        "X-Title": "Qyra Chatbot",  # Update with your site name
+        "Content-Type": "application/json"
+    }
+
+
+async def post_rasa(sender_id, message, turn_id=None):
+    """Send a message to the Rasa REST webhook and return its list of replies.
+
+    ``turn_id`` travels in the message metadata so ``action_save_message``
+    can tell the message log it is the same turn the view logs.
+    """
+    body = {"sender": sender_id, "message": message}
+    if turn_id:
+        body["metadata"] = {"turn_id": turn_id}
+    response = await get_backend("rasa").request(
+        "POST",
+        settings.RASA_WEBHOOK_URL,
+        json=body,
+        idempotent=False,  # Rasa would process the message twice
+    )
+    return response.json()
+
+
+async def post_llm(payload):
+    """Send a chat completion request to OpenRouter and return the decoded body."""
+    response = await get_backend("llm").request(
+        "POST",
+        settings.OPENROUTER_URL,
+        headers=llm_headers(),
+        json=payload,
+    )
+    return response.json()
+
+
+async def stream_llm(payload):
+    """Stream a chat completion from OpenRouter, yielding content deltas as they arrive.
+
+    OpenRouter speaks the OpenAI SSE dialect: ``data: {json}`` lines, ``:``
+    keep-alive comments, and a final ``data: [DONE]``. Only the time spent
+    waiting on OpenRouter counts as upstream time, not the time the caller
+    spends handling each delta.
+    """
+    payload = dict(payload, stream=True)
+    started = time.perf_counter()
+    async with get_backend("llm").stream(
+        "POST",
+        settings.OPENROUTER_URL,
+        headers=llm_headers(),
+        json=payload,
+    ) as response:
+        add_time("upstream", time.perf_counter() - started)
+        response.raise_for_status()
+        lines = response.aiter_lines()
+        while True:
+            with timed("upstream"):
+                line = await anext(lines, None)
+            if line is None:
+                break
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+                continue
+            delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+async def get_rasa_tracker(sender_id):
+    """Fetch a conversation's tracker state (slots, active loop) without its events (needs ``--enable-api``)."""
+    response = await get_backend("rasa").request(
+        "GET",
+        settings.RASA_TRACKER_URL.format(sender_id=sender_id),
+        params={"include_events": "NONE"},
+    )
+    return response.json()
+
+
+async def get_rasa_slots(sender_id):
+    """Fetch the current slot values of a conversation from Rasa's HTTP API (needs ``--enable-api``)."""
+    return (await get_rasa_tracker(sender_id)).get("slots", {})
+
+
+async def append_rasa_events(sender_id, events):
+    """Append serialized events to a Rasa conversation through its HTTP API (needs ``--enable-api``)."""
+    await get_backend("rasa").request(
+        "POST",
+        settings.RASA_EVENTS_URL.format(sender_id=sender_id),
+        json=events,
+        idempotent=False,
+    )
+
+
+async def parse_rasa(message):
+    """Run Rasa NLU on ``message`` (``/model/parse``, needs ``--enable-api``) and return intent and entities."""
+    response = await get_backend("rasa").request("POST", settings.RASA_PARSE_URL, json={"text": message})
+    return response.json()
@@ -1,5 +1,6 @@
 from django.urls import path
 from django.contrib.auth.views import LogoutView
+from .profiling import metrics_view
 from .views import (
     chat_with_rasa,
     chatbot_page,
@@ -14,6 +15,7 @@ from .views import (
     UserProfileAPIView,
     test_api,
     chat_with_ai,
+    chat_auto,
 )
 
 urlpatterns = [
@@ -21,8 +23,10 @@ urlpatterns = [
     path('', chatbot_page, name='chatbot_page'),
     path('chat/', chat_with_rasa, name='chat_with_rasa'),
     path('chat/ai/', chat_with_ai, name='chat_with_ai'),
+    path('chat/auto/', chat_auto, name='chat_auto'),
     path('clear_chat/', clear_chat_history, name='clear_chat'),
     path('test-api/', test_api, name='test_api'),  # Add the test API endpoint
+    path('metrics', metrics_view, name='metrics'),
 
     # Authentication views
     path('login/', login_view, name='login'),
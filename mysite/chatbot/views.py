@@ -1,21 +1,37 @@
+import asyncio
 import boto3
 import json
-import requests
+import httpx
 import logging
-from django.http import JsonResponse
+import uuid
+from decimal import Decimal, InvalidOperation
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import AuthenticationForm
-from decouple import config  
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
 
 from rest_framework import generics
+from . import conversation, upstream
+from .availability import InvalidStay, stay_nights
+from .booking import attach_details
+from .catalog import get_catalog
+from .flight_search import InvalidSearch, flight_cards_for_slots, search_flights
 from .forms import SignupForm
-from .models import TravelPackage, Hotel, Flight, Booking, UserMessage
+from .message_log import get_message_log
+from .pagination import after_cursor, encode_cursor
+from .profiling import timed
+from .hotel_search import get_hotel_search
+from .response_cache import get_response_cache
+from .router import get_router, tracker_events
+from .models import TravelPackage, Hotel, Booking, UserMessage
 from .serializers import (
     TravelPackageSerializer, HotelSerializer,
     FlightSerializer, BookingSerializer,
@@ -25,6 +41,13 @@ from .serializers import (
 # Set up logging
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = (
+    "You are Qyra, a helpful travel assistant. Provide travel-related advice, flight/hotel information, "
+    "or travel tips based on the user's input. If the input is vague (e.g., 'hello'), suggest travel options "
+    "like 'book_flight' or 'how can i book hotel'.  Keep responses concise (max 30 words for simple replies, "
+    "longer for detailed options)."
+)
+
 # --- Normal Django Views ---
 
 @login_required
@@ -34,7 +57,9 @@ def clear_chat_history(request):
         logger.warning(f"Invalid method {request.method} for clear_chat_history by user {request.user.username}")
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
+    get_message_log().forget(request.user.id)
     UserMessage.objects.filter(user=request.user).delete()
+    conversation.forget(request.user.id)
     logger.info(f"Chat history cleared for user {request.user.username}")
     return JsonResponse({"status": "success", "message": "Chat history cleared."})
 
@@ -50,8 +75,14 @@ def signup_view(request):
         form = SignupForm()
     return render(request, 'signup.html', {'form': form})
 
-@csrf_exempt
-def chat_with_rasa(request):
+async def _get_user(request):
+    """Resolve the lazy session user off the event loop; None if anonymous."""
+    def resolve():
+        return request.user if request.user.is_authenticated else None
+    return await sync_to_async(resolve)()
+
+
+async def chat_with_rasa(request):
     """Handle chat requests using Rasa with direct flight booking logic."""
     if request.method != "POST":
         logger.warning(f"Invalid method {request.method} for chat_with_rasa")
@@ -66,64 +97,107 @@ def chat_with_rasa(request):
             logger.warning("Empty message received in chat_with_rasa")
             return JsonResponse({"reply": "Please enter a message."})
 
+        user = await _get_user(request)
+        sender_id = user.username if user else "anonymous"
+
         # Handle specific intents directly
         if user_message.lower() == "book_flight":
-            flights = Flight.objects.all()[:3]
-            serializer = FlightSerializer(flights, many=True)
-            cards = [
-                {
-                    "title": flight["flight_number"],
-                    "subtitle": f"{flight['origin']} to {flight['destination']}",
-                    "price": str(flight["price"]),
-                    "departure": flight["departure_time"],
-                    "seats": str(flight["seats_available"]),
-                    "buttons": [{"title": "Book Now", "payload": f'book_flight{{"flight_number": "{flight["flight_number"]}"}}'}]
-                } for flight in serializer.data
-            ]
+            try:
+                slots = await upstream.get_rasa_slots(sender_id)
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not load Rasa slots for {sender_id}: {str(e)}")
+                slots = {}
+            cards = await sync_to_async(flight_cards_for_slots)(
+                departure=slots.get("departure"),
+                destination=slots.get("destination"),
+                travel_date=slots.get("travel_date"),
+            )
             return JsonResponse({
                 "reply": f"Found {len(cards)} flights.",
                 "custom": {"type": "flight_cards", "cards": cards}
             })
 
-        sender_id = request.user.username if request.user.is_authenticated else "anonymous"
-
-        rasa_response = requests.post(
-            "http://localhost:5005/webhooks/rest/webhook",
-            json={"sender": sender_id, "message": user_message},
-            timeout=10
-        )
-        rasa_response.raise_for_status()
-        messages = rasa_response.json()
-
-        bot_reply = " ".join([msg.get("text", "") for msg in messages]).strip() or \
-                    "Sorry, I didn't understand that."
-        buttons = next((msg["buttons"] for msg in messages if "buttons" in msg), [])
-        custom_payload = next((msg["custom"] for msg in messages if "custom" in msg), None)
-
-        if request.user.is_authenticated:
-            UserMessage.objects.create(
-                user=request.user,
-                message=user_message,
-                response=bot_reply
-            )
-            logger.info(f"Message saved for user {request.user.username}: {user_message}")
+        # Button payloads for stateless intents are answered here without the Rasa webhook.
+        routed = await _route_locally(sender_id, user_message)
+        if routed is not None:
+            return await _local_reply(routed, user, sender_id, user_message)
 
-        return JsonResponse({
-            "reply": bot_reply,
-            "buttons": buttons,
-            "custom": custom_payload
-        })
+        turn_id = uuid.uuid4().hex
+        reply = _rasa_reply(await upstream.post_rasa(sender_id, user_message, turn_id))
+
+        if user:
+            if await get_message_log().alog(user.id, user_message, reply["reply"], turn_id):
+                logger.info(f"Message logged for user {user.username}: {user_message}")
 
-    except requests.exceptions.RequestException as e:
+        response = JsonResponse(reply)
+        response["X-Route"] = "rasa"
+        return response
+
+    except httpx.HTTPError as e:
         logger.error(f"Rasa server error: {str(e)}")
         return JsonResponse({"reply": "Error communicating with Rasa server."})
     except Exception as e:
         logger.error(f"Unexpected error in chat_with_rasa: {str(e)}")
         return JsonResponse({"reply": "Something went wrong."})
-    
 
-@csrf_exempt
-def chat_with_ai(request):
+
+def _rasa_reply(messages):
+    """Fold the Rasa webhook's list of messages into one chat reply."""
+    return {
+        "reply": " ".join([msg.get("text", "") for msg in messages]).strip() or "Sorry, I didn't understand that.",
+        "buttons": next((msg["buttons"] for msg in messages if "buttons" in msg), []),
+        "custom": next((msg["custom"] for msg in messages if "custom" in msg), None),
+    }
+
+
+async def _route_locally(sender_id, user_message):
+    """The local router's answer to a button payload, or None if the turn has to go to Rasa.
+
+    Payloads sent while Rasa has a form running (or when its tracker can't be
+    read) go to Rasa, since the form decides what they mean.
+    """
+    router = get_router()
+    if router is None or not router.parse(user_message):
+        return None
+    routed = await sync_to_async(router.route)(user_message)
+    if routed is None:
+        return None
+    try:
+        tracker = await upstream.get_rasa_tracker(sender_id)
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not load Rasa tracker for {sender_id}: {str(e)}")
+        return None
+    if (tracker.get("active_loop") or {}).get("name"):
+        return None
+    return routed
+
+
+async def _local_reply(routed, user, sender_id, user_message):
+    """Respond with a reply from the local router and record the turn in the Rasa tracker."""
+    try:
+        await upstream.append_rasa_events(sender_id, tracker_events(user_message, routed))
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not append the turn to the Rasa tracker for {sender_id}: {str(e)}")
+
+    if user:
+        if await get_message_log().alog(user.id, user_message, routed["reply"]):
+            logger.info(f"Message logged for user {user.username}: {user_message}")
+
+    response = JsonResponse({
+        "reply": routed["reply"],
+        "buttons": routed["buttons"],
+        "custom": routed["custom"]
+    })
+    response["X-Route"] = "local"
+    return response
+
+
+# Django 4.2's csrf_exempt decorator wraps views in a sync function, which
+# would hide the coroutine from the handler, so mark async views directly.
+chat_with_rasa.csrf_exempt = True
+
+
+async def chat_with_ai(request):
     if request.method != "POST":
         logger.warning(f"Invalid method {request.method} for chat_with_rasa")
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -138,54 +212,39 @@ def chat_with_ai(request):
             logger.warning("Empty message received in chat_with_rasa")
             return JsonResponse({"reply": "Please enter a message."})
 
-        # Prepare headers and payload for OpenRouter API
-        headers = {
-            "Authorization": f"Bearer {config('DEEPSEEK_API_KEY')}",
-            "HTTP-Referer": "http://127.0.0.1:8000",  # Update with your site URL
-            "X-Title": "Qyra Chatbot",  # Update with your site name
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": "deepseek/deepseek-r1-0528:free",
-            "messages": [
-                {"role": "system", "content": "You are Qyra, a helpful travel assistant. Provide travel-related advice, flight/hotel information, or travel tips based on the user's input. If the input is vague (e.g., 'hello'), suggest travel options like 'book_flight' or 'how can i book hotel'.  Keep responses concise (max 30 words for simple replies, longer for detailed options)."},
-                {"role": "user", "content": user_message}
-            ]
-        }
-        logger.info(f"Sending payload to OpenRouter: {json.dumps(payload)}")
-
-        # Call OpenRouter API
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
-        response.raise_for_status()
-        logger.info("OpenRouter response received")
-        bot_reply = response.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-        logger.info(f"OpenRouter response: {bot_reply}")
-
-        # Enhanced fallback based on user message (only if API fails)
-        if not bot_reply:
-            if user_message.lower() == "hello":
-                bot_reply = "Hi! I'm Qyra, your travel assistant. Try 'book _flight' or 'how can i book hotel'!"
-            elif user_message.lower() == "book_flight":
-                bot_reply = "Flights: 1) DEL to BOM - $200, 2) DEL to BLR -  $250. Please provide more details to proceed!"
-            elif user_message.lower() == "how can i book hotel":
-                bot_reply = "To book a hotel, visit a site like Expedia or contact a travel agent. Let me know your location for options!"
-            else:
-                bot_reply = f"Sorry, I couldn’t process '{user_message}' with the model. Try 'book_flight' or 'how can i book hotel'!"
+        user = await _get_user(request)
+
+        payload, response_cache, cached_reply = await _llm_prompt(user, user_message, "chat_with_ai")
+
+        # Stream tokens back as Server-Sent Events when the client asks for it
+        if data.get("stream") or "text/event-stream" in request.headers.get("Accept", ""):
+            response = StreamingHttpResponse(
+                _stream_ai_reply(payload, user, user_message, cached_reply, response_cache),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            response["X-Cache"] = "HIT" if cached_reply else "MISS"
+            return response
+
+        if cached_reply:
+            logger.info(f"LLM cache hit for: {user_message}")
+            bot_reply = cached_reply
+        else:
+            # Enhanced fallback based on user message (only if API fails)
+            bot_reply = await _llm_answer(payload, user_message, response_cache) or _ai_fallback_reply(user_message)
         logger.info(f"Final response: {bot_reply}")
 
         # Save message if authenticated
-        if request.user.is_authenticated:
-            UserMessage.objects.create(user=request.user, message=user_message, response=bot_reply)
-            logger.info(f"Message saved for user {request.user.username}: {user_message}")
+        if user:
+            if await get_message_log().alog(user.id, user_message, bot_reply):
+                logger.info(f"Message logged for user {user.username}: {user_message}")
 
-        return JsonResponse({"reply": bot_reply})
+        response = JsonResponse({"reply": bot_reply})
+        response["X-Cache"] = "HIT" if cached_reply else "MISS"
+        return response
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"OpenRouter API error: {str(e)}")
         return JsonResponse({"reply": "Error communicating with OpenRouter. Fallback: Hello from Qyra!"}, status=500)
     except Exception as e:
@@ -193,13 +252,240 @@ def chat_with_ai(request):
         return JsonResponse({"reply": "Something went wrong. Fallback: Hello from Qyra!"}, status=500)
 
 
+chat_with_ai.csrf_exempt = True
+
+
+async def _llm_prompt(user, user_message, view):
+    """OpenRouter payload with as much recent history as fits the token budget, plus any cached reply."""
+    context = await sync_to_async(conversation.build_context)(user.id if user else None, SYSTEM_PROMPT, user_message)
+    conversation.observe(context, view)
+    payload = {
+        "model": settings.OPENROUTER_MODEL,
+        "messages": context.messages
+    }
+    logger.info(f"Sending payload to OpenRouter ({context.tokens} tokens, {context.turns} earlier turns): "
+                f"{json.dumps(payload)}")
+
+    # A follow-up's answer depends on the history, so only context-free prompts use the reply cache.
+    response_cache = get_response_cache() if not context.turns else None
+    cached_reply = await response_cache.aget(user_message, payload["model"]) if response_cache else None
+    return payload, response_cache, cached_reply
+
+
+async def _llm_answer(payload, user_message, response_cache):
+    """Call OpenRouter and cache a non-empty reply; returns "" if the model said nothing."""
+    completion = await upstream.post_llm(payload)
+    logger.info("OpenRouter response received")
+    bot_reply = completion.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+    logger.info(f"OpenRouter response: {bot_reply}")
+    if bot_reply and response_cache:
+        await response_cache.aset(user_message, bot_reply, payload["model"])
+    return bot_reply
+
+
+# What a backend call in /chat/auto/ can fail with: transport/HTTP errors, its deadline, or a bad body.
+BACKEND_ERRORS = (httpx.HTTPError, asyncio.TimeoutError, ValueError)
+
+
+async def chat_auto(request):
+    """Answer with Rasa when it understands the message, otherwise with the LLM.
+
+    Rasa NLU and the LLM are asked at once, each under its own deadline, so
+    falling back to the LLM costs max(NLU, LLM) rather than their sum. The
+    Rasa webhook is only called for an answer that will be used, so a message
+    the LLM answers never touches the Rasa tracker.
+    """
+    if request.method != "POST":
+        logger.warning(f"Invalid method {request.method} for chat_auto")
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("message", "").strip()
+        logger.info(f"Received message: {user_message}")
+
+        if not user_message:
+            logger.warning("Empty message received in chat_auto")
+            return JsonResponse({"reply": "Please enter a message."})
+
+        user = await _get_user(request)
+        sender_id = user.username if user else "anonymous"
+
+        routed = await _route_locally(sender_id, user_message)
+        if routed is not None:
+            return await _local_reply(routed, user, sender_id, user_message)
+
+        turn_id = uuid.uuid4().hex
+        reply, route = await _fan_out(user, sender_id, user_message, turn_id)
+        logger.info(f"chat_auto answered from {route}: {reply['reply']}")
+
+        if user:
+            if await get_message_log().alog(user.id, user_message, reply["reply"], turn_id):
+                logger.info(f"Message logged for user {user.username}: {user_message}")
+
+        response = JsonResponse(reply)
+        response["X-Route"] = route
+        return response
+
+    except Exception as e:
+        logger.error(f"Unexpected error in chat_auto: {str(e)}")
+        return JsonResponse({"reply": "Something went wrong."})
+
+
+chat_auto.csrf_exempt = True
+
+
+async def _fan_out(user, sender_id, user_message, turn_id=None):
+    """Race Rasa NLU against the LLM for one message; returns ``(reply, route)``.
+
+    Only ``/model/parse`` runs alongside the LLM. The webhook advances the
+    tracker (forms, slots, ``action_save_message``), so it is called only
+    once NLU is confident, or as the last resort when the LLM has failed.
+    """
+    options = settings.CHAT_AUTO
+
+    async def rasa_turn():
+        return _rasa_reply(await asyncio.wait_for(upstream.post_rasa(sender_id, user_message, turn_id), options['RASA_DEADLINE']))
+
+    # Button payloads name their intent, so only free text needs NLU and an LLM fallback.
+    if user_message.startswith("/"):
+        try:
+            return await rasa_turn(), "rasa"
+        except BACKEND_ERRORS as e:
+            logger.warning(f"Rasa failed in chat_auto: {e!r}")
+            return {"reply": _ai_fallback_reply(user_message), "buttons": [], "custom": None}, "fallback"
+
+    nlu = asyncio.create_task(asyncio.wait_for(upstream.parse_rasa(user_message), options['RASA_DEADLINE']))
+    llm = asyncio.create_task(asyncio.wait_for(_llm_turn(user, user_message), options['LLM_DEADLINE']))
+    rasa_tried = False
+    try:
+        if await _rasa_understood(nlu, options['CONFIDENCE']):
+            llm.cancel()
+            rasa_tried = True
+            try:
+                return await rasa_turn(), "rasa"
+            except BACKEND_ERRORS as e:
+                logger.warning(f"Rasa failed in chat_auto: {e!r}")
+                # The LLM was dropped for Rasa; ask it again rather than answer with nothing.
+                llm = asyncio.create_task(asyncio.wait_for(_llm_turn(user, user_message), options['LLM_DEADLINE']))
+        try:
+            bot_reply = await llm
+            if bot_reply:
+                return {"reply": bot_reply, "buttons": [], "custom": None}, "llm"
+        except BACKEND_ERRORS as e:
+            logger.warning(f"LLM failed in chat_auto: {e!r}")
+        # Neither preferred answer came through; whatever Rasa says beats nothing.
+        if not rasa_tried:
+            try:
+                return await rasa_turn(), "rasa"
+            except BACKEND_ERRORS as e:
+                logger.warning(f"Rasa failed in chat_auto: {e!r}")
+        return {"reply": _ai_fallback_reply(user_message), "buttons": [], "custom": None}, "fallback"
+    finally:
+        for task in (nlu, llm):
+            task.cancel()
+        # Also collects failures of tasks nobody awaited, so they are not reported as never retrieved.
+        await asyncio.gather(nlu, llm, return_exceptions=True)
+
+
+async def _rasa_understood(nlu, threshold):
+    try:
+        parsed = await nlu
+    except BACKEND_ERRORS as e:
+        logger.warning(f"Rasa NLU failed in chat_auto: {e!r}")
+        return False
+    intent = parsed.get("intent") or {}
+    return intent.get("name") not in (None, "nlu_fallback") and (intent.get("confidence") or 0) >= threshold
+
+
+async def _llm_turn(user, user_message):
+    payload, response_cache, cached_reply = await _llm_prompt(user, user_message, "chat_auto")
+    return cached_reply or await _llm_answer(payload, user_message, response_cache)
+
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _stream_ai_reply(payload, user, user_message, cached_reply=None, response_cache=None):
+    """Relay OpenRouter tokens as SSE and store the full reply once the stream ends."""
+    if cached_reply:
+        tokens = [cached_reply]
+        yield _sse({"token": cached_reply})
+    else:
+        tokens = []
+        try:
+            async for token in upstream.stream_llm(payload):
+                tokens.append(token)
+                yield _sse({"token": token})
+        except httpx.HTTPError as e:
+            logger.error(f"OpenRouter streaming error: {str(e)}")
+            if not tokens:
+                yield _sse({"reply": "Error communicating with OpenRouter. Fallback: Hello from Qyra!"}, event="error")
+                return
+        else:
+            if response_cache and "".join(tokens).strip():
+                await response_cache.aset(user_message, "".join(tokens).strip(), payload["model"])
+
+    bot_reply = "".join(tokens).strip() or _ai_fallback_reply(user_message)
+    logger.info(f"Final streamed response: {bot_reply}")
+    if user:
+        if await get_message_log().alog(user.id, user_message, bot_reply):
+            logger.info(f"Message logged for user {user.username}: {user_message}")
+    yield _sse({"reply": bot_reply}, event="done")
+
+
+def _ai_fallback_reply(user_message):
+    if user_message.lower() == "hello":
+        return "Hi! I'm Qyra, your travel assistant. Try 'book _flight' or 'how can i book hotel'!"
+    elif user_message.lower() == "book_flight":
+        return "Flights: 1) DEL to BOM - $200, 2) DEL to BLR -  $250. Please provide more details to proceed!"
+    elif user_message.lower() == "how can i book hotel":
+        return "To book a hotel, visit a site like Expedia or contact a travel agent. Let me know your location for options!"
+    return f"Sorry, I couldn’t process '{user_message}' with the model. Try 'book_flight' or 'how can i book hotel'!"
+
+
+def message_page(user, before=None, limit=None):
+    """One page of ``user``'s messages, newest first, and the cursor for the next older page.
+
+    Served by the ``(user, -timestamp, -id)`` index, so the cost does not grow
+    with the length of the history.
+    """
+    limit = limit or settings.CHAT_HISTORY_PAGE_SIZE
+    queryset = UserMessage.objects.filter(user=user)
+    if before:
+        queryset = after_cursor(queryset, "timestamp", before, descending=True)
+    messages = list(queryset.select_related("user__userprofile").order_by("-timestamp", "-id")[:limit + 1])
+    next_cursor = None
+    if len(messages) > limit:
+        next_cursor = encode_cursor(messages[limit - 1].timestamp, messages[limit - 1].pk)
+    return messages[:limit], next_cursor
+
+
+def booking_page(user, before=None, limit=None):
+    """One page of ``user``'s bookings, newest first, and the cursor for the next older page."""
+    limit = limit or settings.BOOKINGS_PAGE_SIZE
+    queryset = Booking.objects.filter(user=user)
+    if before:
+        queryset = after_cursor(queryset, "booked_on", before, descending=True)
+    bookings = list(queryset.select_related("user__userprofile").order_by("-booked_on", "-id")[:limit + 1])
+    next_cursor = None
+    if len(bookings) > limit:
+        next_cursor = encode_cursor(bookings[limit - 1].booked_on, bookings[limit - 1].pk)
+    return bookings[:limit], next_cursor
+
 
-    
 @login_required
 def chatbot_page(request):
-    chat_history = UserMessage.objects.filter(user=request.user).order_by("timestamp")
+    messages, older_cursor = message_page(request.user)
+    chat_history = [
+        {"message": m.message, "response": m.response, "timestamp": m.timestamp.isoformat()}
+        for m in reversed(messages)
+    ]
     return render(request, "chat.html", {
         "chat_history": chat_history,
+        "history_cursor": older_cursor,
     })
 
 
@@ -280,13 +566,7 @@ def test_api(request):
         elif user_message.lower() == "test_rasa":
             # Test Rasa integration
             sender_id = request.user.username if request.user.is_authenticated else "anonymous"
-            rasa_response = requests.post(
-                "http://localhost:5005/webhooks/rest/webhook",
-                json={"sender": sender_id, "message": "hello"},
-                timeout=30
-            )
-            rasa_response.raise_for_status()
-            messages = rasa_response.json()
+            messages = async_to_sync(upstream.post_rasa)(sender_id, "hello")
             bot_reply = " ".join([msg.get("text", "") for msg in messages]).strip() or \
                         "Rasa responded, but no text was returned."
             response["reply"] = f"Rasa test response: {bot_reply}"
@@ -309,7 +589,7 @@ def test_api(request):
     except json.JSONDecodeError as e:
         logger.error(f"Invalid JSON in test_api request: {str(e)}")
         return JsonResponse({"reply": "Invalid JSON format."}, status=400)
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Rasa server error in test_api: {str(e)}")
         return JsonResponse({"reply": "Error communicating with Rasa server."}, status=500)
     except Exception as e:
@@ -321,55 +601,145 @@ class TravelPackageListAPIView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request):
-        packages = TravelPackage.objects.all()
-        serializer = TravelPackageSerializer(packages, many=True)
-        return Response(serializer.data)
+        return Response(get_catalog().packages)
 
 class HotelListAPIView(generics.ListAPIView):
     """API view for listing hotels, optionally filtered by location."""
     serializer_class = HotelSerializer
 
-    def get_queryset(self):
-        queryset = Hotel.objects.all()
-        location = self.request.query_params.get('location')
-        if location:
-            queryset = queryset.filter(location__icontains=location.strip())
-        return queryset
-
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['request'] = self.request
-        return context
+    def list(self, request, *args, **kwargs):
+        """Ranked, paginated search through ``settings.HOTEL_SEARCH_BACKEND``.
+
+        Query params: ``location`` (or ``q``) free text with typo tolerance,
+        ``min_rating``, ``min_price``, ``max_price``, ``amenities`` (comma
+        separated, all required), ``check_in`` with optional ``nights`` and
+        ``guests`` (only hotels free for that stay), ``page`` and ``page_size``.
+        """
+        params = request.query_params
+        text = params.get('location') or params.get('q') or ''
+        try:
+            filters = {
+                key: Decimal(params[key])
+                for key in ('min_rating', 'min_price', 'max_price') if params.get(key)
+            }
+            page = max(int(params.get('page', 1)), 1)
+            page_size = min(
+                max(int(params.get('page_size', settings.HOTEL_SEARCH_PAGE_SIZE)), 1),
+                settings.HOTEL_SEARCH_MAX_PAGE_SIZE,
+            )
+            if params.get('check_in'):
+                stay = (params['check_in'], int(params.get('nights', 1)), int(params.get('guests', 1)))
+                stay_nights(*stay[:2])
+                filters['stay'] = stay
+        except InvalidStay as e:
+            return Response({"error": str(e)}, status=400)
+        except (InvalidOperation, ValueError):
+            return Response({"error": "Invalid filter or pagination parameter."}, status=400)
+        if params.get('amenities'):
+            filters['amenities'] = [a for a in params['amenities'].split(',') if a.strip()]
+
+        total, hotels = get_hotel_search(serving_api=True).search(text, filters, page, page_size)
+        fields = HotelSerializer.Meta.fields
+        results = []
+        for hotel in hotels:
+            row = {field: hotel[field] for field in fields}
+            if row['image']:
+                row['image'] = request.build_absolute_uri(row['image'])
+            results.append(row)
+
+        url = request.build_absolute_uri()
+        return Response({
+            "count": total,
+            "next": replace_query_param(url, 'page', page + 1) if page * page_size < total else None,
+            "previous": replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            "results": results,
+        })
 
 class FlightListAPIView(APIView):
-    """API view for listing all flights."""
+    """API view for searching flights with cursor pagination.
+
+    Query params: ``origin``, ``destination``, ``date`` (single day) or
+    ``date_from``/``date_to``, ``min_price``, ``max_price``, ``seats``,
+    ``cursor`` and ``page_size``.
+    """
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request):
-        flights = Flight.objects.all()
-        serializer = FlightSerializer(flights, many=True)
-        return Response(serializer.data)
+        params = request.query_params
+        try:
+            page_size = min(
+                max(int(params.get('page_size', settings.FLIGHT_SEARCH_PAGE_SIZE)), 1),
+                settings.FLIGHT_SEARCH_MAX_PAGE_SIZE,
+            )
+            flights, next_cursor = search_flights(
+                origin=params.get('origin'),
+                destination=params.get('destination'),
+                date_from=params.get('date_from') or params.get('date'),
+                date_to=params.get('date_to') or params.get('date'),
+                min_price=Decimal(params['min_price']) if params.get('min_price') else None,
+                max_price=Decimal(params['max_price']) if params.get('max_price') else None,
+                seats=int(params['seats']) if params.get('seats') else None,
+                cursor=params.get('cursor'),
+                limit=page_size,
+            )
+        except (InvalidSearch, InvalidOperation, ValueError) as e:
+            return Response({"error": str(e) or "Invalid search parameter."}, status=400)
+
+        url = request.build_absolute_uri()
+        with timed("serialize"):
+            results = FlightSerializer(flights, many=True).data
+        return Response({
+            "next": replace_query_param(url, 'cursor', next_cursor) if next_cursor else None,
+            "results": results,
+        })
 
 class BookingListAPIView(APIView):
-    """API view for listing all bookings."""
-    permission_classes = [IsAuthenticatedOrReadOnly]
+    """API view for paging through the requesting user's bookings, newest first, with their details.
+
+    Pass the ``next`` cursor back as ``before`` to fetch the next older page.
+    """
+    permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        bookings = Booking.objects.all()
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        try:
+            page_size = min(
+                max(int(request.query_params.get('page_size', settings.BOOKINGS_PAGE_SIZE)), 1),
+                settings.BOOKINGS_MAX_PAGE_SIZE,
+            )
+            bookings, older_cursor = booking_page(request.user, request.query_params.get('before'), page_size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        serializer = BookingSerializer(attach_details(bookings), many=True, context={'request': request})
+        with timed("serialize"):
+            results = serializer.data
+        return Response({
+            "next": older_cursor,
+            "results": results,
+        })
 
 class UserMessageListAPIView(APIView):
-    """API view for listing all user messages."""
-    permission_classes = [IsAuthenticatedOrReadOnly]
+    """API view for paging through the requesting user's messages, newest first.
 
-    def get(self, request):
-        messages = UserMessage.objects.all()
-        serializer = UserMessageSerializer(messages, many=True)
-        return Response(serializer.data)
+    Pass the ``next`` cursor back as ``before`` to fetch the next older page.
+    """
+    permission_classes = [IsAuthenticated]
 
-from .serializers import CombinedUserSerializer
-from rest_framework.permissions import IsAuthenticated
+    def get(self, request):
+        try:
+            page_size = min(
+                max(int(request.query_params.get('page_size', settings.CHAT_HISTORY_PAGE_SIZE)), 1),
+                settings.CHAT_HISTORY_MAX_PAGE_SIZE,
+            )
+            messages, older_cursor = message_page(request.user, request.query_params.get('before'), page_size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        serializer = UserMessageSerializer(messages, many=True, context={'request': request})
+        with timed("serialize"):
+            results = serializer.data
+        return Response({
+            "next": older_cursor,
+            "results": results,
+        })
 
 class UserProfileAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -377,4 +747,6 @@ class UserProfileAPIView(APIView):
     def get(self, request):
         user = request.user
         serializer = CombinedUserSerializer(user, context={'request': request})
-        return Response(serializer.data)
\ No newline at end of file
+        with timed("serialize"):
+            data = serializer.data
+        return Response(data)
\ No newline at end of file
@@ -42,13 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chatbot.profiling.ProfilingMiddleware',
+    # Django's stock middleware, with hooks that run on the event loop under ASGI.
+    'chatbot.middleware.SecurityMiddleware',
+    'chatbot.middleware.SessionMiddleware',
+    'chatbot.middleware.CommonMiddleware',
+    'chatbot.middleware.CsrfViewMiddleware',
+    'chatbot.middleware.AuthenticationMiddleware',
+    'chatbot.middleware.MessageMiddleware',
+    'chatbot.middleware.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -167,4 +169,145 @@ from decouple import config
 
 AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY')
-AWS_REGION = config('AWS_REGION', default='us-east-1')
\ No newline at end of file
+AWS_REGION = config('AWS_REGION', default='us-east-1')
+
+# Upstream chat backends (Rasa REST webhook and the OpenRouter LLM API)
+RASA_WEBHOOK_URL = config('RASA_WEBHOOK_URL', default='http://localhost:5005/webhooks/rest/webhook')
+RASA_TRACKER_URL = config('RASA_TRACKER_URL', default='http://localhost:5005/conversations/{sender_id}/tracker')
+RASA_PARSE_URL = config('RASA_PARSE_URL', default='http://localhost:5005/model/parse')
+RASA_EVENTS_URL = config('RASA_EVENTS_URL', default='http://localhost:5005/conversations/{sender_id}/tracker/events')
+OPENROUTER_URL = config('OPENROUTER_URL', default='https://openrouter.ai/api/v1/chat/completions')
+OPENROUTER_MODEL = config('OPENROUTER_MODEL', default='deepseek/deepseek-r1-0528:free')
+
+# Shared async connection pool used by the chat views (see chatbot/upstream.py)
+UPSTREAM_MAX_CONNECTIONS = config('UPSTREAM_MAX_CONNECTIONS', default=100, cast=int)
+UPSTREAM_MAX_KEEPALIVE = config('UPSTREAM_MAX_KEEPALIVE', default=20, cast=int)
+# The limits above are split evenly across this many clients (see _clients in upstream.py)
+UPSTREAM_POOL_SHARDS = config('UPSTREAM_POOL_SHARDS', default=10, cast=int)
+UPSTREAM_TIMEOUT = config('UPSTREAM_TIMEOUT', default=10.0, cast=float)
+
+# Circuit breaker, adaptive timeout, retry and concurrency limits per upstream
+# backend (see chatbot/upstream.py for what each option does). MAX_CONCURRENCY
+# is per process; calls beyond it queue for up to MAX_TIMEOUT rather than fail,
+# so a few hundred concurrent chats wait their turn instead of getting errors.
+UPSTREAM_BACKENDS = {
+    'rasa': {
+        'FAILURE_THRESHOLD': config('RASA_FAILURE_THRESHOLD', default=5, cast=int),
+        'RESET_TIMEOUT': config('RASA_RESET_TIMEOUT', default=30.0, cast=float),
+        'MIN_TIMEOUT': 1.0,
+        'MAX_TIMEOUT': UPSTREAM_TIMEOUT,
+        'RETRIES': 1,
+        'MAX_CONCURRENCY': config('RASA_MAX_CONCURRENCY', default=UPSTREAM_MAX_CONNECTIONS, cast=int),
+    },
+    'llm': {
+        'FAILURE_THRESHOLD': config('LLM_FAILURE_THRESHOLD', default=5, cast=int),
+        'RESET_TIMEOUT': config('LLM_RESET_TIMEOUT', default=60.0, cast=float),
+        'MIN_TIMEOUT': 3.0,
+        'MAX_TIMEOUT': UPSTREAM_TIMEOUT,
+        'RETRIES': 1,
+        'MAX_CONCURRENCY': config('LLM_MAX_CONCURRENCY', default=20, cast=int),
+    },
+}
+
+# Shared by Django and the Rasa action server (both load this settings module
+# on the same host, like the SQLite database), so catalog versions, message-log
+# dedup marks and conversation summaries are seen by every process. Point
+# CACHE_BACKEND and the locations at Redis or Memcached when the processes
+# run on different hosts.
+#
+# The file cache culls a random third of its entries once it holds
+# MAX_ENTRIES. Message-log marks (one per chat turn) have a cache of their own
+# so they cannot push the catalog version and cached replies out of 'default'.
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache')
+CACHE_MAX_ENTRIES = config('CACHE_MAX_ENTRIES', default=100000, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'message_log': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('MESSAGE_LOG_CACHE_LOCATION', default=str(BASE_DIR / '.cache' / 'message_log')),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+}
+
+# Cache for LLM replies in chat_with_ai (see chatbot/response_cache.py).
+# Use BACKEND 'django' to share entries across workers through CACHES.
+LLM_RESPONSE_CACHE = {
+    'BACKEND': config('LLM_CACHE_BACKEND', default='local'),
+    'CACHE_ALIAS': 'default',
+    'TTL': config('LLM_CACHE_TTL', default=3600, cast=int),
+    'MAX_ENTRIES': config('LLM_CACHE_MAX_ENTRIES', default=1000, cast=int),
+    # Rewordings and reorderings ('goa hotels' / 'hotels in goa') share a key already. Near-duplicate
+    # matching is opt-in (e.g. 0.8): it can still pair questions that differ in one detail.
+    'SIMILARITY_THRESHOLD': config('LLM_CACHE_SIMILARITY', default=0.0, cast=float) or None,
+}
+
+# Recent turns sent to the LLM with each chat_with_ai prompt (see chatbot/conversation.py).
+# TOKEN_BUDGET caps the estimated history tokens; SUMMARIZE condenses turns that do not fit.
+LLM_CONTEXT = {
+    'MAX_TURNS': config('LLM_CONTEXT_MAX_TURNS', default=20, cast=int),
+    # Only turns from the last WINDOW seconds (the current session) are context.
+    'WINDOW': config('LLM_CONTEXT_WINDOW', default=30 * 60, cast=int) or None,
+    'TOKEN_BUDGET': config('LLM_CONTEXT_TOKEN_BUDGET', default=1500, cast=int),
+    'SUMMARIZE': config('LLM_CONTEXT_SUMMARIZE', default=False, cast=bool),
+    'SUMMARY_TOKENS': config('LLM_CONTEXT_SUMMARY_TOKENS', default=150, cast=int),
+    'CACHE_TTL': 60 * 60 * 24,
+}
+
+# Public base URL of this Django site, used to build absolute media links in
+# chat payloads produced outside a request (e.g. by the Rasa action server).
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
+
+# Where the hotel search service reads hotels from: 'cache' (ranked, typo-tolerant
+# search over the catalog snapshot; edits reach every process through the shared
+# CACHES above within CATALOG_CACHE_CHECK_INTERVAL), 'orm' (live substring queries) or 'http'
+# (calls /api/hotels/; that view itself then uses 'cache'). Used by both the
+# action server and /api/hotels/.
+HOTEL_SEARCH_BACKEND = config('HOTEL_SEARCH_BACKEND', default='cache')
+HOTEL_SEARCH_PAGE_SIZE = 20
+HOTEL_SEARCH_MAX_PAGE_SIZE = 100
+HOTEL_CARDS_LIMIT = 10
+FLIGHT_SEARCH_PAGE_SIZE = 20
+FLIGHT_SEARCH_MAX_PAGE_SIZE = 100
+
+CHAT_HISTORY_PAGE_SIZE = 30
+CHAT_HISTORY_MAX_PAGE_SIZE = 100
+BOOKINGS_PAGE_SIZE = 20
+BOOKINGS_MAX_PAGE_SIZE = 100
+
+# Button payloads for stateless intents are answered in Django without calling
+# Rasa (see chatbot/router.py). DOMAIN is the Rasa domain.yml the intents come from.
+CHAT_ROUTER = {
+    'ENABLED': config('CHAT_ROUTER_ENABLED', default=True, cast=bool),
+    'DOMAIN': config('RASA_DOMAIN_PATH', default=str(BASE_DIR.parent / 'domain.yml')),
+}
+
+# /chat/auto/ asks Rasa and the LLM at once and keeps Rasa's answer when its NLU
+# confidence reaches CONFIDENCE; each backend is abandoned after its deadline (seconds).
+CHAT_AUTO = {
+    'CONFIDENCE': config('CHAT_AUTO_CONFIDENCE', default=0.7, cast=float),
+    'RASA_DEADLINE': config('CHAT_AUTO_RASA_DEADLINE', default=3.0, cast=float),
+    'LLM_DEADLINE': config('CHAT_AUTO_LLM_DEADLINE', default=15.0, cast=float),
+}
+
+# Chat turns are written behind the request in batches (see chatbot/message_log.py).
+MESSAGE_LOG = {
+    'MODE': config('MESSAGE_LOG_MODE', default='batched'),
+    'BATCH_SIZE': config('MESSAGE_LOG_BATCH_SIZE', default=100, cast=int),
+    'FLUSH_INTERVAL': config('MESSAGE_LOG_FLUSH_INTERVAL', default=1.0, cast=float),
+    'MAX_QUEUE': config('MESSAGE_LOG_MAX_QUEUE', default=10000, cast=int),
+    'DEDUP_WINDOW': config('MESSAGE_LOG_DEDUP_WINDOW', default=30, cast=int),
+    'CACHE_ALIAS': 'message_log',
+}
+
+# Per-request query/latency profiling (see chatbot/profiling.py). Histograms are
+# always collected at /metrics; HEADERS adds X-DB-Queries and Server-Timing.
+PROFILING = {
+    'HEADERS': config('PROFILING_HEADERS', default=DEBUG, cast=bool),
+}
+
+# Hotel stays need ceil(guests / HOTEL_GUESTS_PER_ROOM) rooms per night.
+HOTEL_GUESTS_PER_ROOM = config('HOTEL_GUESTS_PER_ROOM', default=2, cast=int)
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_wsgi_application()
+
+# Each request's async views get a fresh event loop here, so chatbot.upstream
+# must not keep a pooled client per loop (see POOL_PER_LOOP there).
+from chatbot import upstream  # noqa: E402
+
+upstream.POOL_PER_LOOP = False
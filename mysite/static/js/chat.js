@@ -8,6 +8,14 @@ let voiceEnabled = true;
 
 function appendMessage(sender, text, buttons = []) {
     const chatBox = document.getElementById("chatBox");
+    chatBox.appendChild(buildMessage(sender, text, buttons));
+    chatBox.scrollTop = chatBox.scrollHeight;
+    const chatHistory = JSON.parse(localStorage.getItem("chatHistory") || "[]");
+    chatHistory.push({ sender, text, buttons });
+    localStorage.setItem("chatHistory", JSON.stringify(chatHistory));
+}
+
+function buildMessage(sender, text, buttons = []) {
     const msgDiv = document.createElement("div");
     msgDiv.classList.add("message", sender);
 
@@ -57,13 +65,58 @@ function appendMessage(sender, text, buttons = []) {
         msgDiv.appendChild(buttonContainer);
     }
 
-    chatBox.appendChild(msgDiv);
-    chatBox.scrollTop = chatBox.scrollHeight;
-    const chatHistory = JSON.parse(localStorage.getItem("chatHistory") || "[]");
-    chatHistory.push({ sender, text, buttons });
-    localStorage.setItem("chatHistory", JSON.stringify(chatHistory));
+    return msgDiv;
+}
+
+// Saved conversation turns (oldest first) are inserted above what is on screen,
+// keeping the visible messages where they are.
+function prependHistory(turns) {
+    const chatBox = document.getElementById("chatBox");
+    const fragment = document.createDocumentFragment();
+    turns.forEach((turn) => {
+        fragment.appendChild(buildMessage("user", turn.message));
+        fragment.appendChild(buildMessage("bot", turn.response));
+    });
+    const previousHeight = chatBox.scrollHeight;
+    chatBox.insertBefore(fragment, chatBox.firstChild);
+    chatBox.scrollTop += chatBox.scrollHeight - previousHeight;
+}
+
+let loadingOlderMessages = false;
+
+// historyCursor value meaning "nothing from the server is on screen yet": the
+// next load starts at the newest saved turn instead of below the first page.
+const LATEST_HISTORY = "latest";
+
+function resetHistoryCursor() {
+    historyCursor = serverChatHistory.length ? LATEST_HISTORY : null;
+}
+
+async function loadOlderMessages() {
+    if (!historyCursor || loadingOlderMessages) return;
+    loadingOlderMessages = true;
+    try {
+        const query = historyCursor === LATEST_HISTORY ? "" : `?before=${encodeURIComponent(historyCursor)}`;
+        const response = await fetch(`/api/messages/${query}`, {
+            credentials: "include",
+        });
+        const data = await response.json();
+        historyCursor = data.next;
+        prependHistory((data.results || []).reverse());
+    } catch (error) {
+        console.error("Load history error:", error);
+    } finally {
+        loadingOlderMessages = false;
+    }
 }
 
+document.addEventListener("DOMContentLoaded", () => {
+    const chatBox = document.getElementById("chatBox");
+    chatBox.addEventListener("scroll", () => {
+        if (chatBox.scrollTop < 40) loadOlderMessages();
+    });
+});
+
 function showLoader() {
     const chatBox = document.getElementById("chatBox");
     const loader = document.createElement("div");
@@ -344,6 +397,48 @@ async function sendMessage() {
     document.getElementById("userInput").value = "";
 }
 
+function createStreamingMessage() {
+    const chatBox = document.getElementById("chatBox");
+    const msgDiv = document.createElement("div");
+    msgDiv.classList.add("message", "bot");
+
+    const avatar = document.createElement("img");
+    avatar.classList.add("avatar");
+    avatar.src = botAvatarUrl;
+
+    const textDiv = document.createElement("div");
+    textDiv.classList.add("message-text");
+
+    msgDiv.appendChild(avatar);
+    msgDiv.appendChild(textDiv);
+    chatBox.appendChild(msgDiv);
+    return { msgDiv, textDiv };
+}
+
+async function readEventStream(response, onEvent) {
+    // Minimal SSE parser for fetch() bodies: events are separated by a blank line.
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = "message";
+            let data = "";
+            rawEvent.split("\n").forEach((line) => {
+                if (line.startsWith("event:")) event = line.slice(6).trim();
+                else if (line.startsWith("data:")) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 async function sendAiMessage() {
     const userInput = document.getElementById("userInput").value.trim();
     if (!userInput) {
@@ -365,19 +460,45 @@ async function sendAiMessage() {
 
         const response = await fetch("/chat/ai/", {
             method: "POST",
-            headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken },
-            body: JSON.stringify({ message: userInput }),
+            headers: {
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+                "X-CSRFToken": csrfToken
+            },
+            body: JSON.stringify({ message: userInput, stream: true }),
             credentials: "include",
         });
         console.log("Status:", response.status);
-        console.log("Headers:", Object.fromEntries(response.headers.entries()));
-        const data = await response.json();
-        console.log("Data:", data);
-        removeTypingIndicator();
 
-        if (data.reply) appendMessage("bot", data.reply);
-        else if (data.error) appendMessage("bot", `Error: ${data.error}`);
-        else appendMessage("bot", "No valid response");
+        if (!(response.headers.get("Content-Type") || "").startsWith("text/event-stream")) {
+            const data = await response.json();
+            removeTypingIndicator();
+            if (data.reply) appendMessage("bot", data.reply);
+            else if (data.error) appendMessage("bot", `Error: ${data.error}`);
+            else appendMessage("bot", "No valid response");
+            return;
+        }
+
+        let streaming = null;
+        let finalReply = "";
+        await readEventStream(response, (event, data) => {
+            if (event === "done" || event === "error") {
+                finalReply = data.reply;
+                return;
+            }
+            if (!streaming) {
+                removeTypingIndicator();
+                streaming = createStreamingMessage();
+            }
+            streaming.textDiv.innerText += data.token;
+            const chatBox = document.getElementById("chatBox");
+            chatBox.scrollTop = chatBox.scrollHeight;
+        });
+
+        // Replace the live bubble with a regular message so it lands in the saved history.
+        removeTypingIndicator();
+        if (streaming) streaming.msgDiv.remove();
+        appendMessage("bot", finalReply || (streaming ? streaming.textDiv.innerText : "No valid response"));
     } catch (error) {
         removeTypingIndicator();
         console.error("Error:", error, error.message, error.stack);